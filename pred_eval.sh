@@ -9,6 +9,8 @@ DIR_TESTCFG=hidden/test_configs
 DIR_SENTSCORES=hidden/sent_scores
 BASENAME_PRED=preds.jsonl
 PATH_PRED=$DIR_PRED/$BASENAME_PRED
+# Per-sentence counts of the last evaluation, unchanged sentences are not aligned again
+PATH_COUNTS=$DIR_SENTSCORES/counts.npz
 
 
 # Prepare conda environment
@@ -37,6 +39,11 @@ echo "Predictions stored here: $DIR_PRED/$fname_preds"
 
 echo "Started evaluation: $(date)"
 
+PREVIOUS_COUNTS=""
+if [ -f $PATH_COUNTS ]; then
+  PREVIOUS_COUNTS="--previous-counts-file $PATH_COUNTS"
+fi
+
 # Call evaluation script
 python3 src/transnormer/evaluation/evaluate.py \
   --input-type jsonl \
@@ -44,6 +51,7 @@ python3 src/transnormer/evaluation/evaluate.py \
   --pred-file $DIR_PRED/$fname_preds \
   --ref-field=norm --pred-field=pred -a both \
   --sent-wise-file $DIR_SENTSCORES/sent_scores_${fname_preds%.*}.pkl \
+  --counts-file $PATH_COUNTS $PREVIOUS_COUNTS \
   --test-config $DIR_TESTCFG/$fname_testcfg \
   >> hidden/eval.jsonl
 
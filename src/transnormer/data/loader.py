@@ -1,11 +1,25 @@
+import collections
 from functools import wraps
 import itertools
 import glob
 import json
+import logging
 import os
 import re
 import time
-from typing import Generator, TextIO, Union, List, Tuple, Dict, Sequence
+import typing
+from typing import (
+    Any,
+    Generator,
+    Iterator,
+    Optional,
+    TextIO,
+    Union,
+    List,
+    Tuple,
+    Dict,
+    Sequence,
+)
 
 import datasets
 from lxml import etree
@@ -13,6 +27,11 @@ from nltk.tokenize.treebank import TreebankWordDetokenizer
 
 DETOKENIZER = TreebankWordDetokenizer()
 
+LOGGER = logging.getLogger(__name__)
+
+# Number of ill-formed (skipped) lines per TSV file, see `iter_tsv_sentences`
+ill_formed_lines: typing.Counter[str] = collections.Counter()
+
 
 # Helper function
 def timer(func):
@@ -121,6 +140,108 @@ def load_tsv_to_lists(
     return columns
 
 
+def iter_tsv_sentences(
+    file: Union[str, TextIO],
+    buffer_size: int = 1 << 20,
+    columns: Optional[Sequence[int]] = None,
+) -> Iterator[Tuple[List[str], ...]]:
+    """
+    Read a tab-separated (CONLL-like) plain text file sentence by sentence.
+
+    Yields a tuple with one list of tokens per column for each sentence. Empty lines
+    are sentence breaks, consecutive empty lines are ignored. The number of columns
+    is that of the first non-empty line. Lines with another number of columns are
+    skipped, they are logged and counted in `ill_formed_lines`. If `columns` (a
+    selection of column indices) is given, only these columns are yielded, and only
+    lines that are too short to contain all of them are skipped.
+
+    The file is read in blocks of about `buffer_size` bytes of lines, only the
+    current sentence is held in memory. The sentences are the same as those of
+    `load_tsv_to_lists(file, keep_sentences=True)`, except that no empty last
+    sentence is yielded for a file that ends with an empty line.
+    """
+    if isinstance(file, str):
+        file_obj: TextIO = open(file, "r", encoding="utf-8")
+    else:
+        file_obj = file
+    name = getattr(file_obj, "name", str(file))
+
+    n_columns = len(columns) if columns else 0
+    sent: List[List[str]] = [[] for _ in range(n_columns)]
+    line_cnt = 0
+    n_ill_formed = 0
+    try:
+        for lines in iter(lambda: file_obj.readlines(buffer_size), []):
+            for line in lines:
+                line_cnt += 1
+                # empty line: sentence break
+                if line.isspace():
+                    if sent and sent[0]:
+                        yield tuple(sent)
+                        sent = [[] for _ in range(n_columns)]
+                    continue
+                line_split = line.strip().split("\t")
+                # first non-empty line: number of columns
+                if not n_columns:
+                    n_columns = len(line_split)
+                    sent = [[] for _ in range(n_columns)]
+                # Catch/skip ill-formed lines
+                if columns:
+                    ill_formed = len(line_split) <= max(columns)
+                else:
+                    ill_formed = len(line_split) != n_columns
+                if ill_formed:
+                    LOGGER.debug(
+                        f"Line {line_cnt} of {name} has {len(line_split)} columns, "
+                        f"skip line: '{line.strip()}'"
+                    )
+                    n_ill_formed += 1
+                    continue
+                if columns:
+                    line_split = [line_split[i] for i in columns]
+                for column, token in zip(sent, line_split):
+                    column.append(token)
+        if sent and sent[0]:
+            yield tuple(sent)
+    finally:
+        # We're done, close file
+        file_obj.close()
+        ill_formed_lines[name] += n_ill_formed
+    if n_ill_formed:
+        LOGGER.warning(f"Skipped {n_ill_formed} ill-formed lines in {name}")
+
+
+def iter_tsv_examples(
+    path: Union[str, Sequence[str]],
+    column_names: Sequence[str] = ("orig", "norm"),
+    detokenize: bool = False,
+    columns: Optional[Sequence[int]] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Read the tab-separated file(s) under `path` (a file, dir or glob, or a list of
+    them) sentence by sentence (see `iter_tsv_sentences`) and yield each sentence as
+    an example {column name: sentence string}.
+
+    The tokens of a sentence are joined with spaces, or detokenized with
+    `DETOKENIZER` if `detokenize` is True. The example generator can be consumed by
+    `datasets.Dataset.from_generator(iter_tsv_examples, gen_kwargs={"path": ...})`,
+    so that a corpus never exists as lists of all its sentences. (`from_generator`
+    caches the dataset by the arguments, not the file contents.) `columns` selects
+    the columns of the files that are named by `column_names`.
+    """
+    paths = [path] if isinstance(path, str) else path
+    for filepath in (f for p in paths for f in filepath_gen(p)):
+        for sent in iter_tsv_sentences(filepath, columns=columns):
+            if len(sent) != len(column_names):
+                raise ValueError(
+                    f"{filepath} has {len(sent)} columns, expected {len(column_names)}"
+                )
+            yield {
+                name: DETOKENIZER.detokenize(tokens) if detokenize else " ".join(tokens)
+                for name, tokens in zip(column_names, sent)
+            }
+
+
 def load_dtaevalxml_to_lists(
     file: Union[str, TextIO], filter_bad: bool = False, filter_classes: List[str] = []
 ) -> Tuple[List[List[str]], List[List[str]]]:
@@ -226,17 +347,14 @@ def load_dtaeval_as_dataset(path: str) -> datasets.Dataset:
     """
     Load the file(s) under `path` into a datasets.Dataset with columns "orig"
     and "norm"
-    """
 
-    docs = [load_tsv_to_lists(file, keep_sentences=True) for file in file_gen(path)]
-    docs_sent_joined = [
-        [[" ".join(sent) for sent in column] for column in doc] for doc in docs
-    ]
+    A file that ends with an empty line does not add an empty sentence.
+    """
 
     all_sents_orig, all_sents_norm = [], []
-    for doc_orig, doc_norm in docs_sent_joined:
-        all_sents_orig.extend([sent for sent in doc_orig])
-        all_sents_norm.extend([sent for sent in doc_norm])
+    for example in iter_tsv_examples(path):
+        all_sents_orig.append(example["orig"])
+        all_sents_norm.append(example["norm"])
 
     return datasets.Dataset.from_dict({"orig": all_sents_orig, "norm": all_sents_norm})
 
@@ -401,18 +519,16 @@ def read_ridges_raw(path: str) -> Dict[str, List[str]]:
     https://github.com/coastalcph/histnorm/tree/master/datasets/historical/german
     There is no metadata available for this corpus version.
 
+    The first two columns of a file are "orig" and "norm", further columns are
+    ignored. A file that ends with an empty line does not add an empty sentence.
+
     Returns: {"orig" : [...], "norm" : [...]}
     """
     all_sents_orig, all_sents_norm = [], []
-    for docpath in filepath_gen(path):
-        # Load document into a list of tokenized sentences
-        # The two elements in the outermost list are orig and norm columns
-        doc_tok = load_tsv_to_lists(docpath, keep_sentences=True)
-        # Sentences are converted from List[str] to str
-        doc = detokenize_doc(doc_tok)  # type: ignore[arg-type]
-        # Collect all sentences in list
-        all_sents_orig.extend([sent for sent in doc[0]])
-        all_sents_norm.extend([sent for sent in doc[1]])
+    # Sentences are converted from List[str] to str
+    for example in iter_tsv_examples(path, detokenize=True, columns=(0, 1)):
+        all_sents_orig.append(example["orig"])
+        all_sents_norm.append(example["norm"])
 
     return {"orig": all_sents_orig, "norm": all_sents_norm}
 
@@ -516,3 +632,39 @@ def merge_datasets(
     else:
         raise TypeError("Argument `dsets` must be of type list or dict.")
     return merged_dataset
+
+
+def load_and_merge_datasets(configs: Dict[str, Any]) -> datasets.DatasetDict:
+    """
+    Load, resample and merge the dataset splits as specified in the config file.
+
+    The splits contain the raw strings, loading them needs neither a tokenizer
+    nor torch.
+    """
+
+    splits_and_paths = [
+        ("train", configs["data"]["paths_train"]),
+        ("validation", configs["data"]["paths_validation"]),
+        ("test", configs["data"]["paths_test"]),
+    ]
+
+    ds_split_merged = datasets.DatasetDict()
+    # Iterate over splits (i.e. train, validation, test)
+    for split, paths in splits_and_paths:
+        # Load all datasets for this split
+        dsets = [
+            datasets.load_dataset("json", data_files=path, split="train")
+            for path in paths
+        ]
+        # Map each dataset to the desired number of examples for this dataset
+        num_examples = configs["data"][f"n_examples_{split}"]
+        ds2num_examples = {dsets: num_examples[i] for i, dsets in enumerate(dsets)}
+        # Merge and resample datasets for this split
+        ds = merge_datasets(
+            ds2num_examples,
+            seed=configs["random_seed"],
+            shuffle=configs["data"].get("do_shuffle", True),
+        )
+        ds_split_merged[split] = ds
+
+    return ds_split_merged
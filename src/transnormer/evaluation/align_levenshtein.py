@@ -1,12 +1,27 @@
 #!/usr/bin/python
-import pickle
-import os
+import collections
+import concurrent.futures
 import re
+import typing
 
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
+from .alignment_cache import AlignmentCache
 from .tokenise import basic_tokenise
-from .wedit_distance_align import wedit_distance_align
+from .wedit_distance_align import (
+    COST_MODELS,
+    DEFAULT_COST_MODEL,
+    CostModel,
+    add_identical_affixes,
+    get_cost_model,
+    identical_affixes,
+    identical_alignment,
+    wedit_distance_align_anchored,
+    wedit_distance_align_batch,
+)
+
+# Number of sentence pairs per alignment path, see `align`
+path_counts: typing.Counter[str] = collections.Counter()
 
 
 def read_file(filename: str) -> List[str]:
@@ -29,7 +44,14 @@ def homogenise(sent: str) -> str:
 
 
 def align(
-    sents_ref: List[str], sents_pred: List[str], cache_file: Optional[str] = None
+    sents_ref: List[str],
+    sents_pred: List[str],
+    cache_file: Union[str, AlignmentCache, None] = None,
+    anchored: bool = False,
+    n_jobs: int = 1,
+    trim: bool = False,
+    cost_model: str = "default",
+    keep_skipped: bool = False,
 ) -> List[List[Tuple[str, str, float]]]:
     """
     Align sentences in `sents_ref` and `sents_pred` on token-level.
@@ -38,6 +60,18 @@ def align(
 
     Tokens are understood as a stretch of characters without a space in-between. Thus you might want to apply some pre-processing to your text (e.g. with `basic_tokenise`).
 
+    The character alignments of all sentence pairs are computed in batches (see `wedit_distance_align_batch`). With `n_jobs` > 1, the sentence pairs are split into chunks that are aligned by a pool of `n_jobs` processes; the result is the same.
+
+    If `cache_file` is given, character alignments are looked up in and added to the SQLite cache at this path (see `AlignmentCache`). An open `AlignmentCache` can be passed instead, it gets committed but not closed.
+
+    Identical (homogenised) sentences are aligned token by token without any computation. If `trim` is True, the tokens that two sentences have in common at the beginning and at the end are aligned the same way and only the rest is aligned on character-level (see `identical_affixes`). If `anchored` is True, tokens that occur anywhere in both sentences serve as anchors and only the stretches between them are aligned on character-level (see `wedit_distance_align_anchored`). Both are much faster for similar sentences, but not guaranteed to give the same result.
+
+    `cost_model` is the name of the weighting of the edit operations (see `COST_MODELS`).
+
+    How many sentence pairs took which path ("identical", "cached", "full", "trimmed" or "anchored") is added up in `path_counts`.
+
+    Sentence pairs whose word alignment does not cover the sentence from `sents_ref` are skipped (with a message) and left out of the result. With `keep_skipped`, a skipped pair gets an empty alignment instead, so that the i-th alignment always belongs to the i-th pair (the alignment of a pair that is not skipped has at least one word pair).
+
     Example:
 
     ```python
@@ -50,106 +84,292 @@ def align(
         ],
     ]
     """
-    alignments, cache = [], {}
-    if cache_file is not None and os.path.exists(cache_file):
-        cache = pickle.load(open(cache_file, "rb"))
-    for sent_ref, sent_pred in zip(sents_ref, sents_pred):
-        if (sent_ref, sent_pred) in cache and "align" in cache[(sent_ref, sent_pred)]:
-            alignment = cache[(sent_ref, sent_pred)]["align"]
-            alignments.append(alignment)
+    # Character alignments are computed (and cached) once per homogenised pair,
+    # the word alignments are reconstructed from them for every raw pair
+    pairs = list(zip(sents_ref, sents_pred))
+    homogenised = [(homogenise(ref), homogenise(pred)) for ref, pred in pairs]
+    backpointers = _backpointers(
+        homogenised, cache_file, anchored, n_jobs, trim, cost_model
+    )
+    return _word_alignments(backpointers, homogenised, pairs, keep_skipped)
+
+
+def align_both(
+    sents_ref: List[str],
+    sents_pred: List[str],
+    cache_file: Union[str, AlignmentCache, None] = None,
+    anchored: bool = False,
+    n_jobs: int = 1,
+    trim: bool = False,
+    cost_model: str = "default",
+    keep_skipped: bool = False,
+) -> Tuple[List[List[Tuple[str, str, float]]], List[List[Tuple[str, str, float]]]]:
+    """
+    Same as `align(sents_ref, sents_pred, ...), align(sents_pred, sents_ref, ...)`, but the two directions share the homogenisation, the identical-pair checks and trimming, one pass over the cache and the batches of the DP.
+
+    The DP itself is not shared: the costs of the weighted edit distance are not symmetric (e.g. inserting a space costs less than deleting one before a non-space), so the alignment of (pred, ref) is not the mirror image of the alignment of (ref, pred).
+    """
+    pairs = list(zip(sents_ref, sents_pred))
+    homogenised = [(homogenise(ref), homogenise(pred)) for ref, pred in pairs]
+    reversed_pairs = [(pred, ref) for ref, pred in pairs]
+    reversed_homogenised = [(pred, ref) for ref, pred in homogenised]
+    backpointers = _backpointers(
+        homogenised + reversed_homogenised,
+        cache_file,
+        anchored,
+        n_jobs,
+        trim,
+        cost_model,
+    )
+    return (
+        _word_alignments(backpointers, homogenised, pairs, keep_skipped),
+        _word_alignments(
+            backpointers, reversed_homogenised, reversed_pairs, keep_skipped
+        ),
+    )
+
+
+def _backpointers(
+    homogenised: List[Tuple[str, str]],
+    cache_file: Union[str, AlignmentCache, None],
+    anchored: bool,
+    n_jobs: int,
+    trim: bool,
+    cost_model: str,
+) -> Dict[Tuple[str, str], List[Tuple[int, int, float]]]:
+    """Character alignments of homogenised sentence pairs, see `align`"""
+    costs = get_cost_model(cost_model)
+    backpointers: Dict[Tuple[str, str], List[Tuple[int, int, float]]] = {}
+    if isinstance(cache_file, str):
+        cache: Optional[AlignmentCache] = AlignmentCache(cache_file)
+    else:
+        cache = cache_file
+    mode = "anchored" if anchored else "trimmed" if trim else "full"
+    paths: Dict[Tuple[str, str], str] = {}
+    try:
+        todo = []
+        for key in dict.fromkeys(homogenised):
+            if key[0] == key[1]:
+                backpointers[key] = identical_alignment(len(key[0]))
+                paths[key] = "identical"
+                continue
+            cached = cache.get(*key, mode, costs) if cache is not None else None
+            if cached is None:
+                todo.append(key)
+            else:
+                backpointers[key] = cached
+                paths[key] = "cached"
+
+        # Trim identical tokens at the beginning and end (anchored alignment
+        # takes care of them anyway). The affixes of a reversed pair are the same
+        affixes: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        middles = []
+        for ref, pred in todo:
+            if mode != "trimmed":
+                affixes[ref, pred] = (0, 0)
+            elif (pred, ref) in affixes:
+                affixes[ref, pred] = affixes[pred, ref]
+            else:
+                affixes[ref, pred] = identical_affixes(ref, pred)
+            prefix, suffix = affixes[ref, pred]
+            middle_ref = slice(prefix, len(ref) - suffix)
+            middle_pred = slice(prefix, len(pred) - suffix)
+            middles.append((ref[middle_ref], pred[middle_pred]))
+
+        # Align all sentence pairs that are not cached in one go
+        if n_jobs > 1 and len(middles) > 1:
+            results = _character_alignments_parallel(middles, anchored, costs, n_jobs)
         else:
-            backpointers = wedit_distance_align(
-                homogenise(sent_ref), homogenise(sent_pred)
-            )
+            results = _character_alignments(middles, anchored, costs)
+        for key, result in zip(todo, results):
+            prefix, suffix = affixes[key]
+            if prefix or suffix:
+                result = add_identical_affixes(result, prefix, suffix)
+                paths[key] = "trimmed"
+            else:
+                paths[key] = "anchored" if anchored else "full"
+            backpointers[key] = result
+            if cache is not None:
+                cache.put(*key, result, mode, costs)
+    finally:
+        if isinstance(cache_file, str) and cache is not None:
+            cache.close()
+        elif cache is not None:
+            cache.commit()
 
-            alignment, current_word, seen1, seen2 = [], ["", ""], [], []
-            last_weight: float = 0
-            for i_ref, i_pred, weight in backpointers:
-                if i_ref == 0 and i_pred == 0:
-                    continue
-                # spaces in both, add straight away
-                if (
-                    i_ref <= len(sent_ref)
-                    and sent_ref[i_ref - 1] == " "
-                    and i_pred <= len(sent_pred)
-                    and sent_pred[i_pred - 1] == " "
-                ):
-                    alignment.append(
-                        (
-                            current_word[0].strip(),
-                            current_word[1].strip(),
-                            weight - last_weight,
-                        )
-                    )
-                    last_weight = weight
-                    current_word = ["", ""]
-                    seen1.append(i_ref)
-                    seen2.append(i_pred)
-                else:
-                    end_space = "░"
-                    if i_ref <= len(sent_ref) and i_ref not in seen1:
-                        if i_ref > 0:
-                            current_word[0] += sent_ref[i_ref - 1]
-                            seen1.append(i_ref)
-                    if i_pred <= len(sent_pred) and i_pred not in seen2:
-                        if i_pred > 0:
-                            current_word[1] += (
-                                sent_pred[i_pred - 1]
-                                if sent_pred[i_pred - 1] != " "
-                                else "▁"
-                            )
-                            end_space = "" if space_after(i_pred, sent_pred) else "░"
-                            seen2.append(i_pred)
-                    if (
-                        i_ref <= len(sent_ref)
-                        and sent_ref[i_ref - 1] == " "
-                        and current_word[0].strip() != ""
-                    ):
-                        alignment.append(
-                            (
-                                current_word[0].strip(),
-                                current_word[1].strip() + end_space,
-                                weight - last_weight,
-                            )
-                        )
-                        last_weight = weight
-                        current_word = ["", ""]
-            # final word
+    path_counts.update(paths[key] for key in homogenised)
+    return backpointers
+
+
+def _word_alignments(
+    backpointers: Dict[Tuple[str, str], List[Tuple[int, int, float]]],
+    homogenised: List[Tuple[str, str]],
+    pairs: List[Tuple[str, str]],
+    keep_skipped: bool = False,
+) -> List[List[Tuple[str, str, float]]]:
+    """Word alignments of sentence pairs, skipped pairs are left out (with a message) or get an empty alignment if `keep_skipped`"""
+    alignments: List[List[Tuple[str, str, float]]] = []
+    for key, (sent_ref, sent_pred) in zip(homogenised, pairs):
+        alignment, skip_message = _word_alignment(
+            backpointers[key], sent_ref, sent_pred
+        )
+        if alignment is None:
+            print(skip_message)
+            if keep_skipped:
+                alignments.append([])
+            continue
+        alignments.append(alignment)
+    return alignments
+
+
+def _character_alignments(
+    pairs: List[Tuple[str, str]],
+    anchored: bool = False,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> List[List[Tuple[int, int, float]]]:
+    """Backpointers for a list of homogenised sentence pairs"""
+    if anchored:
+        return [wedit_distance_align_anchored(*pair, costs=costs) for pair in pairs]
+    return wedit_distance_align_batch(pairs, costs=costs)
+
+
+def _character_alignments_parallel(
+    pairs: List[Tuple[str, str]], anchored: bool, costs: CostModel, n_jobs: int
+) -> List[List[Tuple[int, int, float]]]:
+    """Same as `_character_alignments`, but ordered chunks of `pairs` are aligned by `n_jobs` processes"""
+    # a few chunks per process, so that processes finish at similar times
+    chunk_size = -(-len(pairs) // (4 * n_jobs))
+    chunks = []
+    for start in range(0, len(pairs), chunk_size):
+        end = start + chunk_size
+        chunks.append(pairs[start:end])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        results = executor.map(
+            _character_alignments,
+            chunks,
+            [anchored] * len(chunks),
+            [costs] * len(chunks),
+        )
+        return [result for chunk_results in results for result in chunk_results]
+
+
+# Helpers for checking the coverage of an alignment
+_SPACES = re.compile(" +")
+_DROP_FROM_RECOVERED = str.maketrans("", "", "░▁ ")
+_DROP_FROM_SENT = str.maketrans("", "", "▁ ")
+
+
+def backpointers_to_word_alignment(
+    backpointers: List[Tuple[int, int, float]], sent_ref: str, sent_pred: str
+) -> Optional[List[Tuple[str, str, float]]]:
+    """
+    Turn the character alignment of two sentences (as returned by
+    `wedit_distance_align`) into a word alignment (see `align`).
+
+    Returns None (and prints a message) if the word alignment does not cover
+    both sentences entirely. This is done in a single pass over `backpointers`.
+    """
+    alignment, skip_message = _word_alignment(backpointers, sent_ref, sent_pred)
+    if skip_message is not None:
+        print(skip_message)
+    return alignment
+
+
+def _word_alignment(
+    backpointers: List[Tuple[int, int, float]], sent_ref: str, sent_pred: str
+) -> Tuple[Optional[List[Tuple[str, str, float]]], Optional[str]]:
+    """
+    See `backpointers_to_word_alignment`. Returns the alignment or None, and the
+    message about a skipped sample or None.
+    """
+    alignment: List[Tuple[str, str, float]] = []
+    # characters of the current word pair and whether the current word
+    # from `sent_ref` contains non-whitespace characters
+    word_ref: List[str] = []
+    word_pred: List[str] = []
+    word_ref_nonblank = False
+    # backpointers are monotonic, so the last added index stands for all seen ones
+    last_ref, last_pred = -1, -1
+    len_ref, len_pred = len(sent_ref), len(sent_pred)
+    last_weight: float = 0
+    weight: float = 0
+    for i_ref, i_pred, weight in backpointers:
+        if i_ref == 0 and i_pred == 0:
+            continue
+        # spaces in both, add straight away
+        if (
+            i_ref <= len_ref
+            and sent_ref[i_ref - 1] == " "
+            and i_pred <= len_pred
+            and sent_pred[i_pred - 1] == " "
+        ):
             alignment.append(
-                (current_word[0].strip(), current_word[1].strip(), weight - last_weight)
+                (
+                    "".join(word_ref).strip(),
+                    "".join(word_pred).strip(),
+                    weight - last_weight,
+                )
             )
-            # check that both strings are entirely covered
-            recovered1 = re.sub("[ ]+", " ", " ".join([x[0] for x in alignment]))
-            recovered2 = re.sub("[ ]+", " ", " ".join([x[1] for x in alignment]))
-
-            # FIXME: This case occured once for 200k test examples
-            # Ideally we would not skip it, because then the number of aligned sentences
-            # does not match the number of sentences anymore
-            if recovered1 != re.sub(" +", " ", sent_ref):
-                print("Skipping one sample because it couldn't be aligned")
-                print(
-                    "\n"
-                    + re.sub(" +", " ", recovered1)
-                    + "\n"
-                    + re.sub(" +", " ", sent_ref)
+            last_weight = weight
+            word_ref, word_pred, word_ref_nonblank = [], [], False
+            last_ref, last_pred = i_ref, i_pred
+        else:
+            end_space = "░"
+            if i_ref <= len_ref and i_ref != last_ref:
+                if i_ref > 0:
+                    char = sent_ref[i_ref - 1]
+                    word_ref.append(char)
+                    word_ref_nonblank = word_ref_nonblank or not char.isspace()
+                    last_ref = i_ref
+            if i_pred <= len_pred and i_pred != last_pred:
+                if i_pred > 0:
+                    char = sent_pred[i_pred - 1]
+                    word_pred.append(char if char != " " else "▁")
+                    end_space = "" if space_after(i_pred, sent_pred) else "░"
+                    last_pred = i_pred
+            if i_ref <= len_ref and sent_ref[i_ref - 1] == " " and word_ref_nonblank:
+                alignment.append(
+                    (
+                        "".join(word_ref).strip(),
+                        "".join(word_pred).strip() + end_space,
+                        weight - last_weight,
+                    )
                 )
-                continue
+                last_weight = weight
+                word_ref, word_pred, word_ref_nonblank = [], [], False
+    # final word
+    alignment.append(
+        ("".join(word_ref).strip(), "".join(word_pred).strip(), weight - last_weight)
+    )
 
-            # FIXME: See above
-            if re.sub("[░▁ ]+", "", recovered2) != re.sub("[▁ ]+", "", sent_pred):
-                print("Skipping one sample because it couldn't be aligned")
-                print(recovered2 + " / " + sent_pred)
-                continue
+    # check that both strings are entirely covered
+    recovered1 = _SPACES.sub(" ", " ".join([x[0] for x in alignment]))
 
-            alignments.append(alignment)
-            if cache is not None:
-                if (sent_ref, sent_pred) not in cache:
-                    cache[(sent_ref, sent_pred)] = {}
-                cache[(sent_ref, sent_pred)]["align"] = alignment
-    # dump cache if specified
-    if cache_file is not None:
-        pickle.dump(cache, open(cache_file, "wb"))
-    return alignments
+    # FIXME: This case occured once for 200k test examples
+    # Ideally we would not skip it, because then the number of aligned sentences
+    # does not match the number of sentences anymore
+    if recovered1 != _SPACES.sub(" ", sent_ref):
+        return None, (
+            "Skipping one sample because it couldn't be aligned\n"
+            + "\n"
+            + recovered1
+            + "\n"
+            + _SPACES.sub(" ", sent_ref)
+        )
+
+    # FIXME: See above
+    recovered2 = "".join([x[1] for x in alignment])
+    if recovered2.translate(_DROP_FROM_RECOVERED) != sent_pred.translate(
+        _DROP_FROM_SENT
+    ):
+        return None, (
+            "Skipping one sample because it couldn't be aligned\n"
+            + _SPACES.sub(" ", " ".join([x[1] for x in alignment]))
+            + " / "
+            + sent_pred
+        )
+
+    return alignment, None
 
 
 def space_after(idx: int, sent: str) -> bool:
@@ -193,7 +413,32 @@ if __name__ == "__main__":
         help="Which file's tokenisation to use as reference for alignment.",
     )
     parser.add_argument(
-        "-c", "--cache", help="pickle cache file containing alignments", default=None
+        "-c", "--cache", help="SQLite cache file containing alignments", default=None
+    )
+    parser.add_argument(
+        "--anchored",
+        help="only align the stretches between tokens that occur in both sentences",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trim",
+        help="only align the stretches between the tokens that both sentences start and end with",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cost-model",
+        choices=sorted(COST_MODELS),
+        default="default",
+        help="weights of the edit operations",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes for the alignment",
     )
     parser.add_argument(
         "-w",
@@ -204,5 +449,13 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
     sents_ref, sents_pred = read_file(args.ref), read_file(args.pred)
-    alignment = align(sents_ref, sents_pred, args.cache)
+    alignment = align(
+        sents_ref,
+        sents_pred,
+        args.cache,
+        args.anchored,
+        args.jobs,
+        args.trim,
+        args.cost_model,
+    )
     print(prepare_for_print(alignment, args.weights))
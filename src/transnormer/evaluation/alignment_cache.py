@@ -0,0 +1,281 @@
+#!/usr/bin/python
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+
+from types import TracebackType
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from .wedit_distance_align import DEFAULT_COST_MODEL, CostModel
+
+# Version of the table layout, a cache file with another version gets rebuilt
+SCHEMA_VERSION = 2
+
+
+def cache_key(
+    ref: str, pred: str, mode: str = "full", costs: CostModel = DEFAULT_COST_MODEL
+) -> bytes:
+    """
+    Key of the character alignment of a (homogenised) sentence pair: a hash of
+    the pair, the alignment mode ("full", "trimmed" or "anchored", see `align`)
+    and the name and version of the cost model
+    """
+    text = f"{costs.name}:{costs.version}:{mode}:{len(ref)}:{ref}{pred}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def encode_backpointers(backpointers: List[Tuple[int, int, float]]) -> bytes:
+    """Pack backpointers into an array of indices (int32) followed by the weights (float64)"""
+    indices = np.array([(i, j) for i, j, _ in backpointers], dtype=np.int32)
+    weights = np.array([weight for _, _, weight in backpointers], dtype=np.float64)
+    return indices.tobytes() + weights.tobytes()
+
+
+def decode_backpointers(blob: bytes) -> List[Tuple[int, int, float]]:
+    """Inverse of `encode_backpointers`"""
+    # each backpointer takes 2 * 4 bytes of indices and 8 bytes of weight
+    n = len(blob) // 16
+    indices = np.frombuffer(blob, dtype=np.int32, count=2 * n).tolist()
+    weights = np.frombuffer(blob, dtype=np.float64, offset=8 * n).tolist()
+    return list(zip(indices[0::2], indices[1::2], weights))
+
+
+class AlignmentCache:
+    """
+    Persistent cache of character alignments (backpointers, see
+    `wedit_distance_align`) of homogenised sentence pairs.
+
+    The cache is an SQLite database in WAL mode, so that several evaluations can
+    read and write the same file at the same time. Lookups and inserts go one row
+    at a time, inserts are committed every `commit_every` rows and on `close`. Other
+    writers wait (up to `timeout` seconds) while a connection has uncommitted inserts.
+
+    If `max_entries` and/or `max_bytes` are given, the least recently used entries
+    are evicted on `close` until the cache fits (see `prune`). The numbers of hits,
+    misses and evictions of this connection are counted (see `stats`).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        commit_every: int = 1000,
+        timeout: float = 60,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+        self._uncommitted = 0
+        # keys of hits, their time of last use is updated on commit
+        self._used: List[bytes] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _create_tables(self) -> None:
+        (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version == SCHEMA_VERSION:
+            return
+        # Other connections may be creating the tables at the same time: take the
+        # write lock and check the version again before (re)building them
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+            if version != SCHEMA_VERSION:
+                self.connection.execute("DROP TABLE IF EXISTS alignments")
+                # `size` is the number of bytes of key and value
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS alignments (key BLOB PRIMARY KEY, backpointers BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL) WITHOUT ROWID"
+                )
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS alignments_last_used ON alignments (last_used)"
+                )
+                self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+
+    def get(
+        self,
+        ref: str,
+        pred: str,
+        mode: str = "full",
+        costs: CostModel = DEFAULT_COST_MODEL,
+    ) -> Optional[List[Tuple[int, int, float]]]:
+        """Cached backpointers for the pair or None"""
+        key = cache_key(ref, pred, mode, costs)
+        row = self.connection.execute(
+            "SELECT backpointers FROM alignments WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.append(key)
+        return decode_backpointers(row[0])
+
+    def put(
+        self,
+        ref: str,
+        pred: str,
+        backpointers: List[Tuple[int, int, float]],
+        mode: str = "full",
+        costs: CostModel = DEFAULT_COST_MODEL,
+    ) -> None:
+        key = cache_key(ref, pred, mode, costs)
+        value = encode_backpointers(backpointers)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO alignments (key, backpointers, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, len(key) + len(value), time.time()),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        if self._used:
+            now = time.time()
+            self.connection.executemany(
+                "UPDATE alignments SET last_used = ? WHERE key = ?",
+                [(now, key) for key in self._used],
+            )
+            self._used = []
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        if self.max_entries is not None or self.max_bytes is not None:
+            self.prune(self.max_entries, self.max_bytes)
+        self.commit()
+        self.connection.close()
+
+    def prune(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> int:
+        """
+        Evict entries that have not been used for `max_age` seconds, then the least
+        recently used entries until there are at most `max_entries` entries of at
+        most `max_bytes` bytes in total. Returns the number of evicted entries.
+        """
+        self.commit()
+        evicted = 0
+        with self.connection:
+            if max_age is not None:
+                evicted += self.connection.execute(
+                    "DELETE FROM alignments WHERE last_used < ?",
+                    (time.time() - max_age,),
+                ).rowcount
+            if max_entries is not None:
+                excess = len(self) - max_entries
+                if excess > 0:
+                    evicted += self.connection.execute(
+                        "DELETE FROM alignments WHERE key IN (SELECT key FROM alignments ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    ).rowcount
+            if max_bytes is not None:
+                excess = self.size() - max_bytes
+                keys = []
+                cursor = self.connection.execute(
+                    "SELECT key, size FROM alignments ORDER BY last_used"
+                )
+                for key, size in cursor:
+                    if excess <= 0:
+                        break
+                    keys.append((key,))
+                    excess -= size
+                cursor.close()
+                self.connection.executemany(
+                    "DELETE FROM alignments WHERE key = ?", keys
+                )
+                evicted += len(keys)
+        self.evictions += evicted
+        return evicted
+
+    def compact(self) -> None:
+        """Give the space of evicted entries back to the file system"""
+        self.commit()
+        self.connection.execute("VACUUM")
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def size(self) -> int:
+        """Number of bytes of all keys and values (without the overhead of the database)"""
+        return self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM alignments"
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters of this connection"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM alignments").fetchone()[0]
+
+    def __enter__(self) -> "AlignmentCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def parse_arguments(
+    arguments: Optional[List[str]] = None,
+) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Prune and compact an alignment cache file. Entries that have not been used for MAX_AGE_DAYS are removed first, then the least recently used entries until the cache fits MAX_ENTRIES and MAX_BYTES."
+    )
+    parser.add_argument("cache_file", help="Path to the SQLite alignment cache")
+    parser.add_argument(
+        "--max-entries", type=int, help="Maximum number of cached alignments"
+    )
+    parser.add_argument(
+        "--max-bytes", type=int, help="Maximum size of the cached alignments in bytes"
+    )
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        help="Remove alignments that have not been used for this many days",
+    )
+    parser.add_argument(
+        "--no-compact",
+        action="store_true",
+        help="Do not shrink the file after pruning",
+    )
+    return parser.parse_args(arguments)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    args = parse_arguments(arguments)
+    max_age = None
+    if args.max_age_days is not None:
+        max_age = args.max_age_days * 24 * 60 * 60
+    with AlignmentCache(args.cache_file) as cache:
+        cache.prune(args.max_entries, args.max_bytes, max_age)
+        if not args.no_compact:
+            cache.compact()
+        output = {"cache-file": args.cache_file, "entries": len(cache)}
+        output["bytes"] = cache.size()
+        output["evictions"] = cache.evictions
+    print(json.dumps(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .columnar_alignment import Alignments, ColumnarAlignment, Vocabulary, as_columnar
+
+# Version of the file layout, a store with another version cannot be loaded
+FORMAT_VERSION = 1
+
+# Arrays of each alignment, saved as `<name>.<array>.npy`
+_ARRAYS = ("ref_ids", "pred_ids", "weights", "offsets")
+
+
+def save_alignments(
+    path: str,
+    alignments: Dict[str, Alignments],
+    metadata: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Save named word alignments (e.g. {"ref": ..., "pred": ...}, see `align`) to the
+    directory `path`.
+
+    The store consists of the token dictionary (the UTF-8 encoded tokens and their
+    byte offsets), one set of arrays per alignment (see `ColumnarAlignment`) and a
+    JSON file with the names of the alignments and `metadata`. All alignments share
+    the token dictionary. The arrays are .npy files, so that `load_alignments` can
+    memory-map them.
+    """
+    os.makedirs(path, exist_ok=True)
+    vocab = Vocabulary()
+    columnar = {
+        name: as_columnar(alignment, vocab) for name, alignment in alignments.items()
+    }
+
+    encoded = [token.encode("utf-8") for token in vocab.tokens]
+    token_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(token) for token in encoded], out=token_offsets[1:])
+    np.save(
+        os.path.join(path, "tokens.npy"),
+        np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    )
+    np.save(os.path.join(path, "token_offsets.npy"), token_offsets)
+    for name, alignment in columnar.items():
+        for array in _ARRAYS:
+            np.save(
+                os.path.join(path, f"{name}.{array}.npy"), getattr(alignment, array)
+            )
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "alignments": list(columnar),
+        "metadata": metadata or {},
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def load_metadata(path: str) -> Dict[str, Any]:
+    """Metadata of the store at `path` (see `save_alignments`)"""
+    return _load_meta(path)["metadata"]
+
+
+def load_alignments(path: str, mmap: bool = True) -> Dict[str, ColumnarAlignment]:
+    """
+    Load the alignments of the store at `path` (see `save_alignments`). With `mmap`,
+    the arrays are memory-mapped read-only instead of read into memory; only the
+    token dictionary is turned into Python objects.
+    """
+    meta = _load_meta(path)
+    tokens = np.load(os.path.join(path, "tokens.npy")).tobytes()
+    token_offsets = np.load(os.path.join(path, "token_offsets.npy")).tolist()
+    vocab = Vocabulary(
+        tokens[start:end].decode("utf-8")
+        for start, end in zip(token_offsets, token_offsets[1:])
+    )
+    alignments = {}
+    for name in meta["alignments"]:
+        arrays = [
+            np.load(
+                os.path.join(path, f"{name}.{array}.npy"),
+                mmap_mode="r" if mmap else None,
+            )
+            for array in _ARRAYS
+        ]
+        alignments[name] = ColumnarAlignment(vocab, *arrays)
+    return alignments
+
+
+def _load_meta(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Alignment store {path} has version {meta.get('version')}, expected {FORMAT_VERSION}"
+        )
+    return meta
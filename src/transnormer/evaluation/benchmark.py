@@ -0,0 +1,197 @@
+# Microbenchmarks for the evaluation code
+
+import argparse
+import json
+import os
+import re
+import timeit
+from typing import Callable, List, Optional, Tuple
+
+from transnormer.evaluation import align_levenshtein, metrics, tokenise
+from transnormer.evaluation.columnar_alignment import ColumnarAlignment
+from transnormer.evaluation.wedit_distance_align import wedit_distance_align
+
+ROOT = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../..")
+)
+DATA = os.path.join(ROOT, "tests/testdata/jsonl/dtak-1600-1699-train-head3.jsonl")
+
+
+def basic_tokenise_legacy(string: str) -> str:
+    """The previous implementation of `tokenise.basic_tokenise`, one substitution per character"""
+    # Insert a space *before* punctuation characters
+    for char in r',.;?!:)("…/”“„″′‘‚':
+        string = re.sub("(?<! )" + re.escape(char) + "+", " " + char, string)
+    # Insert a space *after* quotation mark / apostroph characters
+    for char in "'\"’”“„″′‘‚":
+        string = re.sub(char + "(?! )", char + " ", string)
+    return string.strip()
+
+
+def load_sentences(file_path: str, n: int) -> List[str]:
+    """`n` sentences from the fields 'orig' and 'norm' of a JSONL file, repeating the file if necessary"""
+    sentences = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            sentences += [record["orig"], record["norm"]]
+    return (sentences * (n // len(sentences) + 1))[:n]
+
+
+def load_paragraph_pair(
+    file_path: str, length: int, ref_field: str = "orig", pred_field: str = "norm"
+) -> Tuple[str, str]:
+    """
+    Concatenate the (tokenised) sentence pairs from a JSONL file into a pair of
+    paragraphs with at least `length` characters each, repeating the file if
+    necessary
+    """
+    pairs = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            pairs.append(
+                (
+                    tokenise.basic_tokenise(record[ref_field]),
+                    tokenise.basic_tokenise(record[pred_field]),
+                )
+            )
+    refs: List[str] = []
+    preds: List[str] = []
+    while min(len(" ".join(refs)), len(" ".join(preds))) < length:
+        for ref, pred in pairs:
+            refs.append(ref)
+            preds.append(pred)
+    return " ".join(refs)[:length].strip(), " ".join(preds)[:length].strip()
+
+
+def chunked(items: List[str], size: int) -> List[List[str]]:
+    return [items[slice(i, i + size)] for i in range(0, len(items), size)]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> float:
+    """Best wall-clock time of `repeat` calls of `fn` (in seconds)"""
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def benchmark_align(file_path: str, length: int, repeat: int) -> None:
+    """Compare the cost of the alignment steps on a pair of paragraphs"""
+    ref, pred = load_paragraph_pair(file_path, length)
+    ref_h = align_levenshtein.homogenise(ref)
+    pred_h = align_levenshtein.homogenise(pred)
+    backpointers = wedit_distance_align(ref_h, pred_h)
+
+    results = {
+        "dp (banded)": measure(lambda: wedit_distance_align(ref_h, pred_h), repeat),
+        "dp (numpy)": measure(
+            lambda: wedit_distance_align(ref_h, pred_h, engine="numpy"), repeat
+        ),
+        "word reconstruction": measure(
+            lambda: align_levenshtein.backpointers_to_word_alignment(
+                backpointers, ref, pred
+            ),
+            repeat,
+        ),
+    }
+    print(f"Paragraph lengths: {len(ref)} / {len(pred)} characters")
+    baseline = results["dp (banded)"]
+    for name, seconds in results.items():
+        print(f"{name:<24}{seconds * 1000:>10.2f} ms{seconds / baseline:>10.2f}x")
+
+
+def benchmark_score(file_path: str, length: int, repeat: int) -> None:
+    """Compare scoring the word alignments of a corpus as lists and in columnar form"""
+    ref, pred = load_paragraph_pair(file_path, length)
+    # one sentence per 20 tokens
+    sents_ref = [" ".join(sent) for sent in chunked(ref.split(), 20)]
+    sents_pred = [" ".join(sent) for sent in chunked(pred.split(), 20)]
+    n_sents = min(len(sents_ref), len(sents_pred))
+    alignments = align_levenshtein.align(sents_ref[:n_sents], sents_pred[:n_sents])
+    columnar = ColumnarAlignment.from_lists(alignments)
+    types = {word[0] for sent in alignments[::2] for word in sent}
+
+    results = {
+        "word_acc (lists)": measure(lambda: metrics.word_acc(alignments), repeat),
+        "word_acc (columnar)": measure(lambda: metrics.word_acc(columnar), repeat),
+        "selected types (columnar)": measure(
+            lambda: metrics.n_correct_and_total_selected_target_types(columnar, types),
+            repeat,
+        ),
+        "conversion": measure(lambda: ColumnarAlignment.from_lists(alignments), repeat),
+    }
+    print(f"{n_sents} sentences, {sum(map(len, alignments))} word pairs")
+    baseline = results["word_acc (lists)"]
+    for name, seconds in results.items():
+        print(f"{name:<28}{seconds * 1000:>10.2f} ms{seconds / baseline:>10.2f}x")
+
+
+def benchmark_tokenise(file_path: str, n: int, repeat: int) -> None:
+    """Compare the implementations of `basic_tokenise` on `n` sentences"""
+    sentences = load_sentences(file_path, n)
+    assert tokenise.basic_tokenise_batch(sentences) == [
+        basic_tokenise_legacy(sentence) for sentence in sentences
+    ]
+
+    results = {
+        "legacy": measure(
+            lambda: [basic_tokenise_legacy(sentence) for sentence in sentences],
+            repeat,
+        ),
+        "basic_tokenise": measure(
+            lambda: [tokenise.basic_tokenise(sentence) for sentence in sentences],
+            repeat,
+        ),
+        "batch": measure(lambda: tokenise.basic_tokenise_batch(sentences), repeat),
+        "batch (memo)": measure(
+            lambda: tokenise.basic_tokenise_batch(sentences, memo_size=n), repeat
+        ),
+    }
+    print(f"{n} sentences, {len(set(sentences))} distinct")
+    baseline = results["legacy"]
+    for name, seconds in results.items():
+        print(f"{name:<24}{seconds * 1000:>10.2f} ms{seconds / baseline:>10.2f}x")
+
+
+def parse_arguments(
+    arguments: Optional[List[str]] = None,
+) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks for the evaluation code. Timings are relative to the first line."
+    )
+    parser.add_argument(
+        "benchmark",
+        choices=["align", "score", "tokenise"],
+        help="Which benchmark to run",
+    )
+    parser.add_argument(
+        "--file",
+        default=DATA,
+        help="JSONL file with sentence pairs in the fields 'orig' and 'norm' (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--length",
+        type=int,
+        default=2000,
+        help="Length of the test paragraphs in characters, number of sentences for 'tokenise' (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of repetitions, the best time is reported (default: %(default)s)",
+    )
+    return parser.parse_args(arguments)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    args = parse_arguments(arguments)
+    if args.benchmark == "align":
+        benchmark_align(args.file, args.length, args.repeat)
+    elif args.benchmark == "score":
+        benchmark_score(args.file, args.length, args.repeat)
+    elif args.benchmark == "tokenise":
+        benchmark_tokenise(args.file, args.length, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class Vocabulary:
+    """Interned tokens: each distinct token gets an id, the empty token has id 0"""
+
+    EMPTY = 0
+
+    def __init__(self, tokens: Iterable[str] = ()) -> None:
+        self.tokens: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.add("")
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token: str) -> int:
+        """Id of `token`, which gets added if necessary"""
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def mask(self, types: Iterable[str]) -> np.ndarray:
+        """Boolean array over the ids, True for the ids of `types`"""
+        mask = np.zeros(len(self.tokens), dtype=bool)
+        ids = [self.ids[token] for token in types if token in self.ids]
+        mask[ids] = True
+        return mask
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+class ColumnarAlignment:
+    """
+    Word alignments of a corpus (see `align`) as a struct of arrays.
+
+    Word pair k is `(vocab.tokens[ref_ids[k]], vocab.tokens[pred_ids[k]],
+    weights[k])`, the word pairs of sentence s are those from `offsets[s]` to
+    `offsets[s + 1]`. Compared to lists of tuples of strings, this takes a
+    fraction of the memory and lets the scorers in `metrics` work with NumPy
+    reductions instead of Python loops.
+    """
+
+    def __init__(
+        self,
+        vocab: Vocabulary,
+        ref_ids: np.ndarray,
+        pred_ids: np.ndarray,
+        weights: np.ndarray,
+        offsets: np.ndarray,
+    ) -> None:
+        self.vocab = vocab
+        self.ref_ids = ref_ids
+        self.pred_ids = pred_ids
+        self.weights = weights
+        self.offsets = offsets
+
+    @classmethod
+    def from_lists(
+        cls,
+        alignments: Sequence[Sequence[Tuple[str, str, float]]],
+        vocab: Optional[Vocabulary] = None,
+    ) -> "ColumnarAlignment":
+        """Convert the output of `align`, adding the tokens to `vocab` (or a new one)"""
+        if vocab is None:
+            vocab = Vocabulary()
+        add = vocab.add
+        ref_ids = [add(ref) for sent in alignments for ref, _, _ in sent]
+        pred_ids = [add(pred) for sent in alignments for _, pred, _ in sent]
+        weights = [weight for sent in alignments for _, _, weight in sent]
+        offsets = np.zeros(len(alignments) + 1, dtype=np.int64)
+        np.cumsum([len(sent) for sent in alignments], out=offsets[1:])
+        return cls(
+            vocab,
+            np.array(ref_ids, dtype=np.int32),
+            np.array(pred_ids, dtype=np.int32),
+            np.array(weights, dtype=np.float64),
+            offsets,
+        )
+
+    def to_lists(self) -> List[List[Tuple[str, str, float]]]:
+        """Inverse of `from_lists`"""
+        tokens = self.vocab.tokens
+        words = list(
+            zip(
+                [tokens[i] for i in self.ref_ids.tolist()],
+                [tokens[i] for i in self.pred_ids.tolist()],
+                self.weights.tolist(),
+            )
+        )
+        bounds = self.offsets.tolist()
+        return [words[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    def with_vocab(self, vocab: Vocabulary) -> "ColumnarAlignment":
+        """The same alignments with the ids of `vocab`, which gets extended if necessary"""
+        if vocab is self.vocab:
+            return self
+        mapping = np.array([vocab.add(token) for token in self.vocab.tokens])
+        return ColumnarAlignment(
+            vocab,
+            mapping[self.ref_ids].astype(np.int32),
+            mapping[self.pred_ids].astype(np.int32),
+            self.weights,
+            self.offsets,
+        )
+
+    @property
+    def equal(self) -> np.ndarray:
+        """Mask of the word pairs with identical tokens"""
+        return self.ref_ids == self.pred_ids
+
+    @property
+    def sentence_ids(self) -> np.ndarray:
+        """Index of the sentence of each word pair"""
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+# Word alignments as returned by `align` or in columnar form
+Alignments = Union[List[List[Tuple[str, str, float]]], ColumnarAlignment]
+
+
+def as_columnar(
+    alignments: Alignments,
+    vocab: Optional[Vocabulary] = None,
+) -> ColumnarAlignment:
+    """`alignments` as a `ColumnarAlignment` (with the ids of `vocab`, if given)"""
+    if isinstance(alignments, ColumnarAlignment):
+        return alignments if vocab is None else alignments.with_vocab(vocab)
+    return ColumnarAlignment.from_lists(alignments, vocab)
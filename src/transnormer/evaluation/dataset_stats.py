@@ -1,15 +1,32 @@
 import argparse
+import concurrent.futures
+import os
 import pickle
 import random
+import re
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
+import datasets
 import numpy as np
 import tomli
-import torch
 
+from transnormer.data import loader, process
 from transnormer.evaluation import align_levenshtein, tokenise
-from transnormer.models import train_model
+from transnormer.evaluation.type_stats_store import load_type_stats, save_type_stats
+
+# Strings that the ByT5 tokenizer encodes as a single special token instead of bytes
+BYT5_SPECIAL_TOKENS = re.compile(r"</s>|<pad>|<unk>|<extra_id_\d+>")
 
 
 def type_alignment_stats(
@@ -44,66 +61,242 @@ def type_alignment_stats(
     return stats
 
 
-def get_typestats_for_training_data(
-    configfile: str, outfile: str, src: str = "orig"
-) -> None:
+def add_type_alignment_stats(
+    stats: Dict[str, Dict[str, int]], other: Mapping[str, Mapping[str, int]]
+) -> Dict[str, Dict[str, int]]:
+    """Add the counts of the type stats `other` to `stats` (in place) and return it"""
+    for src, other_trg_cnts in other.items():
+        trg_cnts = stats.get(src)
+        if trg_cnts is None:
+            stats[src] = dict(other_trg_cnts)
+            continue
+        for trg, cnt in other_trg_cnts.items():
+            trg_cnts[trg] = trg_cnts.get(trg, 0) + cnt
+    return stats
+
+
+def merge_type_alignment_stats(
+    partial_stats: Iterable[Mapping[str, Mapping[str, int]]]
+) -> Dict[str, Dict[str, int]]:
     """
-    Pass a config file for a model and get the stats for the training data that belong to this model.
+    Merge type stats of parts of a dataset (e.g. shards or training files) into the
+    type stats of the whole dataset
+    """
+    stats: Dict[str, Dict[str, int]] = {}
+    for other in partial_stats:
+        add_type_alignment_stats(stats, other)
+    return stats
+
+
+def _shard_type_alignment_stats(
+    shard: Tuple[Sequence[str], Sequence[str]]
+) -> Dict[str, Dict[str, int]]:
+    """Tokenise and align a shard of sentence pairs and get its type stats"""
+    src_sents, trg_sents = shard
+    alignment = align_levenshtein.align(
+        tokenise.basic_tokenise_batch(src_sents),
+        tokenise.basic_tokenise_batch(trg_sents),
+    )
+    return type_alignment_stats(alignment)
+
+
+def _shards(
+    src_sents: Sequence[str], trg_sents: Sequence[str], shard_size: int
+) -> Iterator[Tuple[Sequence[str], Sequence[str]]]:
+    for start in range(0, len(src_sents), shard_size):
+        shard = slice(start, start + shard_size)
+        yield src_sents[shard], trg_sents[shard]
 
-    `src` must be one of {"orig", "norm"}
+
+def sharded_type_alignment_stats(
+    src_sents: Sequence[str],
+    trg_sents: Sequence[str],
+    n_jobs: int = 1,
+    shard_size: int = 10_000,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Get the type stats of the sentence pairs (`src_sents[i]`, `trg_sents[i]`)
+    (see `type_alignment_stats`).
+
+    The pairs are split into shards of `shard_size` pairs. Each shard is tokenised,
+    aligned and counted on its own (by a pool of `n_jobs` processes if `n_jobs` > 1),
+    and the partial type stats are merged as they come in. Only the alignments of
+    one shard per process are held in memory. The result is the same as for the
+    whole dataset at once.
+    """
+    shards = _shards(src_sents, trg_sents, shard_size)
+    if n_jobs <= 1:
+        return merge_type_alignment_stats(map(_shard_type_alignment_stats, shards))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return merge_type_alignment_stats(
+            executor.map(_shard_type_alignment_stats, shards)
+        )
+
+
+def load_type_alignment_stats(path: str) -> Mapping[str, Dict[str, int]]:
+    """
+    Load type stats written by `get_typestats_for_training_data`: a pickle file, or
+    a directory with a type stats store (see `type_stats_store.load_type_stats`)
+    """
+    if os.path.isdir(path):
+        return load_type_stats(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def tokenizer_name(configs: Dict[str, Any]) -> Optional[str]:
+    """Name of the tokenizer that `train_model.load_tokenizer` loads"""
+    if "tokenizer" in configs["tokenizer"]:
+        return configs["tokenizer"]["tokenizer"]
+    return configs["language_models"].get("checkpoint_encoder_decoder")
+
+
+def filter_dataset_dict_for_byte_length(
+    dataset_dict: datasets.DatasetDict,
+    configs: Dict[str, Any],
+) -> datasets.DatasetDict:
     """
+    Filter out examples with input lengths out of the range given in the config
+    file, like `train_model.filter_dataset_dict_for_length` does, but without the
+    tokenizer.
 
-    # Get the training data from training_config.toml
-    print("Loading and processing the training data ...")
-    # (1) Preparations
-    # Load configs
-    with open(configfile, mode="rb") as fp:
-        CONFIGS = tomli.load(fp)
+    This is only equivalent for a ByT5 tokenizer, which encodes a string as its
+    UTF-8 bytes and an EOS token. Raises a ValueError if the lengths are to be
+    filtered and the tokenizer is not ByT5. Inputs that contain special token
+    strings (e.g. "</s>") are tokenized differently, their number is reported.
+    """
+    min_length = configs["tokenizer"].get("min_length_input", 0)
+    max_length = configs["tokenizer"].get("max_length_input", -1)
+    if not min_length and max_length == -1:
+        return dataset_dict
+    name = tokenizer_name(configs)
+    if name is None or "byt5" not in name.lower():
+        raise ValueError(
+            f"Input lengths cannot be computed without the tokenizer '{name}', only for ByT5"
+        )
 
+    # The input of the model, see `train_model.tokenize_input_and_output`
+    src = "norm" if configs["data"].get("reverse_labels", False) else "orig"
+    for split, dataset in dataset_dict.items():
+        inputs = dataset[src]
+        lengths = [len(s.encode("utf-8")) + 1 for s in inputs]
+        n_special = sum(BYT5_SPECIAL_TOKENS.search(s) is not None for s in inputs)
+        if n_special:
+            print(
+                f"Warning: {n_special} inputs in the {split} split contain special "
+                "token strings, their byte lengths differ from their token lengths"
+            )
+        dataset = dataset.add_column("length", lengths)
+        dataset = process.filter_dataset_by_length(dataset, max_length, min_length)
+        dataset_dict[split] = dataset
+
+    return dataset_dict
+
+
+def load_training_data(
+    configs: Dict[str, Any], strings_only: bool = False
+) -> datasets.DatasetDict:
+    """
+    Load, resample and length-filter the data splits as `train_model` does for
+    training.
+
+    With `strings_only`, neither the tokenizer nor torch are loaded: the lengths are
+    filtered by byte length (see `filter_dataset_dict_for_byte_length`), which only
+    works for a ByT5 tokenizer.
+    """
     # Fix seeds for reproducibilty
-    random.seed(CONFIGS["random_seed"])
-    np.random.seed(CONFIGS["random_seed"])
-    torch.manual_seed(CONFIGS["random_seed"])
+    random.seed(configs["random_seed"])
+    np.random.seed(configs["random_seed"])
+
+    if strings_only:
+        dataset_dict = loader.load_and_merge_datasets(configs)
+        return filter_dataset_dict_for_byte_length(dataset_dict, configs)
+
+    import torch
+
+    from transnormer.models import train_model
+
+    torch.manual_seed(configs["random_seed"])
 
     # GPU set-up
-    device = torch.device(CONFIGS["gpu"] if torch.cuda.is_available() else "cpu")
+    device = torch.device(configs["gpu"] if torch.cuda.is_available() else "cpu")
     # limit memory usage to 80%
     if torch.cuda.is_available():
         torch.cuda.set_per_process_memory_fraction(0.8, device)
 
-    # (2) Load data
-    dataset_dict = train_model.load_and_merge_datasets(CONFIGS)
+    # Load data
+    dataset_dict = train_model.load_and_merge_datasets(configs)
 
-    # (3) Tokenize data
-    tokenizer = train_model.load_tokenizer(CONFIGS)
+    # Tokenize data
+    tokenizer = train_model.load_tokenizer(configs)
     prepared_dataset_dict = train_model.tokenize_dataset_dict(
-        dataset_dict, tokenizer, CONFIGS
+        dataset_dict, tokenizer, configs
     )
 
-    # (3.1) Optional: Filter data for length
-    prepared_dataset_dict = train_model.filter_dataset_dict_for_length(
-        prepared_dataset_dict, CONFIGS
-    )
+    # Optional: Filter data for length
+    return train_model.filter_dataset_dict_for_length(prepared_dataset_dict, configs)
 
-    if src == "orig":
-        src_sents = prepared_dataset_dict["train"]["orig"]
-        trg_sents = prepared_dataset_dict["train"]["norm"]
-    elif src == "norm":
-        src_sents = prepared_dataset_dict["train"]["norm"]
-        trg_sents = prepared_dataset_dict["train"]["orig"]
-    else:
+
+def get_typestats_for_training_data(
+    configfile: Optional[str],
+    outfile: str,
+    src: str = "orig",
+    strings_only: bool = False,
+    data_files: Sequence[str] = (),
+    merge_files: Sequence[str] = (),
+    n_jobs: int = 1,
+    shard_size: int = 10_000,
+    out_format: str = "pickle",
+) -> None:
+    """
+    Pass a config file for a model and get the stats for the training data that belong to this model.
+
+    `src` must be one of {"orig", "norm"}. With `strings_only`, the data is loaded
+    without the tokenizer (see `load_training_data`).
+
+    Instead of (or in addition to) the training data of a config file, the stats of
+    whole JSONL `data_files` are computed. The type stats in `merge_files`
+    (e.g. of the training files used so far) are merged into the result, so new
+    training files can be added without recomputing the stats of the old ones. The
+    alignment is sharded (see `sharded_type_alignment_stats`).
+
+    `out_format` is "pickle" for nested dicts or "store" for a memory-mappable type
+    stats store in the directory `outfile` (see `type_stats_store.save_type_stats`).
+    """
+    if src not in ("orig", "norm"):
         raise ValueError("Argument `src` must be one of {'norm', 'orig'}.")
+    trg = "orig" if src == "norm" else "norm"
 
-    print(f"Computing the alignments. Current time: {datetime.now().time()}")
-    alignment = align_levenshtein.align(
-        [tokenise.basic_tokenise(sent) for sent in src_sents],
-        [tokenise.basic_tokenise(sent) for sent in trg_sents],
-    )
-    print(f"Done computing the alignments. Current time: {datetime.now().time()}")
-    stats = type_alignment_stats(alignment)
+    datasets_to_count = []
+    if configfile is not None:
+        # Get the training data from training_config.toml
+        print("Loading and processing the training data ...")
+        # Load configs
+        with open(configfile, mode="rb") as fp:
+            CONFIGS = tomli.load(fp)
+        prepared_dataset_dict = load_training_data(CONFIGS, strings_only)
+        datasets_to_count.append(prepared_dataset_dict["train"])
+    for path in data_files:
+        datasets_to_count.append(
+            datasets.load_dataset("json", data_files=path, split="train")
+        )
+
+    partial_stats = [load_type_alignment_stats(path) for path in merge_files]
+    for dataset in datasets_to_count:
+        print(f"Computing the alignments. Current time: {datetime.now().time()}")
+        partial_stats.append(
+            sharded_type_alignment_stats(
+                dataset[src], dataset[trg], n_jobs=n_jobs, shard_size=shard_size
+            )
+        )
+        print(f"Done computing the alignments. Current time: {datetime.now().time()}")
+    stats = merge_type_alignment_stats(partial_stats)
 
-    with open(outfile, "wb") as f:
-        pickle.dump(stats, f)
+    if out_format == "store":
+        save_type_stats(outfile, stats)
+    else:
+        with open(outfile, "wb") as f:
+            pickle.dump(stats, f)
 
     return
 
@@ -114,6 +307,7 @@ def parse_and_check_arguments(
     parser = argparse.ArgumentParser(
         description="""
         Pass a config file for a model and get the type stats for the training data that belong to this model.
+        Alternatively, get the type stats of JSONL data files and/or merge previously computed type stats, e.g. to add a new training file to existing stats.
 
         Type stats describe which types from the base layer are mapped onto which types from the other layer and how often this mapping occurs in the dataset.
         The base layer is the base for the tokenization. Tokens on the other layer may be segmented in order to be mappable 1:1 onto base layer tokens. See Bawden et al. 2022.
@@ -124,14 +318,33 @@ def parse_and_check_arguments(
     parser.add_argument(
         "-c",
         "--config",
-        required=True,
         help="Path to the config file.",
     )
+    parser.add_argument(
+        "-d",
+        "--data-file",
+        nargs="+",
+        default=[],
+        help="JSONL file(s) with 'orig' and 'norm' fields, whose sentence pairs are all counted.",
+    )
+    parser.add_argument(
+        "-m",
+        "--merge",
+        nargs="+",
+        default=[],
+        help="Type stats (pickle files or stores) to merge into the output (e.g. of the training files used so far).",
+    )
     parser.add_argument(
         "-o",
         "--out",
         required=True,
-        help="Path to the output pickled file.",
+        help="Path to the output pickled file (or directory, for --out-format=store).",
+    )
+    parser.add_argument(
+        "--out-format",
+        choices=["pickle", "store"],
+        default="pickle",
+        help="Output pickled nested dicts or a memory-mappable type stats store (default: %(default)s)",
     )
     parser.add_argument(
         "-b",
@@ -140,14 +353,43 @@ def parse_and_check_arguments(
         choices=["orig", "norm"],
         default="orig",
     )
+    parser.add_argument(
+        "--strings-only",
+        action="store_true",
+        help="Load and filter the training data without the tokenizer and torch. Input lengths are filtered by byte length, so this only works for ByT5 tokenizers.",
+    )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="Number of processes for the alignment of the shards (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=10_000,
+        help="Number of sentence pairs per shard (default: %(default)s)",
+    )
     args = parser.parse_args(arguments)
+    if args.config is None and not args.data_file and not args.merge:
+        parser.error("one of --config, --data-file or --merge is required")
 
     return args
 
 
 def main(arguments: Optional[List[str]] = None) -> None:
     args = parse_and_check_arguments(arguments)
-    get_typestats_for_training_data(args.config, args.out, args.base_layer)
+    get_typestats_for_training_data(
+        args.config,
+        args.out,
+        args.base_layer,
+        args.strings_only,
+        data_files=args.data_file,
+        merge_files=args.merge,
+        n_jobs=args.n_jobs,
+        shard_size=args.shard_size,
+        out_format=args.out_format,
+    )
 
 
 if __name__ == "__main__":
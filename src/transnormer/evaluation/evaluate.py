@@ -2,64 +2,600 @@
 # developed by Bawden et al (2022), see: https://github.com/rbawden/ModFr-Norm#evaluation
 
 import argparse
+import contextlib
+import glob
+import itertools
 import json
 import os
 import pickle
 import re
-from typing import Any, Dict, List, Optional
+import statistics
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
+import numpy as np
+
+from transnormer.evaluation.metrics import (
+    align_directions,
+    lev_sums,
+    word_acc_scores,
+    word_counts,
+)
 from transnormer.evaluation.metrics import word_acc_final as acc
 from transnormer.evaluation.metrics import lev_norm_corpuslevel as lev_norm_c
-from transnormer.evaluation import tokenise
+from transnormer.evaluation import align_levenshtein, tokenise
+from transnormer.evaluation.alignment_cache import AlignmentCache
+from transnormer.evaluation.sentence_counts import (
+    COLUMNS,
+    SKIPPED,
+    load_sentence_counts,
+    save_sentence_counts,
+    sentence_key,
+)
+from transnormer.evaluation.significance import bootstrap_ci
+from transnormer.evaluation.wedit_distance_align import COST_MODELS
 
 ROOT = os.path.abspath(
     os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../..")
 )
-CACHE = os.path.join(ROOT, ".cache/cached-alignments.pkl")
+CACHE = os.path.join(ROOT, ".cache/cached-alignments.sqlite")
 if not os.path.isdir(os.path.dirname(CACHE)):
     os.makedirs(os.path.dirname(CACHE))
+# Default capacity of the alignment cache, least recently used alignments are evicted
+CACHE_MAX_BYTES = 2**30
 
 
 def read_jsonl_file(file_path: str, field_name: str) -> List[str]:
-    data = []
+    return list(iter_jsonl_file(file_path, field_name))
+
+
+def read_plain_text_file(file_path: str) -> List[str]:
+    return list(iter_plain_text_file(file_path))
+
+
+def iter_jsonl_file(file_path: str, field_name: str) -> Iterator[str]:
     with open(file_path, "r") as file:
         for line in file:
             record = json.loads(line)
             if field_name in record:
-                data.append(record[field_name].strip())
-    return data
+                yield record[field_name].strip()
 
 
-def read_plain_text_file(file_path: str) -> List[str]:
-    data = []
+def iter_plain_text_file(file_path: str) -> Iterator[str]:
     with open(file_path, "r") as file:
         for line in file:
-            data.append(line.strip())
-    return data
+            yield line.strip()
 
 
 def get_metrics(
-    ref: List[str], pred: List[str], align_types: List[str]
+    ref: List[str],
+    pred: List[str],
+    align_types: List[str],
+    anchored: bool = False,
+    n_jobs: int = 1,
+    cache: Optional[AlignmentCache] = None,
+    trim: bool = False,
+    cost_model: str = "default",
+    alignment_store: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Computes evaluation metrics over two lists of sentences
 
     Internally each sentence is tokenized and aligned with its corresponding sentence in the other list. Then, the scores are computed.
+    Alignments are looked up in and added to `cache` (by default the cache at `CACHE`). The hit/miss/eviction counters of the cache and the number of sentence pairs per alignment path (see `align`) are part of the metrics.
+    If `alignment_store` is given, the word alignments are saved there (see `save_alignments`).
     """
-    ref_tok = [tokenise.basic_tokenise(sent) for sent in ref]
-    pred_tok = [tokenise.basic_tokenise(sent) for sent in pred]
+    if cache is None:
+        with AlignmentCache(CACHE, max_bytes=CACHE_MAX_BYTES) as default_cache:
+            return get_metrics(
+                ref,
+                pred,
+                align_types,
+                anchored,
+                n_jobs,
+                default_cache,
+                trim,
+                cost_model,
+                alignment_store,
+            )
 
-    metrics: Dict[str, Any] = {"n": len(ref)}
+    ref_tok = tokenise.basic_tokenise_batch(ref)
+    pred_tok = tokenise.basic_tokenise_batch(pred)
 
-    acc_scores = acc(ref_tok, pred_tok, align_types, cache_file=CACHE)
+    metrics: Dict[str, Any] = {"n": len(ref)}
+    align_levenshtein.path_counts.clear()
+
+    acc_scores = acc(
+        ref_tok,
+        pred_tok,
+        align_types,
+        cache_file=cache,
+        anchored=anchored,
+        n_jobs=n_jobs,
+        trim=trim,
+        cost_model=cost_model,
+        alignment_store=alignment_store,
+    )
     metrics["acc_harmonized"] = acc_scores["both"] if "both" in align_types else None
     metrics["per_sent"] = acc_scores["per_sent"]
 
     dist_score = lev_norm_c(ref, pred)
     metrics["dist_norm_c"] = dist_score
 
+    add_cache_metrics(metrics, cache)
+    return metrics
+
+
+def get_metrics_incremental(
+    ref: List[str],
+    pred: List[str],
+    align_types: List[str],
+    previous: Optional[Dict[bytes, np.ndarray]] = None,
+    anchored: bool = False,
+    n_jobs: int = 1,
+    cache: Optional[AlignmentCache] = None,
+    trim: bool = False,
+    cost_model: str = "default",
+) -> Tuple[Dict[str, Any], List[bytes], np.ndarray]:
+    """Computes the metrics of `get_metrics`, re-using the per-sentence counts of unchanged sentence pairs
+
+    `previous` holds the per-sentence counts of an earlier evaluation (see `load_sentence_counts`), by sentence pair hash.
+    Only the pairs that are not in `previous` get tokenised, aligned and scored, the corpus metrics are computed from the combined per-sentence counts.
+    The number of re-used pairs is part of the metrics.
+    Returns the metrics, the hashes and the counts of the sentence pairs (see `save_sentence_counts`).
+    """
+    if cache is None:
+        with AlignmentCache(CACHE, max_bytes=CACHE_MAX_BYTES) as default_cache:
+            return get_metrics_incremental(
+                ref,
+                pred,
+                align_types,
+                previous,
+                anchored,
+                n_jobs,
+                default_cache,
+                trim,
+                cost_model,
+            )
+    if previous is None:
+        previous = {}
+
+    # columns needed for the metrics
+    needed = [COLUMNS.index("dist"), COLUMNS.index("chars")]
+    for direction in _directions(align_types):
+        needed += [
+            COLUMNS.index(f"correct_{direction}"),
+            COLUMNS.index(f"total_{direction}"),
+        ]
+
+    keys = [sentence_key(sent_ref, sent_pred) for sent_ref, sent_pred in zip(ref, pred)]
+    counts = np.full((len(keys), len(COLUMNS)), -1, dtype=np.int64)
+    changed = []
+    for i, key in enumerate(keys):
+        previous_counts = previous.get(key)
+        if previous_counts is not None and (previous_counts[needed] != -1).all():
+            counts[i] = previous_counts
+        else:
+            changed.append(i)
+
+    align_levenshtein.path_counts.clear()
+    if changed:
+        counts[changed] = get_sentence_counts(
+            [ref[i] for i in changed],
+            [pred[i] for i in changed],
+            align_types,
+            anchored,
+            n_jobs,
+            cache,
+            trim,
+            cost_model,
+        )
+
+    metrics: Dict[str, Any] = {"n": len(ref)}
+    metrics.update(metrics_from_counts(counts, align_types))
+    metrics["reused"] = len(keys) - len(changed)
+    add_cache_metrics(metrics, cache)
+    return metrics, keys, counts
+
+
+def get_metrics_quick(
+    ref: List[str],
+    pred: List[str],
+    align_types: List[str],
+    target_width: float = 0.01,
+    confidence: float = 0.95,
+    batch_size: int = 1000,
+    seed: int = 42,
+    anchored: bool = False,
+    n_jobs: int = 1,
+    cache: Optional[AlignmentCache] = None,
+    trim: bool = False,
+    cost_model: str = "default",
+) -> Dict[str, Any]:
+    """Estimates the metrics of `get_metrics` from a random sample of the sentence pairs
+
+    Random batches of `batch_size` sentence pairs are scored one after the other, until the `confidence` intervals of the harmonized accuracy (if in `align_types`) and of the normalized Levenshtein distance are narrower than `target_width`, or all pairs are scored.
+    The metrics contain the number of scored pairs ("n"), the number of all pairs ("n_total") and the estimated error of the metrics, i.e. half the width of their confidence intervals (see `ratio_error`).
+    Pairs that cannot be aligned are left out of the accuracies, like in `get_metrics`. Raises a ValueError if there are no sentence pairs.
+    """
+    if cache is None:
+        with AlignmentCache(CACHE, max_bytes=CACHE_MAX_BYTES) as default_cache:
+            return get_metrics_quick(
+                ref,
+                pred,
+                align_types,
+                target_width,
+                confidence,
+                batch_size,
+                seed,
+                anchored,
+                n_jobs,
+                default_cache,
+                trim,
+                cost_model,
+            )
+
+    n_total = min(len(ref), len(pred))
+    if not n_total:
+        raise ValueError("No sentence pairs to evaluate")
+    order = np.random.default_rng(seed).permutation(n_total)
+    align_levenshtein.path_counts.clear()
+    counts = np.zeros((0, len(COLUMNS)), dtype=np.int64)
+    errors: Dict[str, Optional[float]] = {}
+    for start in range(0, n_total, batch_size):
+        batch = order[slice(start, start + batch_size)]
+        counts = np.concatenate(
+            [
+                counts,
+                get_sentence_counts(
+                    [ref[i] for i in batch],
+                    [pred[i] for i in batch],
+                    align_types,
+                    anchored,
+                    n_jobs,
+                    cache,
+                    trim,
+                    cost_model,
+                ),
+            ]
+        )
+        errors = quick_errors(counts, align_types, confidence, n_total)
+        if all(
+            error is not None and 2 * error < target_width for error in errors.values()
+        ):
+            break
+
+    metrics: Dict[str, Any] = {"n": len(counts), "n_total": n_total}
+    metrics.update(metrics_from_counts(counts, align_types))
+    del metrics["per_sent"]
+    metrics["acc_harmonized_error"] = errors.get("acc_harmonized")
+    metrics["dist_norm_c_error"] = errors["dist_norm_c"]
+    metrics["confidence"] = confidence
+    add_cache_metrics(metrics, cache)
+    return metrics
+
+
+def quick_errors(
+    counts: np.ndarray, align_types: List[str], confidence: float, n_total: int
+) -> Dict[str, Optional[float]]:
+    """Estimated errors of the harmonized accuracy (if in `align_types`) and the normalized Levenshtein distance of a sample (`counts`) of `n_total` sentence pairs"""
+    column = {name: counts[:, COLUMNS.index(name)] for name in COLUMNS}
+    for direction in ["ref", "pred"]:
+        # pairs that could not be aligned add nothing to the accuracy of a direction
+        skipped = column[f"total_{direction}"] == SKIPPED
+        for name in [f"correct_{direction}", f"total_{direction}"]:
+            column[name] = np.where(skipped, 0, column[name])
+    errors: Dict[str, Optional[float]] = {}
+    if "both" in align_types:
+        errors["acc_harmonized"] = ratio_error(
+            [
+                (column["correct_ref"], column["total_ref"]),
+                (column["correct_pred"], column["total_pred"]),
+            ],
+            confidence,
+            n_total,
+        )
+    errors["dist_norm_c"] = ratio_error(
+        [(column["dist"], column["chars"])], confidence, n_total
+    )
+    return errors
+
+
+def ratio_error(
+    ratios: List[Tuple[np.ndarray, np.ndarray]], confidence: float, n_total: int
+) -> Optional[float]:
+    """Half the width of the `confidence` interval of the mean of ratio estimates sum(x)/sum(y) over a sample of `n_total` items
+
+    The variance of each ratio estimate is linearized (delta method), with a finite population correction. None if the sample is too small.
+    """
+    n = len(ratios[0][0])
+    if n < 2:
+        return None
+    # linearized contribution of each item to the mean of the ratios
+    residuals = np.zeros(n)
+    for x, y in ratios:
+        if y.sum() == 0:
+            return None
+        ratio = x.sum() / y.sum()
+        residuals += (x - ratio * y) / y.mean()
+    residuals /= len(ratios)
+    variance = residuals.var(ddof=1) / n * (1 - n / n_total)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    return z * float(np.sqrt(variance))
+
+
+def get_sentence_counts(
+    ref: List[str],
+    pred: List[str],
+    align_types: List[str],
+    anchored: bool = False,
+    n_jobs: int = 1,
+    cache: Optional[AlignmentCache] = None,
+    trim: bool = False,
+    cost_model: str = "default",
+) -> np.ndarray:
+    """Per-sentence counts (see `COLUMNS`) of the sentence pairs, the counts of directions that `align_types` does not need are -1, those of directions in which a pair could not be aligned are `SKIPPED`"""
+    alignments = align_directions(
+        tokenise.basic_tokenise_batch(ref),
+        tokenise.basic_tokenise_batch(pred),
+        align_types,
+        cache_file=cache,
+        anchored=anchored,
+        n_jobs=n_jobs,
+        trim=trim,
+        cost_model=cost_model,
+        keep_skipped=True,
+    )
+    counts = np.full((len(ref), len(COLUMNS)), -1, dtype=np.int64)
+    for direction, alignment in zip(["ref", "pred"], alignments):
+        if alignment is not None:
+            columns = [
+                COLUMNS.index(f"correct_{direction}"),
+                COLUMNS.index(f"total_{direction}"),
+            ]
+            counts[:, columns] = np.column_stack(word_counts(alignment))
+            # skipped pairs have an empty alignment
+            skipped = [i for i, sent in enumerate(alignment) if not sent]
+            counts[np.ix_(skipped, columns)] = SKIPPED
+    columns = [COLUMNS.index("dist"), COLUMNS.index("chars")]
+    counts[:, columns] = [
+        lev_sums([sent_ref], [sent_pred]) for sent_ref, sent_pred in zip(ref, pred)
+    ]
+    return counts
+
+
+def metrics_from_counts(counts: np.ndarray, align_types: List[str]) -> Dict[str, Any]:
+    """Harmonized accuracy, sentence-wise accuracies and normalized Levenshtein distance from per-sentence counts"""
+    metrics: Dict[str, Any] = {"acc_harmonized": None}
+    per_sent_scores = {}
+    scores: Dict[str, float] = {}
+    aligned = {}
+    for direction in _directions(align_types):
+        correct = counts[:, COLUMNS.index(f"correct_{direction}")]
+        total = counts[:, COLUMNS.index(f"total_{direction}")]
+        # pairs that could not be aligned are left out, like in `get_metrics`
+        aligned[direction] = total != SKIPPED
+        correct, total = correct[aligned[direction]], total[aligned[direction]]
+        if (total == 0).any():
+            raise ZeroDivisionError("Sentence without tokens")
+        per_sent_scores[direction] = correct / total
+        total_corpus = int(total.sum())
+        scores[direction] = int(correct.sum()) / total_corpus if total_corpus else 0
+    if "both" in align_types:
+        metrics["acc_harmonized"] = (scores["ref"] + scores["pred"]) / 2
+        # sentence-wise scores of the pairs that are aligned in both directions
+        both = aligned["ref"] & aligned["pred"]
+        per_sent_scores["both"] = (
+            per_sent_scores["ref"][both[aligned["ref"]]]
+            + per_sent_scores["pred"][both[aligned["pred"]]]
+        ) / 2
+    metrics["per_sent"] = {k: list(v) for k, v in per_sent_scores.items()}
+    metrics["dist_norm_c"] = int(counts[:, COLUMNS.index("dist")].sum()) / int(
+        counts[:, COLUMNS.index("chars")].sum()
+    )
     return metrics
 
 
+def _directions(align_types: List[str]) -> List[str]:
+    """Bases of the alignments that `align_types` needs (see `align_directions`)"""
+    directions = []
+    if align_types != ["pred"]:
+        directions.append("ref")
+    if align_types != ["ref"]:
+        directions.append("pred")
+    return directions
+
+
+def get_metrics_streaming(
+    ref: Iterable[str],
+    pred: Iterable[str],
+    align_types: List[str],
+    anchored: bool = False,
+    n_jobs: int = 1,
+    cache: Optional[AlignmentCache] = None,
+    trim: bool = False,
+    cost_model: str = "default",
+    chunk_size: int = 10000,
+    sent_wise_file: Optional[TextIO] = None,
+) -> Dict[str, Any]:
+    """Computes the metrics of `get_metrics` with memory bounded by `chunk_size`
+
+    `ref` and `pred` are read in lockstep, `chunk_size` sentence pairs at a time, and only running sums are kept.
+    Instead of being part of the metrics, the sentence-wise harmonized accuracy scores are written to `sent_wise_file` (comma-separated, like the textual output of `--sent-wise-file`).
+    """
+    if cache is None:
+        with AlignmentCache(CACHE, max_bytes=CACHE_MAX_BYTES) as default_cache:
+            return get_metrics_streaming(
+                ref,
+                pred,
+                align_types,
+                anchored,
+                n_jobs,
+                default_cache,
+                trim,
+                cost_model,
+                chunk_size,
+                sent_wise_file,
+            )
+
+    align_levenshtein.path_counts.clear()
+    n, n_scores = 0, 0
+    # correct and total tokens per alignment direction
+    counts = {"ref": [0, 0], "pred": [0, 0]}
+    dist, num_chars = 0, 0
+    pairs = zip(ref, pred)
+    while True:
+        chunk = list(itertools.islice(pairs, chunk_size))
+        if not chunk:
+            break
+        chunk_ref = [sent_ref for sent_ref, _ in chunk]
+        chunk_pred = [sent_pred for _, sent_pred in chunk]
+        alignments = align_directions(
+            tokenise.basic_tokenise_batch(chunk_ref),
+            tokenise.basic_tokenise_batch(chunk_pred),
+            align_types,
+            cache_file=cache,
+            anchored=anchored,
+            n_jobs=n_jobs,
+            trim=trim,
+            cost_model=cost_model,
+            keep_skipped=True,
+        )
+        per_sent = {}
+        aligned = {}
+        for direction, alignment in zip(["ref", "pred"], alignments):
+            if alignment is None:
+                continue
+            # pairs that could not be aligned have an empty alignment and are left out
+            aligned[direction] = np.array([bool(sent) for sent in alignment])
+            correct, total = word_counts(alignment)
+            correct, total = correct[aligned[direction]], total[aligned[direction]]
+            if (total == 0).any():
+                raise ZeroDivisionError("Sentence without tokens")
+            counts[direction][0] += int(correct.sum())
+            counts[direction][1] += int(total.sum())
+            per_sent[direction] = correct / total
+        if sent_wise_file is not None and "both" in align_types:
+            # sentence-wise scores of the pairs that are aligned in both directions
+            both = aligned["ref"] & aligned["pred"]
+            scores = (
+                per_sent["ref"][both[aligned["ref"]]]
+                + per_sent["pred"][both[aligned["pred"]]]
+            ) / 2
+            if n_scores and len(scores):
+                sent_wise_file.write(",")
+            sent_wise_file.write(",".join([str(score) for score in scores]))
+            n_scores += len(scores)
+        chunk_dist, chunk_num_chars = lev_sums(chunk_ref, chunk_pred)
+        dist += chunk_dist
+        num_chars += chunk_num_chars
+        n += len(chunk)
+
+    metrics: Dict[str, Any] = {"n": n, "acc_harmonized": None}
+    if "both" in align_types:
+        acc_ref, acc_pred = [
+            correct / total if total else 0 for correct, total in counts.values()
+        ]
+        metrics["acc_harmonized"] = (acc_ref + acc_pred) / 2
+    metrics["dist_norm_c"] = dist / num_chars
+    add_cache_metrics(metrics, cache)
+    return metrics
+
+
+def add_cache_metrics(metrics: Dict[str, Any], cache: AlignmentCache) -> None:
+    """Add the statistics of `cache` and the alignment paths to `metrics`"""
+    # evict now, so that the evictions are counted
+    if cache.max_entries is not None or cache.max_bytes is not None:
+        cache.prune(cache.max_entries, cache.max_bytes)
+    metrics["cache"] = cache.stats()
+    metrics["align_paths"] = dict(align_levenshtein.path_counts)
+
+
+def get_leaderboard_metrics(
+    ref: List[str],
+    preds: List[List[str]],
+    align_types: List[str],
+    anchored: bool = False,
+    n_jobs: int = 1,
+    cache: Optional[AlignmentCache] = None,
+    trim: bool = False,
+    cost_model: str = "default",
+) -> List[Dict[str, Any]]:
+    """Computes the evaluation metrics of several lists of predictions against the same references
+
+    Returns the metrics of `get_metrics` for each list in `preds`, without the cache statistics and alignment paths.
+    The references are tokenised once, identical sentence pairs (across and within the lists of predictions) are tokenised and aligned once, all pairs together (in parallel, see `n_jobs`).
+    """
+    if cache is None:
+        with AlignmentCache(CACHE, max_bytes=CACHE_MAX_BYTES) as default_cache:
+            return get_leaderboard_metrics(
+                ref,
+                preds,
+                align_types,
+                anchored,
+                n_jobs,
+                default_cache,
+                trim,
+                cost_model,
+            )
+
+    ref_tok = tokenise.basic_tokenise_batch(ref)
+    pred_tok: Dict[str, str] = {}
+    # index of each distinct pair of tokenised sentences
+    pair_ids: Dict[Tuple[str, str], int] = {}
+    pair_ids_per_pred = []
+    for pred in preds:
+        ids = []
+        for sent_ref, sent_pred in zip(ref_tok, pred):
+            if sent_pred not in pred_tok:
+                pred_tok[sent_pred] = tokenise.basic_tokenise(sent_pred)
+            pair = (sent_ref, pred_tok[sent_pred])
+            ids.append(pair_ids.setdefault(pair, len(pair_ids)))
+        pair_ids_per_pred.append(ids)
+
+    alignment_fwd, alignment_bckwd = align_directions(
+        [sent_ref for sent_ref, _ in pair_ids],
+        [sent_pred for _, sent_pred in pair_ids],
+        align_types,
+        cache_file=cache,
+        anchored=anchored,
+        n_jobs=n_jobs,
+        trim=trim,
+        cost_model=cost_model,
+        keep_skipped=True,
+    )
+
+    all_metrics = []
+    for pred, ids in zip(preds, pair_ids_per_pred):
+        # pairs that could not be aligned (empty alignments) are left out, like in `get_metrics`
+        acc_scores = word_acc_scores(
+            None
+            if alignment_fwd is None
+            else [alignment_fwd[i] for i in ids if alignment_fwd[i]],
+            None
+            if alignment_bckwd is None
+            else [alignment_bckwd[i] for i in ids if alignment_bckwd[i]],
+            align_types,
+        )
+        metrics: Dict[str, Any] = {"n": len(ref)}
+        metrics["acc_harmonized"] = (
+            acc_scores["both"] if "both" in align_types else None
+        )
+        metrics["per_sent"] = acc_scores["per_sent"]
+        metrics["dist_norm_c"] = lev_norm_c(ref, pred)
+        all_metrics.append(metrics)
+    return all_metrics
+
+
+def expand_pred_files(patterns: List[str]) -> List[str]:
+    """Paths of the prediction files, with glob patterns expanded (in sorted order)"""
+    pred_files = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            pred_files.extend(sorted(glob.glob(pattern)))
+        else:
+            pred_files.append(pattern)
+    return pred_files
+
+
 def parse_and_check_arguments(
     arguments: Optional[List[str]] = None,
 ) -> argparse.Namespace:
@@ -78,7 +614,9 @@ def parse_and_check_arguments(
         help="Path to the input file containing reference normalizations (typically a gold standard)",
     )
     parser.add_argument(
-        "--pred-file", help="Path to the input file containing predicted normalizations"
+        "--pred-file",
+        nargs="+",
+        help="Path to the input file containing predicted normalizations. Several files or glob patterns (quoted) can be given to evaluate them against the same reference in one run (leaderboard mode), which prints one line of metrics per file",
     )
     parser.add_argument(
         "--ref-field",
@@ -99,7 +637,101 @@ def parse_and_check_arguments(
         type=str,
         help="Path to a file where the sentence-wise accuracy scores get saved. For pickled output (list), the path must match /*.pkl/. Textual output is a comma-separated list",
     )
-    # parser.add_argument('-c', '--cache', help='pickle file containing cached alignments', default=None)
+    parser.add_argument(
+        "--alignment-store",
+        type=str,
+        help="Path to a directory where the word alignments get saved in a binary format, so that they can be re-scored without aligning again (see alignment_store.load_alignments)",
+    )
+    parser.add_argument(
+        "--anchored",
+        action="store_true",
+        help="Faster, approximate alignment: only align the stretches between tokens that occur in both sentences",
+    )
+    parser.add_argument(
+        "--trim",
+        action="store_true",
+        help="Faster, approximate alignment: only align the stretches between the tokens that both sentences start and end with",
+    )
+    parser.add_argument(
+        "--cost-model",
+        choices=sorted(COST_MODELS),
+        default="default",
+        help="Weights of the edit operations in the alignment (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used for the alignment (default: 1)",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        help="Maximum number of alignments in the alignment cache",
+    )
+    parser.add_argument(
+        "--cache-max-bytes",
+        type=int,
+        default=CACHE_MAX_BYTES,
+        help="Maximum size of the alignment cache in bytes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--counts-file",
+        type=str,
+        help="Path to a file where the per-sentence counts (correct and total tokens, Levenshtein distance and length) get saved, for a later evaluation with --previous-counts-file",
+    )
+    parser.add_argument(
+        "--previous-counts-file",
+        type=str,
+        help="Path to the --counts-file of an earlier evaluation. Sentence pairs that are unchanged since then are not aligned again. May be the same path as --counts-file",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        metavar="N_RESAMPLES",
+        help="Add bootstrap confidence intervals of the harmonized accuracy and the normalized Levenshtein distance to the output, computed from N_RESAMPLES resamples of the per-sentence counts",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Estimate the metrics from random batches of sentences, stopping as soon as the confidence intervals of the harmonized accuracy and the normalized Levenshtein distance are narrower than --quick-width. The output contains the number of scored sentences and the estimated errors",
+    )
+    parser.add_argument(
+        "--quick-width",
+        type=float,
+        default=0.01,
+        help="Target width of the confidence intervals with --quick (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--quick-batch-size",
+        type=int,
+        default=1000,
+        help="Number of sentences per batch with --quick (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the intervals with --quick and --bootstrap (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Random seed for the sampling with --quick and --bootstrap (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read the input files in chunks instead of loading them into memory, for very large files. The sentence-wise scores are written to --sent-wise-file incrementally (textual output only)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="Number of sentence pairs per chunk with --stream (default: %(default)s)",
+    )
     parser.add_argument(
         "--test-config",
         help="Path to the file containing the test configurations",
@@ -112,6 +744,42 @@ def parse_and_check_arguments(
         [x in ["both", "ref", "pred"] for x in align_types]
     ), 'Align types must belong to "both", "ref", "pred"'
 
+    args.pred_file = expand_pred_files(args.pred_file or [])
+    if not args.pred_file:
+        parser.error("--pred-file matches no file.")
+    if len(args.pred_file) > 1 and (args.sent_wise_file or args.alignment_store):
+        parser.error(
+            "--sent-wise-file and --alignment-store need a single prediction file."
+        )
+
+    if args.counts_file or args.previous_counts_file or args.bootstrap:
+        if len(args.pred_file) > 1 or args.alignment_store or args.stream:
+            parser.error(
+                "--counts-file, --previous-counts-file and --bootstrap need a single prediction file and no --alignment-store or --stream."
+            )
+
+    if args.quick:
+        if (
+            len(args.pred_file) > 1
+            or args.alignment_store
+            or args.stream
+            or args.sent_wise_file
+            or args.counts_file
+            or args.previous_counts_file
+            or args.bootstrap
+        ):
+            parser.error(
+                "--quick needs a single prediction file and cannot be combined with --alignment-store, --stream, --sent-wise-file, --bootstrap or counts files."
+            )
+
+    if args.stream:
+        if len(args.pred_file) > 1 or args.alignment_store:
+            parser.error(
+                "--stream needs a single prediction file and no --alignment-store."
+            )
+        if args.sent_wise_file and re.match(r".*.pkl", args.sent_wise_file):
+            parser.error("--stream only supports textual --sent-wise-file output.")
+
     if args.input_type == "jsonl":
         if not args.ref_field or not args.pred_field:
             parser.error(
@@ -121,15 +789,28 @@ def parse_and_check_arguments(
     return args
 
 
+def make_output(
+    args: argparse.Namespace, pred_file: str, metrics: Dict[str, Any]
+) -> Dict[str, Any]:
+    output = {"pred-file": pred_file, "ref-file": args.ref_file}
+    if args.test_config:
+        output["test-config"] = args.test_config
+    output.update(metrics)
+    return output
+
+
 def main(arguments: Optional[List[str]] = None) -> None:
     args = parse_and_check_arguments(arguments)
+    if args.stream:
+        main_streaming(args)
+        return
 
     if args.input_type == "jsonl":
         ref = read_jsonl_file(args.ref_file, args.ref_field)
-        pred = read_jsonl_file(args.pred_file, args.pred_field)
+        preds = [read_jsonl_file(path, args.pred_field) for path in args.pred_file]
     elif args.input_type == "text":
         ref = read_plain_text_file(args.ref_file)
-        pred = read_plain_text_file(args.pred_file)
+        preds = [read_plain_text_file(path) for path in args.pred_file]
 
     # # Optional: Apply transformation to ref and pred
     # # TODO: this should be a command-line option (pass transformation code snippet?)
@@ -139,7 +820,84 @@ def main(arguments: Optional[List[str]] = None) -> None:
 
     align_types = args.align_types.split(",")
 
-    metrics = get_metrics(ref, pred, align_types)
+    with AlignmentCache(
+        CACHE, max_entries=args.cache_max_entries, max_bytes=args.cache_max_bytes
+    ) as cache:
+        if len(preds) > 1:
+            for pred_file, metrics in zip(
+                args.pred_file,
+                get_leaderboard_metrics(
+                    ref,
+                    preds,
+                    align_types,
+                    args.anchored,
+                    args.jobs,
+                    cache,
+                    args.trim,
+                    args.cost_model,
+                ),
+            ):
+                metrics.pop("per_sent")
+                print(json.dumps(make_output(args, pred_file, metrics)))
+            return
+
+        if args.quick:
+            metrics = get_metrics_quick(
+                ref,
+                preds[0],
+                align_types,
+                args.quick_width,
+                args.confidence,
+                args.quick_batch_size,
+                args.seed,
+                args.anchored,
+                args.jobs,
+                cache,
+                args.trim,
+                args.cost_model,
+            )
+            print(json.dumps(make_output(args, args.pred_file[0], metrics)))
+            return
+
+        if args.counts_file or args.previous_counts_file or args.bootstrap:
+            settings = {
+                "anchored": args.anchored,
+                "trim": args.trim,
+                "cost_model": args.cost_model,
+                "cost_model_version": COST_MODELS[args.cost_model].version,
+            }
+            previous = None
+            if args.previous_counts_file:
+                previous = load_sentence_counts(args.previous_counts_file, settings)
+            metrics, keys, counts = get_metrics_incremental(
+                ref,
+                preds[0],
+                align_types,
+                previous,
+                args.anchored,
+                args.jobs,
+                cache,
+                args.trim,
+                args.cost_model,
+            )
+            if args.counts_file:
+                save_sentence_counts(args.counts_file, keys, counts, settings)
+            if args.bootstrap:
+                metrics["ci"] = bootstrap_ci(
+                    counts, args.bootstrap, args.confidence, args.seed
+                )
+        else:
+            metrics = get_metrics(
+                ref,
+                preds[0],
+                align_types,
+                args.anchored,
+                args.jobs,
+                cache,
+                args.trim,
+                args.cost_model,
+                args.alignment_store,
+            )
 
     # In case we computed sentence-wise scores: store them in file
     # Currently only accepts harmonized accuracy ("both")
@@ -153,15 +911,47 @@ def main(arguments: Optional[List[str]] = None) -> None:
             with open(args.sent_wise_file, "w", encoding="utf-8") as f:
                 f.write(",".join([str(score) for score in sent_wise_scores]))
 
-    output = {"pred-file": args.pred_file, "ref-file": args.ref_file}
-    if args.test_config:
-        output["test-config"] = args.test_config
-    output.update(metrics)
-
-    print(json.dumps(output))
+    print(json.dumps(make_output(args, args.pred_file[0], metrics)))
 
     return
 
 
+def main_streaming(args: argparse.Namespace) -> None:
+    if args.input_type == "jsonl":
+        ref = iter_jsonl_file(args.ref_file, args.ref_field)
+        pred = iter_jsonl_file(args.pred_file[0], args.pred_field)
+    elif args.input_type == "text":
+        ref = iter_plain_text_file(args.ref_file)
+        pred = iter_plain_text_file(args.pred_file[0])
+
+    with contextlib.ExitStack() as stack:
+        sent_wise_file = None
+        if args.sent_wise_file:
+            sent_wise_file = stack.enter_context(
+                open(args.sent_wise_file, "w", encoding="utf-8")
+            )
+        cache = stack.enter_context(
+            AlignmentCache(
+                CACHE,
+                max_entries=args.cache_max_entries,
+                max_bytes=args.cache_max_bytes,
+            )
+        )
+        metrics = get_metrics_streaming(
+            ref,
+            pred,
+            args.align_types.split(","),
+            args.anchored,
+            args.jobs,
+            cache,
+            args.trim,
+            args.cost_model,
+            args.chunk_size,
+            sent_wise_file,
+        )
+
+    print(json.dumps(make_output(args, args.pred_file[0], metrics)))
+
+
 if __name__ == "__main__":
     main()
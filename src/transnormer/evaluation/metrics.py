@@ -1,14 +1,23 @@
 #!/usr/bin/python
 import Levenshtein
-from .align_levenshtein import align
+from .align_levenshtein import align, align_both
+from .alignment_store import save_alignments
+from .columnar_alignment import Alignments, Vocabulary, as_columnar
+from .type_stats_store import TypeStats
 
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
 import numpy as np
 
 
 # YB's distillation of levenshtein_score without superfluous
 # case distinction for align_type AND without caching (not supported for now)
 def lev_norm_corpuslevel(sents_ref: List[str], sents_pred: List[str]) -> float:
+    score, num_chars = lev_sums(sents_ref, sents_pred)
+    return score / num_chars
+
+
+def lev_sums(sents_ref: Iterable[str], sents_pred: Iterable[str]) -> Tuple[int, int]:
+    """Sum of the Levenshtein distances and sum of the lengths for `lev_norm_corpuslevel`, so that it can be computed in chunks"""
     score = 0
     num_chars = 0
     for sent_ref, sent_pred in zip(sents_ref, sents_pred):
@@ -16,7 +25,7 @@ def lev_norm_corpuslevel(sents_ref: List[str], sents_pred: List[str]) -> float:
         sent_pred = sent_pred.replace("  ", " ")
         score += Levenshtein.distance(sent_ref, sent_pred)
         num_chars += max(len(sent_pred), len(sent_ref))
-    return score / num_chars
+    return score, num_chars
 
 
 def word_acc_final(
@@ -24,6 +33,11 @@ def word_acc_final(
     pred: List[str],
     align_types: List[str] = ["both"],
     cache_file=None,
+    anchored: bool = False,
+    n_jobs: int = 1,
+    trim: bool = False,
+    cost_model: str = "default",
+    alignment_store: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Computes accuracy metrics given a list of predictions and a list of references.
 
@@ -31,6 +45,8 @@ def word_acc_final(
     The `align_types` specify whether `ref` or `pred` is the base for the alignment.
     E.g., specifying `ref` aligns each token in `ref` to 0 or more tokens in `pred`.
     Include `"both"` in `align_types` to get the harmonized accuracy described in Bawden et al. (2022).
+    Both directions are aligned together (see `align_both`). `anchored`, `n_jobs` (the number of processes used for the alignment) , `trim` and `cost_model` are passed on to `align`.
+    If `alignment_store` is given, the alignments are saved to this directory (see `save_alignments`), so that they can be re-scored later (see `word_acc_scores`).
 
     The accuracy is computed over the entire corpus and per_sentence.
 
@@ -47,6 +63,98 @@ def word_acc_final(
     }
     """
 
+    alignment_fwd, alignment_bckwd = align_directions(
+        ref,
+        pred,
+        align_types,
+        cache_file=cache_file,
+        anchored=anchored,
+        n_jobs=n_jobs,
+        trim=trim,
+        cost_model=cost_model,
+    )
+
+    if alignment_store is not None:
+        alignments = {"ref": alignment_fwd, "pred": alignment_bckwd}
+        save_alignments(
+            alignment_store,
+            {k: v for k, v in alignments.items() if v is not None},
+            {"anchored": anchored, "trim": trim, "cost_model": cost_model},
+        )
+
+    return word_acc_scores(alignment_fwd, alignment_bckwd, align_types)
+
+
+def align_directions(
+    ref: List[str],
+    pred: List[str],
+    align_types: List[str] = ["both"],
+    cache_file=None,
+    anchored: bool = False,
+    n_jobs: int = 1,
+    trim: bool = False,
+    cost_model: str = "default",
+    keep_skipped: bool = False,
+) -> Tuple[
+    Optional[List[List[Tuple[str, str, float]]]],
+    Optional[List[List[Tuple[str, str, float]]]],
+]:
+    """Alignments with `ref` and with `pred` as the base, as far as `align_types` needs them (otherwise None)
+
+    With `keep_skipped`, pairs that could not be aligned get an empty alignment instead of being left out (see `align`).
+    """
+    alignment_fwd = None
+    alignment_bckwd = None
+
+    # align in both directions at once, unless only 'ref' or only 'pred' is chosen
+    if align_types == ["ref"]:
+        alignment_fwd = align(
+            ref,
+            pred,
+            cache_file=cache_file,
+            anchored=anchored,
+            n_jobs=n_jobs,
+            trim=trim,
+            cost_model=cost_model,
+            keep_skipped=keep_skipped,
+        )
+    elif align_types == ["pred"]:
+        alignment_bckwd = align(
+            pred,
+            ref,
+            cache_file=cache_file,
+            anchored=anchored,
+            n_jobs=n_jobs,
+            trim=trim,
+            cost_model=cost_model,
+            keep_skipped=keep_skipped,
+        )
+    else:
+        alignment_fwd, alignment_bckwd = align_both(
+            ref,
+            pred,
+            cache_file=cache_file,
+            anchored=anchored,
+            n_jobs=n_jobs,
+            trim=trim,
+            cost_model=cost_model,
+            keep_skipped=keep_skipped,
+        )
+
+    return alignment_fwd, alignment_bckwd
+
+
+def word_acc_scores(
+    alignment_fwd: Optional[Alignments],
+    alignment_bckwd: Optional[Alignments],
+    align_types: List[str] = ["both"],
+) -> Dict[str, Any]:
+    """Accuracy metrics of `word_acc_final` from alignments with `ref` (`alignment_fwd`) and `pred` (`alignment_bckwd`) as the base
+
+    The alignments can be loaded from an alignment store, e.g.:
+    `alignments = load_alignments(path)`
+    `word_acc_scores(alignments.get("ref"), alignments.get("pred"), align_types)`
+    """
     scores: Dict[str, Optional[float]] = {
         "ref": None,
         "pred": None,
@@ -56,12 +164,12 @@ def word_acc_final(
 
     # do this unless only 'pred' is chosen
     if align_types != ["pred"]:
-        alignment_fwd = align(ref, pred, cache_file=cache_file)
+        assert alignment_fwd is not None
         scores["ref"], per_sent_scores["ref"] = word_acc(alignment_fwd)
 
     # do this unless only 'ref' is chosen
     if align_types != ["ref"]:
-        alignment_bckwd = align(pred, ref, cache_file=cache_file)
+        assert alignment_bckwd is not None
         scores["pred"], per_sent_scores["pred"] = word_acc(alignment_bckwd)
 
     if "both" in align_types:
@@ -72,32 +180,33 @@ def word_acc_final(
     return {**scores, "per_sent": {k: list(v) for k, v in per_sent_scores.items()}}
 
 
-def word_acc(
-    alignments: List[List[Tuple[str, str, float]]]
-) -> Tuple[float, np.ndarray]:
+def word_acc(alignments: Alignments) -> Tuple[float, np.ndarray]:
     """Accuracy (1) over the entire corpus and (2) per sentence"""
-    scores = []
-    correct_corpus, total_corpus = 0, 0
-    for sent in alignments:
-        correct_sent, total_sent = 0, 0
-        for word in sent:
-            # skip spaces
-            if word[0] == "":
-                continue
-
-            if word[0] == word[1]:
-                correct_sent += 1
-            total_sent += 1
-        scores.append(correct_sent / total_sent)
-        correct_corpus += correct_sent
-        total_corpus += total_sent
+    correct, total = word_counts(alignments)
+    if (total == 0).any():
+        raise ZeroDivisionError("Sentence without tokens")
+    scores = correct / total
+    total_corpus = int(total.sum())
     if total_corpus == 0:
-        return 0, np.array(scores)
-    return correct_corpus / total_corpus, np.array(scores)
+        return 0, scores
+    return int(correct.sum()) / total_corpus, scores
+
+
+def word_counts(alignments: Alignments) -> Tuple[np.ndarray, np.ndarray]:
+    """Number of correct tokens and number of tokens per sentence"""
+    alignments = as_columnar(alignments)
+    # skip spaces
+    words = alignments.ref_ids != Vocabulary.EMPTY
+    sentence_ids = alignments.sentence_ids[words]
+    total = np.bincount(sentence_ids, minlength=len(alignments))
+    correct = np.bincount(
+        sentence_ids[alignments.equal[words]], minlength=len(alignments)
+    )
+    return correct, total
 
 
 def word_acc_selected_target_types(
-    alignments: List[List[Tuple[str, str, float]]],
+    alignments: Alignments,
     selected_types: Optional[Set[str]] = None,
     deselected_types: Optional[Set[str]] = None,
 ) -> float:
@@ -110,33 +219,21 @@ def word_acc_selected_target_types(
 
 
 def n_correct_and_total_selected_target_types(
-    alignments: List[List[Tuple[str, str, float]]],
+    alignments: Alignments,
     selected_types: Optional[Set[str]] = None,
     deselected_types: Optional[Set[str]] = None,
 ) -> Tuple[int, int]:
-    if deselected_types is None:
-        deselected_types = set()
-    correct_corpus, total_corpus = 0, 0
-    for sent in alignments:
-        correct_sent, total_sent = 0, 0
-        for word in sent:
-            # skip spaces
-            if word[0] == "":
-                continue
-            if word[0] in deselected_types:
-                continue
-            if selected_types is None or word[0] in selected_types:
-                if word[0] == word[1]:
-                    correct_sent += 1
-                total_sent += 1
-        correct_corpus += correct_sent
-        total_corpus += total_sent
-    return correct_corpus, total_corpus
+    alignments = as_columnar(alignments)
+    counted = _type_mask(alignments.vocab, selected_types, deselected_types)
+    # skip spaces
+    counted[Vocabulary.EMPTY] = False
+    words = counted[alignments.ref_ids]
+    return int((words & alignments.equal).sum()), int(words.sum())
 
 
 def word_acc_selected_source_types(
-    alignments_orig2gold: List[List[Tuple[str, str, float]]],
-    alignments_orig2pred: List[List[Tuple[str, str, float]]],
+    alignments_orig2gold: Alignments,
+    alignments_orig2pred: Alignments,
     selected_types: Optional[Set[str]] = None,
     deselected_types: Optional[Set[str]] = None,
 ) -> float:
@@ -151,38 +248,135 @@ def word_acc_selected_source_types(
 
 
 def n_correct_and_total_selected_source_types(
-    alignments_orig2gold: List[List[Tuple[str, str, float]]],
-    alignments_orig2pred: List[List[Tuple[str, str, float]]],
+    alignments_orig2gold: Alignments,
+    alignments_orig2pred: Alignments,
     selected_types: Optional[Set[str]] = None,
     deselected_types: Optional[Set[str]] = None,
 ) -> Tuple[int, int]:
-    n_skipped = 0
-    if deselected_types is None:
-        deselected_types = set()
-    correct_corpus, total_corpus = 0, 0
-    for sent_orig2gold, sent_orig2pred in zip(
+    vocab, orig, same_orig, correct = _source_tokens(
         alignments_orig2gold, alignments_orig2pred
-    ):
-        correct_sent, total_sent = 0, 0
-        for (orig1, gold, _), (orig2, pred, _) in zip(sent_orig2gold, sent_orig2pred):
-            if not orig1 == orig2:
-                n_skipped += 1
-                continue
-            # skip spaces
-            if orig1 == "":
-                continue
-            if orig1 in deselected_types:
-                continue
-            if selected_types is not None:
-                if orig1 in selected_types:
-                    if gold == pred:
-                        correct_sent += 1
-                    total_sent += 1
-            else:
-                if gold == pred:
-                    correct_sent += 1
-                total_sent += 1
-        correct_corpus += correct_sent
-        total_corpus += total_sent
+    )
+    n_skipped = int((~same_orig).sum())
+
+    counted = _type_mask(vocab, selected_types, deselected_types)
+    # skip spaces
+    counted[Vocabulary.EMPTY] = False
+    words = same_orig & counted[orig]
     print(f"Skipped {n_skipped} tokens.")
-    return correct_corpus, total_corpus
+    return int((words & correct).sum()), int(words.sum())
+
+
+def type_accuracy_breakdown(
+    alignments_orig2gold: Alignments,
+    alignments_orig2pred: Alignments,
+    type_stats: Mapping[str, Mapping[str, int]],
+    frequency_bands: Sequence[int] = (1, 10, 100),
+) -> Dict[str, Any]:
+    """Accuracy per bucket of source types, in one pass over the alignments
+
+    The source types are classified by the type stats of the training data (see `dataset_stats.type_alignment_stats`, or a `TypeStats` store):
+    "known" (in `type_stats`), "unknown" (not in `type_stats`), "ambiguous" (known, with more than one target type), "unambiguous" (known, with one target type) and frequency bands, e.g. "freq:1-9", "freq:10-99" and "freq:100+" for the default `frequency_bands` (the lower bounds of the bands).
+    Tokens are paired like in `n_correct_and_total_selected_source_types`.
+
+    Returns a dictionary like the following:
+    {
+        "skipped": 0,
+        "buckets": {
+            "all": {"correct": 9, "total": 10, "acc": 0.9},
+            "known": {"correct": 8, "total": 8, "acc": 1.0},
+            "unknown": {"correct": 1, "total": 2, "acc": 0.5},
+            ...
+            "freq:100+": {"correct": 0, "total": 0, "acc": None},
+        },
+    }
+    """
+    vocab, orig, same_orig, correct = _source_tokens(
+        alignments_orig2gold, alignments_orig2pred
+    )
+    # counts per source type, then per bucket
+    orig = orig[same_orig]
+    total_per_type = np.bincount(orig, minlength=len(vocab))
+    correct_per_type = np.bincount(orig[correct[same_orig]], minlength=len(vocab))
+    # skip spaces
+    total_per_type[Vocabulary.EMPTY] = 0
+    correct_per_type[Vocabulary.EMPTY] = 0
+
+    if isinstance(type_stats, TypeStats):
+        n_targets = type_stats.n_targets(vocab.tokens)
+        frequency = type_stats.frequencies(vocab.tokens)
+    else:
+        n_targets = np.zeros(len(vocab), dtype=np.int64)
+        frequency = np.zeros(len(vocab), dtype=np.int64)
+        for token_id, token in enumerate(vocab.tokens):
+            targets = type_stats.get(token)
+            if targets:
+                n_targets[token_id] = len(targets)
+                frequency[token_id] = sum(targets.values())
+
+    buckets = {
+        "all": np.ones(len(vocab), dtype=bool),
+        "known": n_targets > 0,
+        "unknown": n_targets == 0,
+        "ambiguous": n_targets > 1,
+        "unambiguous": n_targets == 1,
+    }
+    bounds = list(frequency_bands)
+    for lower, upper in zip(bounds, bounds[1:]):
+        buckets[f"freq:{lower}-{upper - 1}"] = (frequency >= lower) & (
+            frequency < upper
+        )
+    if bounds:
+        buckets[f"freq:{bounds[-1]}+"] = frequency >= bounds[-1]
+
+    table = {}
+    for name, mask in buckets.items():
+        n_correct = int(correct_per_type[mask].sum())
+        n_total = int(total_per_type[mask].sum())
+        table[name] = {
+            "correct": n_correct,
+            "total": n_total,
+            "acc": n_correct / n_total if n_total else None,
+        }
+    return {"skipped": int((~same_orig).sum()), "buckets": table}
+
+
+def _source_tokens(
+    alignments_orig2gold: Alignments, alignments_orig2pred: Alignments
+) -> Tuple[Vocabulary, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pair the tokens of two alignments with the same source: word pairs at the same
+    position in the same sentence are paired, up to the length of the shorter
+    sentence. Returns the vocabulary, the source type ids of the pairs, whether the
+    source types match and whether the target types match.
+    """
+    orig2gold = as_columnar(alignments_orig2gold)
+    orig2pred = as_columnar(alignments_orig2pred, orig2gold.vocab)
+    n_sents = min(len(orig2gold), len(orig2pred))
+    lengths = np.minimum(
+        np.diff(orig2gold.offsets[: n_sents + 1]),
+        np.diff(orig2pred.offsets[: n_sents + 1]),
+    )
+    positions = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    index_gold = np.repeat(orig2gold.offsets[:n_sents], lengths) + positions
+    index_pred = np.repeat(orig2pred.offsets[:n_sents], lengths) + positions
+    orig = orig2gold.ref_ids[index_gold]
+    same_orig = orig == orig2pred.ref_ids[index_pred]
+    correct = orig2gold.pred_ids[index_gold] == orig2pred.pred_ids[index_pred]
+    return orig2gold.vocab, orig, same_orig, correct
+
+
+def _type_mask(
+    vocab: Vocabulary,
+    selected_types: Optional[Set[str]] = None,
+    deselected_types: Optional[Set[str]] = None,
+) -> np.ndarray:
+    """Mask over the ids of `vocab` of the types that are selected and not deselected"""
+    if selected_types is None:
+        mask = np.ones(len(vocab), dtype=bool)
+    else:
+        mask = vocab.mask(selected_types)
+    if deselected_types:
+        mask &= ~vocab.mask(deselected_types)
+    return mask
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+# Columns of the per-sentence counts, -1 marks a count that was not computed
+# (e.g. the counts of the alignment with 'pred' as the base for --align-types=ref)
+COLUMNS = ("correct_ref", "total_ref", "correct_pred", "total_pred", "dist", "chars")
+# Marks the counts of an alignment direction in which the sentence pair could not
+# be aligned (see `align`), such sentences are left out of that direction
+SKIPPED = -2
+
+
+def sentence_key(ref: str, pred: str) -> bytes:
+    """Hash of a (reference, prediction) sentence pair"""
+    text = f"{len(ref)}:{ref}{pred}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def save_sentence_counts(
+    path: str, keys: List[bytes], counts: np.ndarray, settings: Dict[str, Any]
+) -> None:
+    """
+    Save the per-sentence counts (an array with the `COLUMNS`) of the sentence pairs
+    with the hashes `keys` (see `sentence_key`), computed with the alignment
+    `settings`
+    """
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            # as rows of uint8, a bytes array ("S16") would drop trailing zero bytes
+            keys=np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, 16),
+            counts=counts,
+            settings=np.array(json.dumps(settings, sort_keys=True)),
+        )
+
+
+def load_sentence_counts(
+    path: str, settings: Dict[str, Any]
+) -> Dict[bytes, np.ndarray]:
+    """
+    Per-sentence counts saved with `save_sentence_counts`, by sentence pair hash.
+    Counts that were computed with other alignment `settings` are out of date, a
+    warning is logged and no counts are returned, so that all pairs are scored anew.
+    """
+    with np.load(path) as data:
+        saved_settings = json.loads(str(data["settings"]))
+        if saved_settings != settings:
+            LOGGER.warning(
+                f"Counts in {path} were computed with {saved_settings}, not "
+                f"{settings}, ignore them"
+            )
+            return {}
+        keys = [key.tobytes() for key in data["keys"]]
+        return dict(zip(keys, data["counts"]))
+
+
+def load_sentence_counts_array(path: str) -> np.ndarray:
+    """Per-sentence counts saved with `save_sentence_counts`, in the order of the sentences"""
+    with np.load(path) as data:
+        return data["counts"]
@@ -0,0 +1,280 @@
+#!/usr/bin/python
+import argparse
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .sentence_counts import COLUMNS, SKIPPED, load_sentence_counts_array
+
+# Maximum number of random draws per chunk of resamples, bounds the memory use
+CHUNK_DRAWS = 10_000_000
+
+# Columns of the per-sentence counts (see `COLUMNS`) that the metrics are computed from
+METRIC_COLUMNS = {
+    "acc_harmonized": ["correct_ref", "total_ref", "correct_pred", "total_pred"],
+    "dist_norm_c": ["dist", "chars"],
+}
+
+
+def metric_from_sums(name: str, sums: np.ndarray) -> np.ndarray:
+    """
+    Corpus-level metric `name` from sums of per-sentence counts, the last axis of
+    `sums` holds the `METRIC_COLUMNS` of the metric. Empty resamples (of small
+    corpora) give NaN.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if name == "acc_harmonized":
+            return (sums[..., 0] / sums[..., 1] + sums[..., 2] / sums[..., 3]) / 2
+        return sums[..., 0] / sums[..., 1]
+
+
+def bootstrap_ci(
+    counts: np.ndarray,
+    n_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: int = 42,
+) -> Dict[str, Optional[Tuple[float, float]]]:
+    """
+    Percentile bootstrap confidence intervals of the harmonized accuracy and the
+    normalized Levenshtein distance, from per-sentence counts (see `COLUMNS`).
+    The interval of a metric is None if its counts are missing (-1).
+
+    Sentences with the same counts are interchangeable, so the resampling draws how
+    often each distinct row of counts occurs: a Poisson bootstrap, where a row that
+    occurs m times gets a Poisson(m) weight. The resampled sums are a matrix product
+    of the weights and the distinct rows.
+    """
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    intervals: Dict[str, Optional[Tuple[float, float]]] = {}
+    for name, metric_counts in _metric_counts(counts).items():
+        if metric_counts is None:
+            intervals[name] = None
+            continue
+        values = np.concatenate(
+            [
+                metric_from_sums(name, sums)
+                for sums in _poisson_bootstrap_sums(metric_counts, n_resamples, rng)
+            ]
+        )
+        low, high = np.nanquantile(values, [alpha, 1 - alpha])
+        intervals[name] = (float(low), float(high))
+    return intervals
+
+
+def paired_bootstrap_test(
+    counts_a: np.ndarray,
+    counts_b: np.ndarray,
+    n_resamples: int = 10000,
+    seed: int = 42,
+) -> Dict[str, Optional[Dict[str, float]]]:
+    """
+    Paired bootstrap test of the differences of the metrics of system A and system B
+    on the same sentences (row i of `counts_a` and `counts_b` belong to the same
+    sentence).
+
+    The sentences are resampled together (see `bootstrap_ci`). The p-value is the
+    share of resamples whose difference deviates from the observed difference at
+    least as much as the observed difference deviates from 0 (two-sided, see
+    Berg-Kirkpatrick et al. 2012).
+    """
+    rng = np.random.default_rng(seed)
+    results: Dict[str, Optional[Dict[str, float]]] = {}
+    for name, a, b in _paired_metric_counts(counts_a, counts_b):
+        if a is None or b is None:
+            results[name] = None
+            continue
+        k = a.shape[1]
+        delta = metric_from_sums(name, a.sum(axis=0)) - metric_from_sums(
+            name, b.sum(axis=0)
+        )
+        exceed = 0
+        for sums in _poisson_bootstrap_sums(
+            np.concatenate([a, b], axis=1), n_resamples, rng
+        ):
+            resampled = metric_from_sums(name, sums[:, :k]) - metric_from_sums(
+                name, sums[:, k:]
+            )
+            exceed += int((np.abs(resampled - delta) >= np.abs(delta)).sum())
+        results[name] = {
+            "difference": float(delta),
+            "p_value": exceed / n_resamples,
+        }
+    return results
+
+
+def approximate_randomization_test(
+    counts_a: np.ndarray,
+    counts_b: np.ndarray,
+    n_resamples: int = 10000,
+    seed: int = 42,
+) -> Dict[str, Optional[Dict[str, float]]]:
+    """
+    Approximate randomization test of the differences of the metrics of system A and
+    system B on the same sentences (row i of `counts_a` and `counts_b` belong to the
+    same sentence).
+
+    Each resample swaps the outputs of A and B for a random half of the sentences.
+    Only sentences where A and B differ matter, and sentences with the same
+    difference of counts are interchangeable: if m of them occur, the number of
+    swaps among them is Binomial(m, 0.5). The p-value is the (smoothed) share of
+    resamples with an absolute difference at least as large as the observed one.
+    """
+    rng = np.random.default_rng(seed)
+    results: Dict[str, Optional[Dict[str, float]]] = {}
+    for name, a, b in _paired_metric_counts(counts_a, counts_b):
+        if a is None or b is None:
+            results[name] = None
+            continue
+        sums_a, sums_b = a.sum(axis=0), b.sum(axis=0)
+        delta = metric_from_sums(name, sums_a) - metric_from_sums(name, sums_b)
+        differences = b - a
+        differences = differences[differences.any(axis=1)]
+        rows, multiplicities = np.unique(differences, axis=0, return_counts=True)
+        exceed = 0
+        for n in _chunks(n_resamples, len(rows)):
+            swaps = rng.binomial(multiplicities, 0.5, size=(n, len(rows)))
+            # swapping moves the difference of counts from B to A
+            shift = swaps.astype(np.float64) @ rows
+            resampled = metric_from_sums(name, sums_a + shift) - metric_from_sums(
+                name, sums_b - shift
+            )
+            exceed += int((np.abs(resampled) >= np.abs(delta)).sum())
+        results[name] = {
+            "difference": float(delta),
+            "p_value": (exceed + 1) / (n_resamples + 1),
+        }
+    return results
+
+
+def _metric_counts(
+    counts: np.ndarray, skipped: Optional[Dict[str, np.ndarray]] = None
+) -> Dict[str, Optional[np.ndarray]]:
+    """
+    The `METRIC_COLUMNS` of each metric, None if they are missing. Like in
+    `metrics_from_counts`, a sentence that could not be aligned in a direction
+    (`SKIPPED`, or `skipped` by direction if given) is left out of that direction
+    only: its counts of the direction are zero. Sentences left out of all
+    directions of a metric are dropped.
+    """
+    if skipped is None:
+        skipped = _skipped(counts)
+    counts = counts.copy()
+    for direction, rows in skipped.items():
+        for column in [f"correct_{direction}", f"total_{direction}"]:
+            counts[rows, COLUMNS.index(column)] = 0
+    metric_counts: Dict[str, Optional[np.ndarray]] = {}
+    for name, columns in METRIC_COLUMNS.items():
+        selected = counts[:, [COLUMNS.index(column) for column in columns]]
+        directions = [d for d in skipped if f"total_{d}" in columns]
+        if directions:
+            dropped = np.logical_and.reduce([skipped[d] for d in directions])
+            selected = selected[~dropped]
+        metric_counts[name] = None if (selected < 0).any() else selected
+    return metric_counts
+
+
+def _skipped(counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Sentences that could not be aligned (`SKIPPED`), by alignment direction"""
+    return {
+        direction: counts[:, COLUMNS.index(f"total_{direction}")] == SKIPPED
+        for direction in ["ref", "pred"]
+    }
+
+
+def _paired_metric_counts(
+    counts_a: np.ndarray, counts_b: np.ndarray
+) -> Iterator[Tuple[str, Optional[np.ndarray], Optional[np.ndarray]]]:
+    if counts_a.shape != counts_b.shape:
+        raise ValueError(
+            f"Counts of {len(counts_a)} and {len(counts_b)} sentences cannot be paired"
+        )
+    # sentences that could not be aligned for one system are left out for both
+    skipped_a, skipped_b = _skipped(counts_a), _skipped(counts_b)
+    skipped = {
+        direction: skipped_a[direction] | skipped_b[direction]
+        for direction in skipped_a
+    }
+    metric_counts_a = _metric_counts(counts_a, skipped)
+    metric_counts_b = _metric_counts(counts_b, skipped)
+    for name in METRIC_COLUMNS:
+        yield name, metric_counts_a[name], metric_counts_b[name]
+
+
+def _poisson_bootstrap_sums(
+    counts: np.ndarray, n_resamples: int, rng: np.random.Generator
+) -> Iterator[np.ndarray]:
+    """Chunks of resampled column sums of `counts` (see `bootstrap_ci`)"""
+    rows, multiplicities = np.unique(counts, axis=0, return_counts=True)
+    for n in _chunks(n_resamples, len(rows)):
+        weights = rng.poisson(multiplicities, size=(n, len(rows)))
+        yield weights.astype(np.float64) @ rows
+
+
+def _chunks(n_resamples: int, n_rows: int) -> Iterator[int]:
+    """Numbers of resamples per chunk, so that a chunk has at most `CHUNK_DRAWS` draws"""
+    chunk_size = max(1, CHUNK_DRAWS // max(1, n_rows))
+    for start in range(0, n_resamples, chunk_size):
+        yield min(chunk_size, n_resamples - start)
+
+
+def parse_arguments(
+    arguments: Optional[List[str]] = None,
+) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Bootstrap confidence intervals of the metrics of a system, or a significance test of the differences between two systems, from the per-sentence counts saved by evaluate.py --counts-file. Both systems must have been evaluated on the same sentences in the same order."
+    )
+    parser.add_argument("counts_file", help="Per-sentence counts of system A")
+    parser.add_argument(
+        "counts_file_b",
+        nargs="?",
+        help="Per-sentence counts of system B, for a significance test",
+    )
+    parser.add_argument(
+        "--test",
+        choices=["bootstrap", "randomization"],
+        default="bootstrap",
+        help="Paired bootstrap or approximate randomization test (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-n",
+        "--n-resamples",
+        type=int,
+        default=10000,
+        help="Number of resamples (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the intervals (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42, help="Random seed (default: %(default)s)"
+    )
+    return parser.parse_args(arguments)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    args = parse_arguments(arguments)
+    counts_a = load_sentence_counts_array(args.counts_file)
+    output: Dict[str, object] = {"counts-file": args.counts_file}
+    if args.counts_file_b is None:
+        output["ci"] = bootstrap_ci(
+            counts_a, args.n_resamples, args.confidence, args.seed
+        )
+    else:
+        counts_b = load_sentence_counts_array(args.counts_file_b)
+        output["counts-file-b"] = args.counts_file_b
+        output["test"] = args.test
+        if args.test == "bootstrap":
+            test = paired_bootstrap_test
+        else:
+            test = approximate_randomization_test
+        output.update(test(counts_a, counts_b, args.n_resamples, args.seed))
+    print(json.dumps(output))
+
+
+if __name__ == "__main__":
+    main()
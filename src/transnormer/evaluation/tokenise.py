@@ -1,13 +1,35 @@
 #!/usr/bin/python
+import functools
 import re
+from typing import Iterable, List
+
+# Punctuation characters that get a space inserted *before* them
+PUNCTUATION_BEFORE = r',.;?!:)("…/”“„″′‘‚'
+# Quotation mark / apostroph characters that get a space inserted *after* them
+PUNCTUATION_AFTER = "'\"’”“„″′‘‚"
+
+# A run of the same punctuation character that does not follow a space. Each run is
+# replaced by a space and a single character.
+_BEFORE = re.compile("(?<! )([" + re.escape(PUNCTUATION_BEFORE) + r"])\1*")
+_AFTER = re.compile("([" + re.escape(PUNCTUATION_AFTER) + "])(?! )")
 
 
 def basic_tokenise(string: str) -> str:
     """Modify string to separate punctuation"""
-    # Insert a space *before* punctuation characters
-    for char in r',.;?!:)("…/”“„″′‘‚':
-        string = re.sub("(?<! )" + re.escape(char) + "+", " " + char, string)
-    # Insert a space *after* quotation mark / apostroph characters
-    for char in "'\"’”“„″′‘‚":
-        string = re.sub(char + "(?! )", char + " ", string)
+    # The insertions for one character never change the context of another
+    # character, so all characters can be handled in a single pass per pattern.
+    string = _BEFORE.sub(r" \1", string)
+    string = _AFTER.sub(r"\1 ", string)
     return string.strip()
+
+
+def basic_tokenise_batch(strings: Iterable[str], memo_size: int = 0) -> List[str]:
+    """
+    `basic_tokenise` each string. With `memo_size` > 0, the results of up to
+    `memo_size` distinct strings are memoised, which pays off for repeated
+    sentences (e.g. identical predictions).
+    """
+    if memo_size > 0:
+        tokenise = functools.lru_cache(maxsize=memo_size)(basic_tokenise)
+        return [tokenise(string) for string in strings]
+    return [basic_tokenise(string) for string in strings]
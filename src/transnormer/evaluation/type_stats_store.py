@@ -0,0 +1,217 @@
+#!/usr/bin/python
+import argparse
+import json
+import os
+import pickle
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
+
+import numpy as np
+
+# Version of the file layout, a store with another version cannot be loaded
+FORMAT_VERSION = 1
+
+# Arrays of a store, saved as `<array>.npy`
+_ARRAYS = ("tokens", "token_offsets", "rows", "indptr", "targets", "counts", "totals")
+
+
+class TypeStats(Mapping[str, Dict[str, int]]):
+    """
+    Type stats (see `dataset_stats.type_alignment_stats`) as arrays, a read-only
+    mapping from source types to {target type: count} dicts.
+
+    All types are interned in a vocabulary sorted by their UTF-8 encoding: type i
+    is the UTF-8 string `tokens[token_offsets[i]:token_offsets[i + 1]]`, so a type
+    is looked up by binary search. The counts are in CSR form: source type i is row
+    `rows[i]` (-1 if i is only a target type), the target type ids and counts of
+    row r are `targets[indptr[r]:indptr[r + 1]]` and `counts[...]`, and `totals[r]`
+    is the sum of the counts. Whether a type is known, its number of target types
+    and its frequency are read off the arrays, only `__getitem__` builds a dict.
+    """
+
+    def __init__(
+        self,
+        tokens: np.ndarray,
+        token_offsets: np.ndarray,
+        rows: np.ndarray,
+        indptr: np.ndarray,
+        targets: np.ndarray,
+        counts: np.ndarray,
+        totals: np.ndarray,
+    ) -> None:
+        self.tokens = tokens
+        self.token_offsets = token_offsets
+        self.rows = rows
+        self.indptr = indptr
+        self.targets = targets
+        self.counts = counts
+        self.totals = totals
+
+    @classmethod
+    def from_dict(cls, stats: Mapping[str, Mapping[str, int]]) -> "TypeStats":
+        """Convert nested dicts {source type: {target type: count}}"""
+        types = {src for src in stats}
+        types.update(trg for targets in stats.values() for trg in targets)
+        encoded = sorted(token.encode("utf-8") for token in types)
+        ids = {token.decode("utf-8"): i for i, token in enumerate(encoded)}
+        token_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(token) for token in encoded], out=token_offsets[1:])
+
+        sources = sorted(stats, key=ids.__getitem__)
+        rows = np.full(len(encoded), -1, dtype=np.int32)
+        rows[[ids[src] for src in sources]] = np.arange(len(sources), dtype=np.int32)
+        indptr = np.zeros(len(sources) + 1, dtype=np.int64)
+        np.cumsum([len(stats[src]) for src in sources], out=indptr[1:])
+        targets = np.array(
+            [ids[trg] for src in sources for trg in stats[src]], dtype=np.int32
+        )
+        counts = np.array(
+            [cnt for src in sources for cnt in stats[src].values()], dtype=np.int64
+        )
+        totals = np.bincount(
+            np.repeat(np.arange(len(sources)), np.diff(indptr)),
+            weights=counts,
+            minlength=len(sources),
+        ).astype(np.int64)
+        return cls(
+            np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            token_offsets,
+            rows,
+            indptr,
+            targets,
+            counts,
+            totals,
+        )
+
+    def token(self, type_id: int) -> str:
+        """The type with id `type_id`"""
+        start, end = self.token_offsets[type_id], self.token_offsets[type_id + 1]
+        return self.tokens[start:end].tobytes().decode("utf-8")
+
+    def type_id(self, token: str) -> int:
+        """Id of `token` in the vocabulary (binary search), -1 if it is not a type"""
+        key = token.encode("utf-8")
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            start = self.token_offsets[middle]
+            end = self.token_offsets[middle + 1]
+            if self.tokens[start:end].tobytes() < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.rows) and self.token(low) == token:
+            return low
+        return -1
+
+    def type_ids(self, tokens: Iterable[str]) -> np.ndarray:
+        """Ids of `tokens`, -1 for tokens that are not types"""
+        return np.array([self.type_id(token) for token in tokens], dtype=np.int64)
+
+    def row(self, token: str) -> int:
+        """Row of the source type `token`, -1 if it is not a source type"""
+        type_id = self.type_id(token)
+        return -1 if type_id < 0 else int(self.rows[type_id])
+
+    def n_targets(self, tokens: Iterable[str]) -> np.ndarray:
+        """Number of target types of each of `tokens`, 0 for unknown source types"""
+        rows = self._rows(tokens)
+        n_targets = np.zeros(len(rows), dtype=np.int64)
+        known = rows >= 0
+        n_targets[known] = self.indptr[rows[known] + 1] - self.indptr[rows[known]]
+        return n_targets
+
+    def frequencies(self, tokens: Iterable[str]) -> np.ndarray:
+        """Frequency of each of `tokens` as a source type, 0 for unknown source types"""
+        rows = self._rows(tokens)
+        frequencies = np.zeros(len(rows), dtype=np.int64)
+        frequencies[rows >= 0] = self.totals[rows[rows >= 0]]
+        return frequencies
+
+    def is_ambiguous(self, token: str) -> bool:
+        """Whether `token` is a source type with more than one target type"""
+        return bool(self.n_targets([token])[0] > 1)
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        """The type stats as nested dicts"""
+        return {src: self[src] for src in self}
+
+    def _rows(self, tokens: Iterable[str]) -> np.ndarray:
+        type_ids = self.type_ids(tokens)
+        rows = np.full(len(type_ids), -1, dtype=np.int64)
+        rows[type_ids >= 0] = self.rows[type_ids[type_ids >= 0]]
+        return rows
+
+    def __getitem__(self, token: str) -> Dict[str, int]:
+        row = self.row(token)
+        if row < 0:
+            raise KeyError(token)
+        entries = slice(self.indptr[row], self.indptr[row + 1])
+        return {
+            self.token(trg): int(cnt)
+            for trg, cnt in zip(self.targets[entries], self.counts[entries])
+        }
+
+    def __contains__(self, token: object) -> bool:
+        return isinstance(token, str) and self.row(token) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for type_id in np.flatnonzero(np.asarray(self.rows) >= 0).tolist():
+            yield self.token(type_id)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+
+def save_type_stats(path: str, stats: Mapping[str, Mapping[str, int]]) -> None:
+    """
+    Save type stats (nested dicts or `TypeStats`) to the directory `path`: the
+    arrays of `TypeStats` as .npy files, so that `load_type_stats` can memory-map
+    them, and a JSON file with the format version.
+    """
+    if not isinstance(stats, TypeStats):
+        stats = TypeStats.from_dict(stats)
+    os.makedirs(path, exist_ok=True)
+    for array in _ARRAYS:
+        np.save(os.path.join(path, f"{array}.npy"), getattr(stats, array))
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION}, f)
+
+
+def load_type_stats(path: str, mmap: bool = True) -> TypeStats:
+    """
+    Load the type stats of the store at `path` (see `save_type_stats`). With `mmap`,
+    the arrays are memory-mapped read-only instead of read into memory.
+    """
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Type stats store {path} has version {meta.get('version')}, expected {FORMAT_VERSION}"
+        )
+    arrays = [
+        np.load(os.path.join(path, f"{array}.npy"), mmap_mode="r" if mmap else None)
+        for array in _ARRAYS
+    ]
+    return TypeStats(*arrays)
+
+
+def parse_arguments(
+    arguments: Optional[List[str]] = None,
+) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert pickled type stats (written by dataset_stats.py) to a memory-mappable type stats store."
+    )
+    parser.add_argument("pickle_file", help="Pickled type stats")
+    parser.add_argument("store", help="Directory of the type stats store")
+    return parser.parse_args(arguments)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    args = parse_arguments(arguments)
+    with open(args.pickle_file, "rb") as f:
+        stats = pickle.load(f)
+    save_type_stats(args.store, stats)
+
+
+if __name__ == "__main__":
+    main()
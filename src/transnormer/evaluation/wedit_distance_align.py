@@ -1,7 +1,11 @@
 #!/usr/bin/python
+import difflib
 import operator
 
-from typing import List, Tuple
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import Levenshtein
+import numpy as np
 
 
 def _wedit_dist_init(len1: int, len2: int) -> List[List[float]]:
@@ -63,6 +67,11 @@ def _wedit_dist_backtrace(lev) -> List[Tuple[int, int, float]]:
     return list(reversed(alignment))
 
 
+# Version of the cost functions below, part of the key of cached alignments (see
+# `alignment_cache`). Increase it whenever a cost changes
+COST_MODEL_VERSION = 1
+
+
 def _wedit_dist_substitution_cost(c1: str, c2: str) -> float:
     if c1 == " " and c2 != " ":
         return 1000000
@@ -92,7 +101,461 @@ def _wedit_dist_insertion_cost(c1: str, c2: str) -> float:
     return 0.8
 
 
-def wedit_distance_align(s1: str, s2: str) -> List[Tuple[int, int, float]]:
+# Characters that the cost functions above treat specially: class 1 (space) and
+# class 2 (punctuation). All other characters are in class 0
+_CHARACTER_CLASSES = (" ", ",.;-!?'")
+
+
+def _codepoints(s: str) -> np.ndarray:
+    return np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32)
+
+
+class CostModel(NamedTuple):
+    """
+    Costs of the weighted edit distance, tabulated by character classes.
+
+    Each character belongs to a class (0 for all characters that are not listed
+    in `codepoints`). The cost of an operation on a pair of characters is looked
+    up in a table at index `(class1 * n_classes + class2) * 2 + (char1 == char2)`.
+    Build cost models with `make_cost_model`.
+    """
+
+    name: str
+    version: int
+    n_classes: int
+    # sorted code points of the characters that are not in class 0 and their classes
+    codepoints: np.ndarray
+    classes: np.ndarray
+    deletion: np.ndarray
+    insertion: np.ndarray
+    substitution: np.ndarray
+    # lower bound for the cost of any single insertion or deletion
+    min_indel_cost: float
+
+
+def make_cost_model(
+    name: str,
+    deletion_cost: Callable[[str, str], float],
+    insertion_cost: Callable[[str, str], float],
+    substitution_cost: Callable[[str, str], float],
+    character_classes: Sequence[str] = _CHARACTER_CLASSES,
+    version: int = 1,
+) -> CostModel:
+    """
+    Tabulate cost functions like `_wedit_dist_deletion_cost` etc. The functions
+    take a character of s1 and a character of s2. `character_classes` lists the
+    characters of the classes 1, 2, ...; the functions must only depend on the
+    classes of the characters (and on whether they are equal). Substituting a
+    character for itself costs nothing.
+
+    Increase `version` whenever the costs of a model change, it is part of the
+    key of cached alignments.
+    """
+    specials = "".join(character_classes)
+    if len(set(specials)) != len(specials):
+        raise ValueError("Character classes must not overlap")
+    # two distinct characters of each class (if it has two), so that the costs of
+    # different characters of the same class can be derived
+    others = [c for c in "abcdefghijklmnopqrstuvwxyz" if c not in specials]
+    representatives = [others[0] + others[1]] + [
+        chars[0] + chars[-1] for chars in character_classes
+    ]
+    n_classes = len(representatives)
+
+    def table(cost_fn: Callable[[str, str], float], equal_cost: bool) -> np.ndarray:
+        table = np.zeros(n_classes * n_classes * 2, dtype=np.float64)
+        for cls1, chars1 in enumerate(representatives):
+            for cls2, chars2 in enumerate(representatives):
+                pair = (cls1 * n_classes + cls2) * 2
+                table[pair] = cost_fn(chars1[0], chars2[1])
+                if equal_cost:
+                    table[pair + 1] = table[pair]
+        return table
+
+    deletion = table(deletion_cost, True)
+    insertion = table(insertion_cost, True)
+    min_indel_cost = float(min(deletion.min(), insertion.min()))
+    if not min_indel_cost > 0:
+        raise ValueError("Insertions and deletions must have a positive cost")
+
+    codepoints = _codepoints(specials)
+    classes = np.array(
+        [cls for cls, chars in enumerate(character_classes, 1) for _ in chars],
+        dtype=np.intp,
+    )
+    order = np.argsort(codepoints)
+    return CostModel(
+        name,
+        version,
+        n_classes,
+        codepoints[order],
+        classes[order],
+        deletion,
+        insertion,
+        table(substitution_cost, False),
+        min_indel_cost,
+    )
+
+
+def _uniform_cost(c1: str, c2: str) -> float:
+    return 1
+
+
+# Cost models by name. The default model is the one of Bawden et al. (2022)
+COST_MODELS: Dict[str, CostModel] = {}
+
+
+def register_cost_model(model: CostModel) -> None:
+    """Make `model` available by its name, e.g. for `align`"""
+    COST_MODELS[model.name] = model
+
+
+def get_cost_model(name: str) -> CostModel:
+    if name not in COST_MODELS:
+        raise ValueError(f"Unknown cost model: {name!r}")
+    return COST_MODELS[name]
+
+
+DEFAULT_COST_MODEL = make_cost_model(
+    "default",
+    _wedit_dist_deletion_cost,
+    _wedit_dist_insertion_cost,
+    _wedit_dist_substitution_cost,
+    version=COST_MODEL_VERSION,
+)
+register_cost_model(DEFAULT_COST_MODEL)
+# Plain Levenshtein distance, every edit costs 1
+register_cost_model(
+    make_cost_model("uniform", _uniform_cost, _uniform_cost, _uniform_cost, ())
+)
+
+
+def _char_classes(codepoints: np.ndarray, costs: CostModel) -> np.ndarray:
+    """Class of each code point, see `CostModel`"""
+    if not len(costs.codepoints):
+        return np.zeros(codepoints.shape, dtype=np.intp)
+    index = np.searchsorted(costs.codepoints, codepoints)
+    np.minimum(index, len(costs.codepoints) - 1, out=index)
+    return np.where(costs.codepoints[index] == codepoints, costs.classes[index], 0)
+
+
+def _diag_offset(d: int, len2: int, band: int) -> int:
+    """Index of the first stored cell of anti-diagonal `d`"""
+    return max(0, d - len2, (d - band) // 2)
+
+
+def _diag_offsets(len1: int, len2: int, band: int) -> List[int]:
+    """`_diag_offset` for all anti-diagonals"""
+    d = np.arange(len1 + len2 + 1)
+    return np.maximum(np.maximum(d - len2, (d - band) // 2), 0).tolist()
+
+
+def _wedit_dist_width(len1: int, len2: int, band: int) -> int:
+    """Number of stored cells per anti-diagonal"""
+    return min(len1, len2, band + 1) + 1
+
+
+def _wedit_dist_sweep(
+    codes1: np.ndarray,
+    codes2: np.ndarray,
+    band: int,
+    diags: np.ndarray,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> Iterator[Tuple[int, slice, slice, slice, slice]]:
+    """
+    Fill the edit-distance matrix of two strings s1 and s2 with NumPy. The
+    strings are passed as arrays of code points (see `_codepoints`).
+
+    The matrix is swept anti-diagonal by anti-diagonal, as all cells (i, j) with
+    i + j == d only depend on the diagonals d-1 and d-2. Cell (i, j) is stored at
+    `diags[(i + j) % len(diags), i - _diag_offset(i + j, len(s2), band)]`, so
+    that each diagonal and its neighbours are contiguous slices. `diags` holds
+    either all diagonals or (if it has 3 rows) only the last three. Every cell is
+    computed with the same floating point operations as in `_wedit_dist_step`,
+    so the costs are identical.
+
+    Several pairs of strings of the same length can be processed at once: the
+    code points are then 2-D arrays (one row per string) and `diags` is a 3-D
+    array (one matrix per pair).
+
+    Only cells with |i - j| <= band are computed, all other cells are treated as
+    infinitely expensive (and are not stored).
+
+    The costs of the operations are looked up in the tables of `costs` by the
+    classes of the characters (see `CostModel`), which is the same as calling
+    the cost functions of the model for each cell.
+
+    After diagonal d is done, this yields d and the slices of the cells (i-1, j)
+    and (i, j-1) on diagonal d-1, (i-1, j-1) on diagonal d-2 and (i, j) on
+    diagonal d, for all inner cells (i, j) of diagonal d.
+    """
+    len1, len2 = codes1.shape[-1], codes2.shape[-1]
+    rows = diags.shape[-2]
+    # s2 is reversed, because j decreases while i increases along a diagonal
+    codes2 = codes2[..., ::-1]
+    classes1 = _char_classes(codes1, costs) * (costs.n_classes * 2)
+    classes2 = _char_classes(codes2, costs) * 2
+
+    for d in range(len1 + len2 + 1):
+        row = diags[..., d % rows, :]
+        row.fill(np.inf)
+        # row 0 and column 0: 0,1,2,3,4,...
+        if d <= band:
+            if d <= len2:
+                row[..., 0 - _diag_offset(d, len2, band)] = d
+            if d <= len1:
+                row[..., d - _diag_offset(d, len2, band)] = d
+
+        lo = max(1, d - len2, (d - band + 1) // 2)
+        hi = min(len1, d - 1, (d + band) // 2)
+        if lo > hi:
+            yield d, slice(0), slice(0), slice(0), slice(0)
+            continue
+        p = lo - _diag_offset(d - 1, len2, band)
+        skip1, skip2 = slice(p - 1, p + hi - lo), slice(p, p + hi - lo + 1)
+        p = lo - _diag_offset(d - 2, len2, band)
+        subst = slice(p - 1, p + hi - lo)
+        p = lo - _diag_offset(d, len2, band)
+        current = slice(p, p + hi - lo + 1)
+        # characters s1[i-1] and s2[j-1]
+        chars1 = slice(lo - 1, hi)
+        chars2 = slice(len2 - d + lo, len2 - d + hi + 1)
+        pairs = classes1[..., chars1] + classes2[..., chars2]
+        pairs += codes1[..., chars1] == codes2[..., chars2]
+
+        # skipping a character in s1
+        a = diags[..., (d - 1) % rows, skip1] + costs.deletion[pairs]
+        # skipping a character in s2
+        b = diags[..., (d - 1) % rows, skip2] + costs.insertion[pairs]
+        # substitution
+        c = diags[..., (d - 2) % rows, subst] + costs.substitution[pairs]
+        np.minimum(a, b, out=a)
+        np.minimum(a, c, out=row[..., current])
+        yield d, skip1, skip2, subst, current
+
+
+def _wedit_dist_diagonals(
+    s1: str,
+    s2: str,
+    band: Optional[int] = None,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> np.ndarray:
+    """
+    Fill the edit-distance matrix of `s1` and `s2`, see `_wedit_dist_sweep`. Cell
+    (i, j) is stored at `diags[i + j, i - _diag_offset(i + j, len(s2), band)]`.
+    """
+    len1, len2 = len(s1), len(s2)
+    if band is None:
+        band = len1 + len2
+    diags = np.empty(
+        (len1 + len2 + 1, _wedit_dist_width(len1, len2, band)), dtype=np.float64
+    )
+    for _ in _wedit_dist_sweep(_codepoints(s1), _codepoints(s2), band, diags, costs):
+        pass
+    return diags
+
+
+def _wedit_dist_backtrace_diagonals(
+    diags: np.ndarray,
+    len1: int,
+    len2: int,
+    band: Optional[int] = None,
+    end: Optional[Tuple[int, int]] = None,
+) -> List[Tuple[int, int, float]]:
+    """
+    Same as `_wedit_dist_backtrace` for a matrix from `_wedit_dist_diagonals`.
+    The backtrace starts at cell `end`, by default at (len1, len2).
+    """
+    if band is None:
+        band = len1 + len2
+
+    offsets = _diag_offsets(len1, len2, band)
+    item = diags.item
+
+    def cost(i: int, j: int) -> float:
+        if i < 0 or j < 0 or abs(i - j) > band:
+            return float("inf")
+        return item(i + j, i - offsets[i + j])
+
+    i, j = end if end is not None else (len1, len2)
+    alignment: List[Tuple[int, int, float]] = [(i, j, cost(i, j))]
+    while (i, j) != (0, 0):
+        skip1, skip2, subst = cost(i - 1, j), cost(i, j - 1), cost(i - 1, j - 1)
+        # first minimum wins, as in `_wedit_dist_backtrace`
+        if skip1 <= skip2 and skip1 <= subst:
+            i -= 1
+        elif skip2 <= subst:
+            j -= 1
+        else:
+            i, j = i - 1, j - 1
+        alignment.append((i, j, cost(i, j)))
+    return list(reversed(alignment))
+
+
+# Backtrace directions in the compact representation of the matrix
+_SKIP1, _SKIP2, _SUBST = 0, 1, 2
+
+
+def _wedit_dist_directions(
+    s1: str,
+    s2: str,
+    band: Optional[int] = None,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> Tuple[np.ndarray, float]:
+    """
+    Compact version of `_wedit_dist_diagonals`: only three diagonals of costs
+    are kept at any time. For each cell, the direction that the backtrace
+    takes from it is stored instead, as one byte (see `_SKIP1` etc.). This is
+    the same layout as in `_wedit_dist_diagonals`, but it takes 1/8 of the memory.
+
+    Returns the directions and the cost of the alignment. Directions of cells in
+    row or column 0 are not stored.
+    """
+    len1, len2 = len(s1), len(s2)
+    if band is None:
+        band = len1 + len2
+    width = _wedit_dist_width(len1, len2, band)
+    diags = np.empty((3, width), dtype=np.float64)
+    directions = np.zeros((len1 + len2 + 1, width), dtype=np.uint8)
+    sweep = _wedit_dist_sweep(_codepoints(s1), _codepoints(s2), band, diags, costs)
+    for d, skip1, skip2, subst, current in sweep:
+        a = diags[(d - 1) % 3, skip1]
+        b = diags[(d - 1) % 3, skip2]
+        c = diags[(d - 2) % 3, subst]
+        # first minimum wins, as in `_wedit_dist_backtrace`
+        directions[d, current] = (a > np.minimum(b, c)) * (1 + (b > c))
+    d = len1 + len2
+    cost = float(diags[d % 3, len1 - _diag_offset(d, len2, band)])
+    return directions, cost
+
+
+def _wedit_dist_backtrace_directions(
+    s1: str,
+    s2: str,
+    directions: np.ndarray,
+    band: Optional[int] = None,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> List[Tuple[int, int, float]]:
+    """
+    Same as `_wedit_dist_backtrace` for directions from `_wedit_dist_directions`.
+
+    The path is found by following the directions. Then the costs along the path
+    are collected in a second sweep over the matrix.
+    """
+    len1, len2 = len(s1), len(s2)
+    if band is None:
+        band = len1 + len2
+    # path[d] is the row index of the cell of the path on diagonal d
+    path: Dict[int, int] = {}
+    i, j = len1, len2
+    path[i + j] = i
+    while (i, j) != (0, 0):
+        if i == 0:
+            j -= 1
+        elif j == 0:
+            i -= 1
+        else:
+            direction = directions[i + j, i - _diag_offset(i + j, len2, band)]
+            if direction == _SKIP1:
+                i -= 1
+            elif direction == _SKIP2:
+                j -= 1
+            else:
+                i, j = i - 1, j - 1
+        path[i + j] = i
+
+    alignment: List[Tuple[int, int, float]] = []
+    diags = np.empty((3, _wedit_dist_width(len1, len2, band)), dtype=np.float64)
+    sweep = _wedit_dist_sweep(_codepoints(s1), _codepoints(s2), band, diags, costs)
+    for d, *_ in sweep:
+        if d in path:
+            i = path[d]
+            cost = float(diags[d % 3, i - _diag_offset(d, len2, band)])
+            alignment.append((i, d - i, cost))
+    return alignment
+
+
+# Initial band width of the banded engine
+INITIAL_BAND = 16
+# Number of cells above which the matrix is stored as directions only, which
+# takes 1 instead of 8 bytes per cell (but two sweeps over the matrix)
+LOW_MEMORY_THRESHOLD = 2**22
+
+
+def _wedit_dist_align_numpy(
+    s1: str,
+    s2: str,
+    band: Optional[int] = None,
+    max_cost: float = np.inf,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> Tuple[Optional[List[Tuple[int, int, float]]], float]:
+    """
+    Align `s1` and `s2` with the NumPy engine, computing only cells within `band`
+    of the diagonal, if given. Returns the alignment (or None if its cost is not
+    below `max_cost`) and its cost.
+
+    Large matrices (see `LOW_MEMORY_THRESHOLD`) are stored compactly.
+    """
+    len1, len2 = len(s1), len(s2)
+    if band is None:
+        band = len1 + len2
+    if (len1 + len2 + 1) * _wedit_dist_width(len1, len2, band) > LOW_MEMORY_THRESHOLD:
+        directions, cost = _wedit_dist_directions(s1, s2, band, costs)
+        if not cost < max_cost:
+            return None, cost
+        alignment = _wedit_dist_backtrace_directions(s1, s2, directions, band, costs)
+        return alignment, cost
+    diags = _wedit_dist_diagonals(s1, s2, band, costs)
+    cost = float(diags[len1 + len2, len1 - _diag_offset(len1 + len2, len2, band)])
+    if not cost < max_cost:
+        return None, cost
+    return _wedit_dist_backtrace_diagonals(diags, len1, len2, band), cost
+
+
+def _wedit_dist_align_banded(
+    s1: str, s2: str, costs: CostModel = DEFAULT_COST_MODEL
+) -> List[Tuple[int, int, float]]:
+    """
+    Banded alignment (cf. Ukkonen 1985) that only computes cells within `band`
+    of the main diagonal and widens `band` until the result is exact.
+
+    A path that leaves the band must contain at least band+1 insertions or
+    band+1 deletions (inner cells cost at least `min_indel_cost` per step, the
+    borders of the matrix 1 per step), so it costs at least `(band + 1) *
+    min(1, min_indel_cost)`. If
+    the banded cost of the whole alignment is below that bound, all cells that
+    the backtrace can pick are exact, and the banded alignment is identical to
+    the full one. Otherwise the band is at least doubled: the banded cost is an
+    upper bound of the true cost, so the band is widened right away to where it
+    would pass the check. Once the band covers the entire matrix, this is the
+    full computation.
+
+    Every edit costs at least `min_indel_cost`, so the (unweighted) Levenshtein
+    distance is a cheap lower bound for the number of edits; the initial band is
+    chosen large enough that typical pairs pass the check in the first round.
+    Identical strings are aligned along the diagonal without any computation.
+    """
+    if s1 == s2:
+        return identical_alignment(len(s1))
+    len1, len2 = len(s1), len(s2)
+    band = max(INITIAL_BAND, abs(len1 - len2), 2 * Levenshtein.distance(s1, s2))
+    # lower bound for the cost of a step off the diagonal, also on the borders
+    min_step_cost = min(1.0, costs.min_indel_cost)
+    while band < max(len1, len2):
+        # small safety margin against rounding errors in the accumulated costs
+        max_cost = (band + 1) * min_step_cost * (1 - 1e-9)
+        alignment, cost = _wedit_dist_align_numpy(s1, s2, band, max_cost, costs)
+        if alignment is not None:
+            return alignment
+        band = max(2 * band, int(cost / min_step_cost) + 1)
+    alignment, _ = _wedit_dist_align_numpy(s1, s2, costs=costs)
+    assert alignment is not None
+    return alignment
+
+
+def wedit_distance_align(
+    s1: str, s2: str, engine: str = "banded", costs: CostModel = DEFAULT_COST_MODEL
+) -> List[Tuple[int, int, float]]:
     """
     Calculate the minimum Levenshtein edit-distance based alignment
     mapping between two strings. The alignment finds the mapping
@@ -115,11 +578,37 @@ def wedit_distance_align(s1: str, s2: str) -> List[Tuple[int, int, float]]:
 
     This function does not support transposition.
 
+    The engine "numpy" fills the matrix with vectorized operations. The default
+    engine "banded" does the same, but only for cells close to the diagonal,
+    which is much faster for similar strings (see `_wedit_dist_align_banded`).
+    The engine "python" is the original cell-by-cell implementation. All engines
+    return the same alignment. For long strings (see `LOW_MEMORY_THRESHOLD`), the
+    NumPy engines only keep a compact representation of the matrix in memory.
+
+    The NumPy engines take the costs from the tables of a `CostModel`, by default
+    the one of the cost functions above (see `COST_MODELS` for alternatives).
+    The engine "python" calls the cost functions and only supports the default.
+
     :param s1, s2: The strings to be aligned
     :type s1: str
     :type s2: str
+    :param engine: "banded", "numpy" or "python"
+    :type engine: str
+    :param costs: The cost model
+    :type costs: CostModel
     :rtype: List[Tuple(int, int, float)]
     """
+    if engine == "banded":
+        return _wedit_dist_align_banded(s1, s2, costs)
+    if engine == "numpy":
+        alignment, _ = _wedit_dist_align_numpy(s1, s2, costs=costs)
+        assert alignment is not None
+        return alignment
+    if engine != "python":
+        raise ValueError(f"Unknown engine: {engine!r}")
+    if costs is not DEFAULT_COST_MODEL:
+        raise ValueError("The engine 'python' only supports the default cost model")
+
     # set up a 2-D array
     len1 = len(s1)
     len2 = len(s2)
@@ -142,3 +631,187 @@ def wedit_distance_align(s1: str, s2: str) -> List[Tuple[int, int, float]]:
     #    for (i,j,w) in alignment:
     #        print (s1[i - 1], s2[j - 1], w)
     return alignment
+
+
+# Strings up to this length are aligned in batches by `wedit_distance_align_batch`
+BATCH_MAX_LENGTH = 256
+
+
+def wedit_distance_align_batch(
+    pairs: Sequence[Tuple[str, str]],
+    batch_size: int = 256,
+    costs: CostModel = DEFAULT_COST_MODEL,
+) -> List[List[Tuple[int, int, float]]]:
+    """
+    Same as `[wedit_distance_align(s1, s2, costs=costs) for s1, s2 in pairs]`, but faster for
+    many short strings.
+
+    Pairs of short strings are sorted by length and put into buckets of up to
+    `batch_size` pairs. The strings of a bucket are padded to the same lengths
+    and the matrices of all pairs in the bucket are filled in lockstep, which
+    spreads the per-diagonal overhead of the NumPy engine over the bucket.
+    Padding does not change the cells that belong to the actual strings, so the
+    result is the same. Identical and long strings are aligned one by one.
+    """
+    alignments: List[List[Tuple[int, int, float]]] = [[] for _ in pairs]
+    short = []
+    for k, (s1, s2) in enumerate(pairs):
+        if s1 == s2 or max(len(s1), len(s2)) > BATCH_MAX_LENGTH:
+            alignments[k] = wedit_distance_align(s1, s2, costs=costs)
+        else:
+            short.append(k)
+    short.sort(key=lambda k: (len(pairs[k][0]) + len(pairs[k][1]), len(pairs[k][0])))
+
+    bucket: List[int] = []
+    len1, len2 = 0, 0
+    for k in short + [-1]:
+        if k >= 0:
+            s1, s2 = pairs[k]
+            new_len1, new_len2 = max(len1, len(s1)), max(len2, len(s2))
+            cells = (new_len1 + new_len2 + 1) * (min(new_len1, new_len2) + 1)
+            if len(bucket) < batch_size and (len(bucket) + 1) * cells <= max(
+                LOW_MEMORY_THRESHOLD, cells
+            ):
+                bucket.append(k)
+                len1, len2 = new_len1, new_len2
+                continue
+        # bucket is full (or there are no more pairs)
+        bucket_pairs = [pairs[b] for b in bucket]
+        bucket_alignments = _wedit_dist_align_bucket(bucket_pairs, costs)
+        for b, alignment in zip(bucket, bucket_alignments):
+            alignments[b] = alignment
+        if k >= 0:
+            bucket = [k]
+            len1, len2 = len(pairs[k][0]), len(pairs[k][1])
+    return alignments
+
+
+def _wedit_dist_align_bucket(
+    pairs: Sequence[Tuple[str, str]], costs: CostModel = DEFAULT_COST_MODEL
+) -> List[List[Tuple[int, int, float]]]:
+    """Align a bucket of pairs in lockstep, see `wedit_distance_align_batch`"""
+    if not pairs:
+        return []
+    len1 = max(len(s1) for s1, _ in pairs)
+    len2 = max(len(s2) for _, s2 in pairs)
+    # code point 0 as padding
+    codes1 = np.zeros((len(pairs), len1), dtype=np.uint32)
+    codes2 = np.zeros((len(pairs), len2), dtype=np.uint32)
+    for b, (s1, s2) in enumerate(pairs):
+        codes1[b, : len(s1)] = _codepoints(s1)
+        codes2[b, : len(s2)] = _codepoints(s2)
+    band = len1 + len2
+    diags = np.empty(
+        (len(pairs), len1 + len2 + 1, _wedit_dist_width(len1, len2, band)),
+        dtype=np.float64,
+    )
+    for _ in _wedit_dist_sweep(codes1, codes2, band, diags, costs):
+        pass
+    return [
+        _wedit_dist_backtrace_diagonals(diags[b], len1, len2, end=(len(s1), len(s2)))
+        for b, (s1, s2) in enumerate(pairs)
+    ]
+
+
+def wedit_distance_align_anchored(
+    s1: str, s2: str, engine: str = "banded", costs: CostModel = DEFAULT_COST_MODEL
+) -> List[Tuple[int, int, float]]:
+    """
+    Like `wedit_distance_align`, but tokens (separated by spaces) that occur in
+    both strings are used as anchors and only the gaps between them are aligned
+    character by character.
+
+    Anchors are the matching blocks of a token-level diff (see
+    `difflib.SequenceMatcher`). Their characters are aligned one-to-one at zero
+    cost, the gaps are aligned with `wedit_distance_align` and the results are
+    stitched together into a backpointer list for the complete strings.
+
+    This is an approximation: the result is the same as for the full alignment
+    whenever the full alignment maps the anchor tokens onto each other, which
+    is the common case for pairs of similar sentences.
+    """
+    tokens1, tokens2 = s1.split(" "), s2.split(" ")
+    starts1, starts2 = _token_starts(tokens1), _token_starts(tokens2)
+    matcher = difflib.SequenceMatcher(None, tokens1, tokens2, autojunk=False)
+
+    alignment: List[Tuple[int, int, float]] = [(0, 0, 0)]
+    i, j, weight = 0, 0, 0.0
+    for t1, t2, size in matcher.get_matching_blocks():
+        if size == 0:
+            continue
+        # character span of the anchor tokens
+        begin1 = starts1[t1]
+        end1 = starts1[t1 + size - 1] + len(tokens1[t1 + size - 1])
+        begin2 = starts2[t2]
+        if begin1 == end1:
+            continue
+        # align the gap before the anchor
+        gap = wedit_distance_align(s1[i:begin1], s2[j:begin2], engine, costs)
+        alignment.extend((i + k, j + m, weight + w) for k, m, w in gap[1:])
+        weight += gap[-1][2]
+        # align the anchor
+        alignment.extend(
+            (begin1 + k, begin2 + k, weight) for k in range(1, end1 - begin1 + 1)
+        )
+        i, j = end1, begin2 + end1 - begin1
+    # align the remainder
+    gap = wedit_distance_align(s1[i:], s2[j:], engine, costs)
+    alignment.extend((i + k, j + m, weight + w) for k, m, w in gap[1:])
+    return alignment
+
+
+def _token_starts(tokens: List[str]) -> List[int]:
+    """Character offsets of space-separated tokens"""
+    starts, offset = [], 0
+    for token in tokens:
+        starts.append(offset)
+        offset += len(token) + 1
+    return starts
+
+
+def identical_alignment(length: int) -> List[Tuple[int, int, float]]:
+    """
+    Backpointers of a string of `length` characters and itself: every character
+    is aligned to itself at zero cost. This is what the DP returns for identical
+    strings, because all other paths have a positive cost.
+    """
+    return [(k, k, 0.0) for k in range(length + 1)]
+
+
+def identical_affixes(s1: str, s2: str) -> Tuple[int, int]:
+    """
+    Lengths of the longest prefix and suffix of whole tokens (separated by
+    spaces) that `s1` and `s2` have in common, including the spaces between
+    the affixes and the rest. The affixes leave at least one token of each
+    string.
+    """
+    tokens1, tokens2 = s1.split(" "), s2.split(" ")
+    n = min(len(tokens1), len(tokens2)) - 1
+    n_prefix = 0
+    while n_prefix < n and tokens1[n_prefix] == tokens2[n_prefix]:
+        n_prefix += 1
+    n_suffix = 0
+    while n_suffix < n - n_prefix and tokens1[-1 - n_suffix] == tokens2[-1 - n_suffix]:
+        n_suffix += 1
+    prefix = sum(len(token) + 1 for token in tokens1[:n_prefix])
+    suffix = sum(len(token) + 1 for token in tokens1[::-1][:n_suffix])
+    return prefix, suffix
+
+
+def add_identical_affixes(
+    alignment: List[Tuple[int, int, float]], prefix: int, suffix: int
+) -> List[Tuple[int, int, float]]:
+    """
+    Extend the backpointers of two strings by an identical prefix and suffix of
+    `prefix` and `suffix` characters, which are aligned to themselves at zero
+    cost (see `identical_affixes`).
+
+    Aligning trimmed strings is an approximation, the DP of the complete
+    strings can take a different path around the borders of the affixes.
+    """
+    i, j, weight = alignment[-1]
+    return (
+        identical_alignment(prefix)[:-1]
+        + [(prefix + k, prefix + m, w) for k, m, w in alignment]
+        + [(prefix + i + k, prefix + j + k, weight) for k in range(1, suffix + 1)]
+    )
@@ -127,35 +127,7 @@ def load_and_merge_datasets(configs: Dict[str, Any]) -> datasets.DatasetDict:
     """
     Load, resample and merge the dataset splits as specified in the config file.
     """
-
-    splits_and_paths = [
-        ("train", configs["data"]["paths_train"]),
-        ("validation", configs["data"]["paths_validation"]),
-        ("test", configs["data"]["paths_test"]),
-    ]
-
-    ds_split_merged = datasets.DatasetDict()
-    # Iterate over splits (i.e. train, validation, test)
-    for split, paths in splits_and_paths:
-        # Load all datasets for this split
-        dsets = [
-            datasets.load_dataset("json", data_files=path, split="train")
-            for path in paths
-        ]
-        # Map each dataset to the desired number of examples for this dataset
-        num_examples = configs["data"][f"n_examples_{split}"]
-        ds2num_examples = {dsets: num_examples[i] for i, dsets in enumerate(dsets)}
-        # Merge and resample datasets for this split
-        ds = loader.merge_datasets(
-            ds2num_examples,
-            seed=configs["random_seed"],
-            shuffle=configs["data"].get("do_shuffle", True),
-        )
-        ds_split_merged[split] = ds
-
-    dataset = ds_split_merged
-
-    return dataset
+    return loader.load_and_merge_datasets(configs)
 
 
 def warmstart_seq2seq_model(
@@ -1,3 +1,4 @@
+import logging
 import datasets
 from transnormer.data import loader
 
@@ -242,3 +243,49 @@ def test_merge_datasets():
     # of the datasets is) in the final set
     ds = loader.merge_datasets([ds1, ds2], seed=seed)
     assert ds.num_rows == 8
+
+
+def test_iter_tsv_sentences():
+    for path in [
+        "tests/testdata/dtaeval/txt/arnima_invalide_1818-head10.txt",
+        "tests/testdata/ridges/ridges.train.head-10.txt",
+    ]:
+        columns = loader.load_tsv_to_lists(path)
+        target = list(zip(*columns))
+        assert list(loader.iter_tsv_sentences(path, buffer_size=16)) == target
+
+
+def test_iter_tsv_sentences_ill_formed(tmp_path, caplog):
+    path = tmp_path / "doc.txt"
+    path.write_text("\n\na\tA\nb\tB\n\n\nc\nd\tD\tx\ne\tE\n\n", encoding="utf-8")
+    with caplog.at_level(logging.WARNING, logger="transnormer.data.loader"):
+        sents = list(loader.iter_tsv_sentences(str(path)))
+    assert sents == [(["a", "b"], ["A", "B"]), (["e"], ["E"])]
+    assert loader.ill_formed_lines[str(path)] == 2
+    assert "Skipped 2 ill-formed lines" in caplog.text
+
+
+def test_iter_tsv_sentences_columns(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("a\tA\nb\tB\tx\nc\n\nd\tD\tx\n", encoding="utf-8")
+    sents = list(loader.iter_tsv_sentences(str(path), columns=(0, 1)))
+    assert sents == [(["a", "b"], ["A", "B"]), (["d"], ["D"])]
+    assert loader.ill_formed_lines[str(path)] == 1
+    # lines with more than two columns keep their first two in RIDGES
+    assert loader.read_ridges_raw(str(path)) == {
+        "orig": ["a b", "d"],
+        "norm": ["A B", "D"],
+    }
+
+
+def test_iter_tsv_examples_from_generator(tmp_path):
+    path = "tests/testdata/dtaeval/txt/"
+    dataset = datasets.Dataset.from_generator(
+        loader.iter_tsv_examples,
+        gen_kwargs={"path": path},
+        cache_dir=str(tmp_path),
+    )
+    target = loader.load_dtaeval_as_dataset(path)
+    assert sorted(dataset["orig"]) == sorted(target["orig"])
+    assert sorted(dataset["norm"]) == sorted(target["norm"])
+    assert len(dataset) == len(target) > 0
@@ -0,0 +1,77 @@
+from transnormer.evaluation import align_levenshtein
+from transnormer.evaluation.wedit_distance_align import wedit_distance_align
+
+
+def test_align() -> None:
+    target = [
+        [
+            ("Sie", "░", 4),
+            ("bekommen", "bekommen", 0),
+            ("ferner", "ferner▁an", 3.5999999999999996),
+        ],
+        [("das", "das░", 2), ("ist", "ist", 0)],
+    ]
+    actual = align_levenshtein.align(
+        ["Sie bekommen ferner", "das ist"], ["bekommen ferner an", "dasist"]
+    )
+    assert actual == target
+
+
+def test_backpointers_to_word_alignment_skip() -> None:
+    # backpointers that do not cover the sentences
+    backpointers = wedit_distance_align("a", "a")
+    assert (
+        align_levenshtein.backpointers_to_word_alignment(backpointers, "a b", "a b")
+        is None
+    )
+
+
+def test_align_parallel(capsys) -> None:
+    # the third pair is skipped
+    sents_ref = ["Sie bekommen ferner", "das ist", "ab c", "Die Stadt"] * 3
+    sents_pred = ["bekommen ferner an", "dasist", "a░b c", "Die Stat"] * 3
+    serial = align_levenshtein.align(sents_ref, sents_pred)
+    serial_out = capsys.readouterr().out
+    assert serial_out.count("Skipping one sample") == 3
+    parallel = align_levenshtein.align(sents_ref, sents_pred, n_jobs=2)
+    assert parallel == serial
+    assert capsys.readouterr().out == serial_out
+
+
+def test_align_paths() -> None:
+    sents_ref = ["das ist ein Test", "Das ist ein Test", "das ist ein Test"]
+    sents_pred = ["das ist ein Test", "das ist ein Test", "das ist kein Test"]
+    align_levenshtein.path_counts.clear()
+    target = align_levenshtein.align(sents_ref, sents_pred)
+    assert align_levenshtein.path_counts == {"identical": 2, "full": 1}
+    align_levenshtein.path_counts.clear()
+    trimmed = align_levenshtein.align(sents_ref, sents_pred, trim=True)
+    assert [[words[:2] for words in sent] for sent in trimmed] == [
+        [words[:2] for words in sent] for sent in target
+    ]
+    assert align_levenshtein.path_counts == {"identical": 2, "trimmed": 1}
+
+
+def test_align_both(capsys) -> None:
+    sents_ref = ["Sie bekommen ferner", "das ist", "ab c", "Die Stadt"]
+    sents_pred = ["bekommen ferner an", "dasist", "a░b c", "Die Stadt"]
+    target = (
+        align_levenshtein.align(sents_ref, sents_pred),
+        align_levenshtein.align(sents_pred, sents_ref),
+    )
+    target_out = capsys.readouterr().out
+    assert align_levenshtein.align_both(sents_ref, sents_pred) == target
+    assert capsys.readouterr().out == target_out
+
+
+def test_align_keep_skipped() -> None:
+    # the first pair cannot be aligned and gets skipped
+    sents_ref = ["ab c", "das ist"]
+    sents_pred = ["a░b c", "das ist"]
+    aligned = align_levenshtein.align(sents_ref, sents_pred)
+    assert len(aligned) == 1
+    kept = align_levenshtein.align(sents_ref, sents_pred, keep_skipped=True)
+    assert kept == [[]] + aligned
+    fwd, bwd = align_levenshtein.align_both(sents_ref, sents_pred, keep_skipped=True)
+    assert fwd == kept
+    assert len(bwd) == 2 and all(bwd)
@@ -0,0 +1,123 @@
+import json
+import threading
+
+from transnormer.evaluation import align_levenshtein, alignment_cache
+from transnormer.evaluation.alignment_cache import (
+    AlignmentCache,
+    decode_backpointers,
+    encode_backpointers,
+)
+from transnormer.evaluation.wedit_distance_align import (
+    COST_MODELS,
+    DEFAULT_COST_MODEL,
+    wedit_distance_align,
+)
+
+
+def test_encode_backpointers() -> None:
+    backpointers = wedit_distance_align("sie bekommen", "bekommen sie")
+    assert decode_backpointers(encode_backpointers(backpointers)) == backpointers
+    assert decode_backpointers(encode_backpointers([])) == []
+
+
+def test_alignment_cache(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    backpointers = wedit_distance_align("rain", "shine")
+    with AlignmentCache(path) as cache:
+        assert cache.get("rain", "shine") is None
+        cache.put("rain", "shine", backpointers)
+        cache.commit()
+        # a second connection, e.g. of a concurrent evaluation
+        with AlignmentCache(path) as other:
+            assert other.get("rain", "shine") == backpointers
+            other.put("das ist", "dasist", wedit_distance_align("das ist", "dasist"))
+        assert cache.get("das ist", "dasist") is not None
+    with AlignmentCache(path) as cache:
+        assert len(cache) == 2
+        assert cache.get("rain", "shine") == backpointers
+        assert cache.get("shine", "rain") is None
+        assert cache.get("rain", "shine", mode="anchored") is None
+
+
+def test_alignment_cache_cost_model(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    with AlignmentCache(path) as cache:
+        cache.put("rain", "shine", wedit_distance_align("rain", "shine"))
+        new_version = DEFAULT_COST_MODEL._replace(version=-1)
+        assert cache.get("rain", "shine", costs=new_version) is None
+        assert cache.get("rain", "shine", costs=COST_MODELS["uniform"]) is None
+
+
+def test_align_cached(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    sents_ref = ["Sie bekommen ferner", "das ist", "Das ist"]
+    sents_pred = ["bekommen ferner an", "dasist", "dasist"]
+    target = align_levenshtein.align(sents_ref, sents_pred)
+    assert align_levenshtein.align(sents_ref, sents_pred, cache_file=path) == target
+    # the homogenised pairs "das ist" / "dasist" share an entry
+    with AlignmentCache(path) as cache:
+        assert len(cache) == 2
+    assert align_levenshtein.align(sents_ref, sents_pred, cache_file=path) == target
+
+
+def test_alignment_cache_eviction(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    words = ["eins", "zwei", "drei", "vier"]
+    with AlignmentCache(path, max_entries=3) as cache:
+        for word in words:
+            cache.put(word, word, wedit_distance_align(word, word))
+            cache.commit()
+        # "eins" becomes the most recently used entry
+        assert cache.get("eins", "eins") is not None
+        assert cache.get("fünf", "fünf") is None
+        cache.commit()
+        assert cache.prune(max_entries=3) == 1
+        assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 1}
+        assert cache.get("zwei", "zwei") is None
+        assert cache.get("eins", "eins") is not None
+
+        size = cache.size()
+        assert cache.prune(max_bytes=size - 1) == 1
+        assert len(cache) == 2
+        assert cache.prune(max_age=0) == 2
+        assert len(cache) == 0
+
+
+def test_alignment_cache_main(tmp_path, capsys) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    with AlignmentCache(path) as cache:
+        for word in ["eins", "zwei", "drei"]:
+            cache.put(word, word, wedit_distance_align(word, word))
+    alignment_cache.main([path, "--max-entries", "2"])
+    output = json.loads(capsys.readouterr().out)
+    assert output["entries"] == 2
+    assert output["evictions"] == 1
+
+
+def test_alignment_cache_concurrent_creation(tmp_path) -> None:
+    n_threads = 8
+    backpointers = wedit_distance_align("rain", "shine")
+    for attempt in range(5):
+        path = str(tmp_path / f"cache-{attempt}.sqlite")
+        barrier = threading.Barrier(n_threads)
+        errors = []
+
+        def open_and_put(i: int) -> None:
+            try:
+                barrier.wait()
+                with AlignmentCache(path) as cache:
+                    cache.put(f"rain {i}", "shine", backpointers)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=open_and_put, args=(i,)) for i in range(n_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        # no connection dropped the table after another one had filled it
+        with AlignmentCache(path) as cache:
+            assert len(cache) == n_threads
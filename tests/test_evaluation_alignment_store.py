@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from transnormer.evaluation import align_levenshtein, metrics
+from transnormer.evaluation.alignment_store import (
+    load_alignments,
+    load_metadata,
+    save_alignments,
+)
+
+
+def test_save_and_load_alignments(tmp_path) -> None:
+    path = str(tmp_path / "store")
+    fwd, bwd = align_levenshtein.align_both(
+        ["Sie bekommen ferner", "daß ſie", "Thal"],
+        ["bekommen ferner an", "dass sie", "Tal"],
+    )
+    save_alignments(path, {"ref": fwd, "pred": bwd}, {"cost_model": "default"})
+    loaded = load_alignments(path)
+    assert list(loaded) == ["ref", "pred"]
+    assert loaded["ref"].to_lists() == fwd
+    assert loaded["pred"].to_lists() == bwd
+    assert loaded["ref"].vocab is loaded["pred"].vocab
+    assert isinstance(loaded["ref"].ref_ids, np.memmap)
+    assert not isinstance(load_alignments(path, mmap=False)["ref"].ref_ids, np.memmap)
+    assert load_metadata(path) == {"cost_model": "default"}
+
+
+def test_rescore_alignment_store(tmp_path) -> None:
+    path = str(tmp_path / "store")
+    ref = ["Sie bekommen ferner", "das ist gut", "Thal"]
+    pred = ["bekommen ferner an", "dasist gut", "Tal"]
+    target = metrics.word_acc_final(ref, pred, ["both"], alignment_store=path)
+
+    alignments = load_alignments(path)
+    assert (
+        metrics.word_acc_scores(alignments["ref"], alignments["pred"], ["both"])
+        == target
+    )
+    assert metrics.n_correct_and_total_selected_target_types(
+        alignments["ref"], {"gut", "Thal"}
+    ) == (1, 2)
+
+
+def test_load_alignments_version(tmp_path) -> None:
+    path = tmp_path / "store"
+    save_alignments(str(path), {"ref": []})
+    assert load_alignments(str(path))["ref"].to_lists() == []
+    (path / "meta.json").write_text('{"version": 0}')
+    with pytest.raises(ValueError):
+        load_alignments(str(path))
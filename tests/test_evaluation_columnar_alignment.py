@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+
+from transnormer.evaluation import metrics
+from transnormer.evaluation.columnar_alignment import ColumnarAlignment, Vocabulary
+
+# Fix seeds for reproducibilty
+SEED = 42
+random.seed(SEED)
+
+WORDS = ["der", "die", "das", "Thal", "Tal", "seyn", "sein", "", "▁", "░"]
+
+
+def random_alignments(n_sents: int):
+    return [
+        [
+            (random.choice(WORDS[:-2]), random.choice(WORDS), random.random())
+            for _ in range(random.randint(1, 8))
+        ]
+        for _ in range(n_sents)
+    ]
+
+
+def reference_n_correct_and_total(alignments, selected_types, deselected_types):
+    correct, total = 0, 0
+    for sent in alignments:
+        for ref, pred, _ in sent:
+            if ref == "" or ref in deselected_types:
+                continue
+            if selected_types is None or ref in selected_types:
+                correct += ref == pred
+                total += 1
+    return correct, total
+
+
+def test_columnar_alignment_roundtrip() -> None:
+    alignments = random_alignments(20) + [[]]
+    columnar = ColumnarAlignment.from_lists(alignments)
+    assert columnar.to_lists() == alignments
+    assert len(columnar) == 21
+    assert columnar.vocab.tokens[Vocabulary.EMPTY] == ""
+    other = columnar.with_vocab(Vocabulary(["seyn", "x"]))
+    assert other.to_lists() == alignments
+
+
+def test_word_acc() -> None:
+    alignments = [[word for word in sent if word[0]] for sent in random_alignments(50)]
+    alignments = [sent for sent in alignments if sent]
+    acc, per_sent = metrics.word_acc(alignments)
+    target_per_sent = [
+        sum(ref == pred for ref, pred, _ in sent) / len(sent) for sent in alignments
+    ]
+    target = sum(sum(ref == pred for ref, pred, _ in sent) for sent in alignments)
+    assert acc == target / sum(len(sent) for sent in alignments)
+    assert per_sent.tolist() == target_per_sent
+    columnar_acc, columnar_per_sent = metrics.word_acc(
+        ColumnarAlignment.from_lists(alignments)
+    )
+    assert columnar_acc == acc
+    assert np.array_equal(columnar_per_sent, per_sent)
+    acc, per_sent = metrics.word_acc([])
+    assert acc == 0 and len(per_sent) == 0
+
+
+def test_n_correct_and_total_selected_target_types() -> None:
+    alignments = random_alignments(50)
+    for selected, deselected in [
+        (None, set()),
+        ({"das", "Thal"}, set()),
+        (None, {"das", "unknown"}),
+        ({"das", "Thal", "seyn"}, {"seyn"}),
+    ]:
+        assert metrics.n_correct_and_total_selected_target_types(
+            alignments, selected, deselected
+        ) == reference_n_correct_and_total(alignments, selected, deselected)
+
+
+def test_n_correct_and_total_selected_source_types(capsys) -> None:
+    orig2gold = random_alignments(30)
+    orig2pred = [
+        [(ref, random.choice(WORDS), w) for ref, _, w in sent] for sent in orig2gold
+    ]
+    # a sentence with different tokenisation and a missing sentence
+    orig2pred[0] = [("x", "x", 0)] + orig2pred[0]
+    orig2gold.append([("das", "das", 0)])
+
+    target_correct, target_total, n_skipped = 0, 0, 0
+    for sent_gold, sent_pred in zip(orig2gold, orig2pred):
+        for (orig1, gold, _), (orig2, pred, _) in zip(sent_gold, sent_pred):
+            if orig1 != orig2:
+                n_skipped += 1
+            elif orig1 and orig1 in {"das", "die"}:
+                target_correct += gold == pred
+                target_total += 1
+    assert metrics.n_correct_and_total_selected_source_types(
+        orig2gold, orig2pred, {"das", "die"}
+    ) == (target_correct, target_total)
+    assert capsys.readouterr().out == f"Skipped {n_skipped} tokens.\n"
@@ -0,0 +1,361 @@
+import json
+import logging
+
+import numpy as np
+import pytest
+
+from transnormer.evaluation import evaluate
+from transnormer.evaluation.alignment_cache import AlignmentCache
+from transnormer.evaluation.sentence_counts import COLUMNS, SKIPPED
+from transnormer.evaluation.significance import bootstrap_ci
+
+REF = ["Sie bekommen ferner", "das ist gut", "Der Wind"]
+PREDS = [
+    ["Sie bekommen ferner", "dasist gut", "Der Wind"],
+    ["bekommen ferner an", "dasist gut", "Der Wind"],
+    ["Sie bekommen ferner", "das ist gut", "der Wind weht"],
+]
+
+
+def test_get_leaderboard_metrics(tmp_path) -> None:
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        for align_types in [["both"], ["ref"], ["pred"]]:
+            leaderboard = evaluate.get_leaderboard_metrics(
+                REF, PREDS, align_types, cache=cache
+            )
+            assert len(leaderboard) == len(PREDS)
+            for pred, metrics in zip(PREDS, leaderboard):
+                target = evaluate.get_metrics(REF, pred, align_types, cache=cache)
+                del target["cache"], target["align_paths"]
+                assert metrics == target
+
+
+# the first pair cannot be aligned with 'ref' as the base and gets skipped
+REF_SKIPPED = ["ab c", "das ist", "Der Wind"]
+PRED_SKIPPED = ["a░b c", "das ist", "Der Wnd"]
+
+
+def test_get_leaderboard_metrics_skipped(tmp_path) -> None:
+    preds = [PRED_SKIPPED, REF_SKIPPED, ["das ist", "ab c", "Der Wnd"]]
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        for align_types, n_aligned in [(["ref"], 2), (["pred"], 3)]:
+            leaderboard = evaluate.get_leaderboard_metrics(
+                REF_SKIPPED, preds, align_types, cache=cache
+            )
+            per_sent = leaderboard[0]["per_sent"][align_types[0]]
+            assert len(per_sent) == n_aligned
+            for pred, metrics in zip(preds, leaderboard):
+                target = evaluate.get_metrics(
+                    REF_SKIPPED, pred, align_types, cache=cache
+                )
+                del target["cache"], target["align_paths"]
+                assert metrics == target
+
+
+def test_main_leaderboard(tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(evaluate, "CACHE", str(tmp_path / "cache.sqlite"))
+    ref_file = tmp_path / "ref.txt"
+    ref_file.write_text("\n".join(REF))
+    for i, pred in enumerate(PREDS):
+        (tmp_path / f"pred-{i}.txt").write_text("\n".join(pred))
+
+    evaluate.main(
+        [
+            "--input-type=text",
+            f"--ref-file={ref_file}",
+            "--pred-file",
+            str(tmp_path / "pred-*.txt"),
+            "-a",
+            "both",
+        ]
+    )
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line["pred-file"] for line in lines] == [
+        str(tmp_path / f"pred-{i}.txt") for i in range(len(PREDS))
+    ]
+    assert lines[0]["acc_harmonized"] < 1.0
+
+    evaluate.main(
+        [
+            "--input-type=text",
+            f"--ref-file={ref_file}",
+            f"--pred-file={tmp_path / 'pred-0.txt'}",
+            "-a",
+            "both",
+        ]
+    )
+    output = json.loads(capsys.readouterr().out)
+    assert output["pred-file"] == str(tmp_path / "pred-0.txt")
+    assert output["acc_harmonized"] == lines[0]["acc_harmonized"]
+
+
+def test_get_metrics_streaming(tmp_path) -> None:
+    ref = REF * 3
+    pred = [sent for pred in PREDS for sent in pred]
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        target = evaluate.get_metrics(ref, pred, ["both"], cache=cache)
+        for chunk_size in [1, 4, 100]:
+            path = tmp_path / f"scores-{chunk_size}.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                metrics = evaluate.get_metrics_streaming(
+                    iter(ref),
+                    iter(pred),
+                    ["both"],
+                    cache=cache,
+                    chunk_size=chunk_size,
+                    sent_wise_file=f,
+                )
+            assert metrics["n"] == target["n"]
+            assert metrics["acc_harmonized"] == target["acc_harmonized"]
+            assert metrics["dist_norm_c"] == target["dist_norm_c"]
+            scores = [float(score) for score in path.read_text().split(",")]
+            assert scores == target["per_sent"]["both"]
+
+
+def test_get_metrics_streaming_skipped(tmp_path) -> None:
+    # only 'ref' as the base skips the first pair
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        target, _, _ = evaluate.get_metrics_incremental(
+            REF_SKIPPED, PRED_SKIPPED, ["both"], cache=cache
+        )
+        for chunk_size in [1, 2, 100]:
+            path = tmp_path / f"scores-{chunk_size}.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                metrics = evaluate.get_metrics_streaming(
+                    iter(REF_SKIPPED),
+                    iter(PRED_SKIPPED),
+                    ["both"],
+                    cache=cache,
+                    chunk_size=chunk_size,
+                    sent_wise_file=f,
+                )
+            assert metrics["n"] == 3
+            assert metrics["acc_harmonized"] == target["acc_harmonized"]
+            scores = [float(score) for score in path.read_text().split(",")]
+            assert scores == target["per_sent"]["both"]
+            assert len(scores) == 2
+
+
+def test_main_streaming(tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(evaluate, "CACHE", str(tmp_path / "cache.sqlite"))
+    ref_file = tmp_path / "ref.txt"
+    ref_file.write_text("\n".join(REF))
+    pred_file = tmp_path / "pred.txt"
+    pred_file.write_text("\n".join(PREDS[1]))
+    arguments = [
+        "--input-type=text",
+        f"--ref-file={ref_file}",
+        f"--pred-file={pred_file}",
+        "-a",
+        "both",
+    ]
+
+    evaluate.main(arguments + [f"--sent-wise-file={tmp_path / 'target.txt'}"])
+    target = json.loads(capsys.readouterr().out)
+    evaluate.main(
+        arguments
+        + ["--stream", "--chunk-size=2", f"--sent-wise-file={tmp_path / 'out.txt'}"]
+    )
+    output = json.loads(capsys.readouterr().out)
+    # the second run finds the alignments in the cache
+    assert output["align_paths"] == {"identical": 2, "cached": 4}
+    for field in ["cache", "align_paths"]:
+        del target[field], output[field]
+    assert output == target
+    assert (tmp_path / "out.txt").read_text() == (tmp_path / "target.txt").read_text()
+
+
+def test_get_metrics_incremental(tmp_path) -> None:
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        for align_types in [["both"], ["ref"], ["pred"]]:
+            metrics, keys, counts = evaluate.get_metrics_incremental(
+                REF, PREDS[0], align_types, cache=cache
+            )
+            target = evaluate.get_metrics(REF, PREDS[0], align_types, cache=cache)
+            assert metrics.pop("reused") == 0
+            for field in ["cache", "align_paths"]:
+                del target[field], metrics[field]
+            assert metrics == target
+
+            # PREDS[1] shares its last two sentences with PREDS[0]
+            previous = dict(zip(keys, counts))
+            metrics, _, _ = evaluate.get_metrics_incremental(
+                REF, PREDS[1], align_types, previous, cache=cache
+            )
+            target = evaluate.get_metrics(REF, PREDS[1], align_types, cache=cache)
+            assert metrics.pop("reused") == 2
+            for field in ["cache", "align_paths"]:
+                del target[field], metrics[field]
+            assert metrics == target
+
+
+def test_get_metrics_incremental_skipped(tmp_path) -> None:
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        for align_types in [["ref"], ["pred"]]:
+            metrics, keys, counts = evaluate.get_metrics_incremental(
+                REF_SKIPPED, PRED_SKIPPED, align_types, cache=cache
+            )
+            target = evaluate.get_metrics(
+                REF_SKIPPED, PRED_SKIPPED, align_types, cache=cache
+            )
+            del metrics["reused"]
+            for field in ["cache", "align_paths"]:
+                del target[field], metrics[field]
+            assert metrics == target
+            assert len(keys) == len(counts) == 3
+
+        # only 'ref' as the base skips the first pair
+        metrics, keys, counts = evaluate.get_metrics_incremental(
+            REF_SKIPPED, PRED_SKIPPED, ["both"], cache=cache
+        )
+        assert counts[0, COLUMNS.index("total_ref")] == SKIPPED
+        assert counts[0, COLUMNS.index("total_pred")] > 0
+        assert len(metrics["per_sent"]["both"]) == 2
+        assert len(metrics["per_sent"]["pred"]) == 3
+        # skipped pairs are re-used as well
+        again, _, _ = evaluate.get_metrics_incremental(
+            REF_SKIPPED, PRED_SKIPPED, ["both"], dict(zip(keys, counts)), cache=cache
+        )
+        assert again["reused"] == 3
+        assert again["acc_harmonized"] == metrics["acc_harmonized"]
+
+    ci = bootstrap_ci(counts, n_resamples=100)
+    assert ci["acc_harmonized"] is not None
+
+
+def test_main_incremental(tmp_path, monkeypatch, capsys, caplog) -> None:
+    monkeypatch.setattr(evaluate, "CACHE", str(tmp_path / "cache.sqlite"))
+    ref_file = tmp_path / "ref.txt"
+    ref_file.write_text("\n".join(REF))
+    counts_file = str(tmp_path / "counts.npz")
+    arguments = [
+        "--input-type=text",
+        f"--ref-file={ref_file}",
+        "-a",
+        "both",
+        f"--counts-file={counts_file}",
+    ]
+    outputs = []
+    for i in [0, 1]:
+        pred_file = tmp_path / f"pred-{i}.txt"
+        pred_file.write_text("\n".join(PREDS[i]))
+        evaluate.main(
+            arguments
+            + [f"--pred-file={pred_file}"]
+            + ([f"--previous-counts-file={counts_file}"] if i else [])
+        )
+        outputs.append(json.loads(capsys.readouterr().out))
+    assert [output["reused"] for output in outputs] == [0, 2]
+    evaluate.main(arguments[:-1] + [f"--pred-file={pred_file}"])
+    target = json.loads(capsys.readouterr().out)
+    assert outputs[1]["acc_harmonized"] == target["acc_harmonized"]
+    assert outputs[1]["dist_norm_c"] == target["dist_norm_c"]
+
+    # counts of other settings are out of date, all pairs are scored anew
+    incremental = arguments + [
+        f"--pred-file={pred_file}",
+        f"--previous-counts-file={counts_file}",
+    ]
+    with caplog.at_level(logging.WARNING):
+        evaluate.main(incremental + ["--cost-model=uniform"])
+    assert json.loads(capsys.readouterr().out)["reused"] == 0
+    assert "ignore them" in caplog.text
+    # the counts file now holds the counts of the new settings
+    evaluate.main(incremental + ["--cost-model=uniform"])
+    assert json.loads(capsys.readouterr().out)["reused"] == len(REF)
+    # counts of an older version of the cost model are not reused either
+    evaluate.main(incremental)
+    assert json.loads(capsys.readouterr().out)["reused"] == 0
+    model = evaluate.COST_MODELS["default"]
+    monkeypatch.setitem(
+        evaluate.COST_MODELS, "default", model._replace(version=model.version + 1)
+    )
+    evaluate.main(incremental)
+    assert json.loads(capsys.readouterr().out)["reused"] == 0
+
+
+def test_get_metrics_quick(tmp_path) -> None:
+    ref = REF * 4
+    pred = [sent for pred in PREDS for sent in pred] + PREDS[0]
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        target = evaluate.get_metrics(ref, pred, ["both"], cache=cache)
+        # all batches are needed for an interval of width 0
+        metrics = evaluate.get_metrics_quick(
+            ref, pred, ["both"], target_width=0, batch_size=5, cache=cache
+        )
+        assert (metrics["n"], metrics["n_total"]) == (12, 12)
+        assert metrics["acc_harmonized"] == pytest.approx(target["acc_harmonized"])
+        assert metrics["dist_norm_c"] == pytest.approx(target["dist_norm_c"])
+        assert metrics["acc_harmonized_error"] == 0
+        assert metrics["dist_norm_c_error"] == 0
+
+        metrics = evaluate.get_metrics_quick(
+            ref, pred, ["both"], target_width=1, batch_size=5, cache=cache
+        )
+        assert metrics["n"] == 5
+        assert 0 <= metrics["acc_harmonized_error"] < 0.5
+        assert 0 <= metrics["dist_norm_c_error"] < 0.5
+
+        metrics = evaluate.get_metrics_quick(
+            ref, pred, ["ref"], target_width=1, batch_size=5, cache=cache
+        )
+        assert metrics["acc_harmonized"] is None
+        assert metrics["acc_harmonized_error"] is None
+
+
+def test_get_metrics_quick_skipped(tmp_path) -> None:
+    ref, pred = REF_SKIPPED * 4, PRED_SKIPPED * 4
+    with AlignmentCache(str(tmp_path / "cache.sqlite")) as cache:
+        for align_types in [["ref"], ["pred"]]:
+            target = evaluate.get_metrics(ref, pred, align_types, cache=cache)
+            metrics = evaluate.get_metrics_quick(
+                ref, pred, align_types, target_width=0, batch_size=5, cache=cache
+            )
+            assert metrics["n"] == 12
+            assert metrics["dist_norm_c"] == pytest.approx(target["dist_norm_c"])
+
+        metrics = evaluate.get_metrics_quick(
+            ref, pred, ["both"], target_width=0, batch_size=5, cache=cache
+        )
+        assert metrics["acc_harmonized_error"] == 0
+        # the skipped pairs add nothing to the accuracy from 'ref' as the base
+        counts = evaluate.get_sentence_counts(ref[:3], pred[:3], ["both"], cache=cache)
+        errors = evaluate.quick_errors(counts, ["both"], 0.95, 12)
+        counts[0, [COLUMNS.index("correct_ref"), COLUMNS.index("total_ref")]] = 0
+        assert errors == evaluate.quick_errors(counts, ["both"], 0.95, 12)
+
+        with pytest.raises(ValueError):
+            evaluate.get_metrics_quick([], [], ["both"], cache=cache)
+
+
+def test_ratio_error() -> None:
+    x = np.array([1, 2, 3, 4])
+    y = np.array([2, 2, 4, 4])
+    assert evaluate.ratio_error([(x, y)], 0.95, 4) == 0
+    assert evaluate.ratio_error([(x[:1], y[:1])], 0.95, 4) is None
+    error_90 = evaluate.ratio_error([(x, y)], 0.9, 1000)
+    error_95 = evaluate.ratio_error([(x, y)], 0.95, 1000)
+    assert 0 < error_90 < error_95
+    # the same ratio twice has the same error
+    assert evaluate.ratio_error([(x, y), (x, y)], 0.95, 1000) == pytest.approx(error_95)
+
+
+def test_main_bootstrap(tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(evaluate, "CACHE", str(tmp_path / "cache.sqlite"))
+    ref_file = tmp_path / "ref.txt"
+    ref_file.write_text("\n".join(REF))
+    pred_file = tmp_path / "pred.txt"
+    pred_file.write_text("\n".join(PREDS[1]))
+    evaluate.main(
+        [
+            "--input-type=text",
+            f"--ref-file={ref_file}",
+            f"--pred-file={pred_file}",
+            "-a",
+            "both",
+            "--bootstrap=100",
+        ]
+    )
+    output = json.loads(capsys.readouterr().out)
+    low, high = output["ci"]["acc_harmonized"]
+    assert low <= output["acc_harmonized"] <= high
@@ -0,0 +1,26 @@
+import logging
+
+import numpy as np
+
+from transnormer.evaluation.sentence_counts import (
+    COLUMNS,
+    load_sentence_counts,
+    save_sentence_counts,
+    sentence_key,
+)
+
+
+def test_sentence_counts(tmp_path, caplog) -> None:
+    path = str(tmp_path / "counts.npz")
+    keys = [sentence_key("das ist", "dasist"), sentence_key("das", "ist"), bytes(16)]
+    assert sentence_key("das", "ist") != sentence_key("dasi", "st")
+    counts = np.arange(len(keys) * len(COLUMNS)).reshape(len(keys), len(COLUMNS))
+    settings = {"anchored": False, "trim": False, "cost_model": "default"}
+    save_sentence_counts(path, keys, counts, settings)
+    loaded = load_sentence_counts(path, settings)
+    assert list(loaded) == keys
+    assert np.array_equal(np.array(list(loaded.values())), counts)
+    # counts of other settings are out of date
+    with caplog.at_level(logging.WARNING):
+        assert load_sentence_counts(path, {**settings, "trim": True}) == {}
+    assert "ignore them" in caplog.text
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+
+from transnormer.evaluation import evaluate, significance
+from transnormer.evaluation.sentence_counts import (
+    COLUMNS,
+    SKIPPED,
+    save_sentence_counts,
+)
+
+
+def random_counts(n: int, error_rate: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    total = rng.integers(3, 30, n)
+    correct = total - rng.binomial(total, error_rate)
+    chars = total * 6
+    dist = rng.binomial(chars, error_rate / 3)
+    return np.stack([correct, total, correct, total, dist, chars], axis=1)
+
+
+def test_bootstrap_ci() -> None:
+    counts = random_counts(2000, 0.1, seed=0)
+    intervals = significance.bootstrap_ci(counts, n_resamples=2000)
+    acc = counts[:, 0].sum() / counts[:, 1].sum()
+    low, high = intervals["acc_harmonized"]
+    assert low < acc < high
+
+    # the usual bootstrap, which resamples sentence indices
+    rng = np.random.default_rng(1)
+    indices = rng.integers(0, len(counts), (2000, len(counts)))
+    resampled = counts[indices, 0].sum(axis=1) / counts[indices, 1].sum(axis=1)
+    target_low, target_high = np.quantile(resampled, [0.025, 0.975])
+    assert abs(low - target_low) < 0.1 * (target_high - target_low)
+    assert abs(high - target_high) < 0.1 * (target_high - target_low)
+
+    # missing counts of an alignment direction
+    counts[:, COLUMNS.index("correct_pred")] = -1
+    assert significance.bootstrap_ci(counts, n_resamples=10)["acc_harmonized"] is None
+
+
+def test_significance_tests() -> None:
+    counts_a = random_counts(2000, 0.1, seed=0)
+    counts_b = random_counts(2000, 0.2, seed=1)
+    for test in [
+        significance.paired_bootstrap_test,
+        significance.approximate_randomization_test,
+    ]:
+        results = test(counts_a, counts_b, n_resamples=1000)
+        assert results["acc_harmonized"]["difference"] > 0
+        assert results["acc_harmonized"]["p_value"] < 0.01
+        assert results["dist_norm_c"]["difference"] < 0
+        assert results["dist_norm_c"]["p_value"] < 0.01
+
+    # A and B differ in a single sentence
+    counts_b = counts_a.copy()
+    counts_b[0, 0] -= 1
+    results = significance.approximate_randomization_test(counts_a, counts_b, 1000)
+    assert results["acc_harmonized"]["p_value"] == 1
+    assert results["dist_norm_c"] == {"difference": 0, "p_value": 1}
+    results = significance.paired_bootstrap_test(counts_a, counts_b, 1000)
+    assert results["acc_harmonized"]["p_value"] > 0.1
+
+
+def test_skipped_sentences() -> None:
+    counts_a = random_counts(200, 0.1, seed=0)
+    counts_b = random_counts(200, 0.2, seed=1)
+    # sentences that could not be aligned are left out of the accuracy
+    skipped_a, skipped_b = counts_a.copy(), counts_b.copy()
+    skipped_a[0, : COLUMNS.index("dist")] = SKIPPED
+    skipped_b[1, : COLUMNS.index("dist")] = SKIPPED
+    intervals = significance.bootstrap_ci(skipped_a, n_resamples=100)
+    target = significance.bootstrap_ci(counts_a[1:], n_resamples=100)
+    assert intervals["acc_harmonized"] == target["acc_harmonized"]
+    for test in [
+        significance.paired_bootstrap_test,
+        significance.approximate_randomization_test,
+    ]:
+        results = test(skipped_a, skipped_b, n_resamples=100)
+        target = test(counts_a[2:], counts_b[2:], n_resamples=100)
+        assert results["acc_harmonized"] == target["acc_harmonized"]
+        assert results["dist_norm_c"] == test(counts_a, counts_b, 100)["dist_norm_c"]
+
+
+def test_skipped_in_one_direction() -> None:
+    counts = random_counts(1000, 0.1, seed=0)
+    # the first sentences are badly predicted, but can only be aligned from 'pred'
+    counts[:200, COLUMNS.index("correct_pred")] = 0
+    counts[:200, [COLUMNS.index("correct_ref"), COLUMNS.index("total_ref")]] = SKIPPED
+    acc = evaluate.metrics_from_counts(counts, ["both"])["acc_harmonized"]
+    low, high = significance.bootstrap_ci(counts, n_resamples=1000)["acc_harmonized"]
+    assert low < acc < high
+
+
+def test_significance_main(tmp_path, capsys) -> None:
+    paths = []
+    for i, error_rate in enumerate([0.1, 0.2]):
+        paths.append(str(tmp_path / f"counts-{i}.npz"))
+        counts = random_counts(500, error_rate, seed=i)
+        save_sentence_counts(paths[-1], [bytes(16)] * len(counts), counts, {})
+
+    significance.main([paths[0], "-n", "100"])
+    output = json.loads(capsys.readouterr().out)
+    assert set(output["ci"]) == {"acc_harmonized", "dist_norm_c"}
+    significance.main([paths[0], paths[1], "-n", "100", "--test", "randomization"])
+    output = json.loads(capsys.readouterr().out)
+    assert output["acc_harmonized"]["p_value"] < 0.05
@@ -0,0 +1,36 @@
+import glob
+import json
+import random
+
+from transnormer.evaluation import tokenise
+from transnormer.evaluation.benchmark import basic_tokenise_legacy
+
+# Fix seeds for reproducibilty
+SEED = 42
+random.seed(SEED)
+
+
+def test_basic_tokenise() -> None:
+    assert tokenise.basic_tokenise("Hallo, Welt...") == "Hallo , Welt ."
+    assert tokenise.basic_tokenise("er sagte: „Ja!“") == "er sagte : „ Ja ! “"
+    assert tokenise.basic_tokenise("a ... b") == "a . . b"
+    assert tokenise.basic_tokenise("Gott's Wort") == "Gott' s Wort"
+
+
+def test_basic_tokenise_like_legacy() -> None:
+    sentences = []
+    for path in glob.glob("tests/testdata/jsonl/*.jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                sentences += [v for v in record.values() if isinstance(v, str)]
+    characters = list(tokenise.PUNCTUATION_BEFORE + tokenise.PUNCTUATION_AFTER)
+    characters += [" ", " ", "a", "ſ", "\t"]
+    for _ in range(10000):
+        length = random.randint(0, 12)
+        sentences.append("".join(random.choices(characters, k=length)))
+
+    target = [basic_tokenise_legacy(sentence) for sentence in sentences]
+    assert [tokenise.basic_tokenise(sentence) for sentence in sentences] == target
+    assert tokenise.basic_tokenise_batch(sentences) == target
+    assert tokenise.basic_tokenise_batch(sentences, memo_size=10) == target
@@ -1,5 +1,15 @@
-from transnormer.evaluation.dataset_stats import type_alignment_stats
-from transnormer.evaluation import align_levenshtein, tokenise
+import json
+
+import pytest
+
+from transnormer.data import loader
+from transnormer.evaluation import dataset_stats
+from transnormer.evaluation.dataset_stats import (
+    load_training_data,
+    sharded_type_alignment_stats,
+    type_alignment_stats,
+)
+from transnormer.evaluation import align_levenshtein, metrics, tokenise
 
 
 SENTS_ORIG = [
@@ -91,3 +101,130 @@ def test_type_alignment_stats() -> None:
         },
     }
     assert filtered_stats == target
+
+
+def test_type_accuracy_breakdown() -> None:
+    type_stats = {
+        "der": {"der": 2},
+        "das": {"das": 2, "daß": 1},
+        "hilfft": {"hilft": 1, "hilfft": 1},
+        "Wind": {"Wind": 12},
+    }
+    sents_pred = [
+        "Womit aber der von Fliſco nicht allerdings will einstimmen.",
+        SENTS_PRED[1],
+    ]
+    orig = [tokenise.basic_tokenise(sent) for sent in SENTS_ORIG]
+    orig2gold = align_levenshtein.align(
+        orig, [tokenise.basic_tokenise(sent) for sent in SENTS_NORM]
+    )
+    orig2pred = align_levenshtein.align(
+        orig, [tokenise.basic_tokenise(sent) for sent in sents_pred]
+    )
+    breakdown = metrics.type_accuracy_breakdown(
+        orig2gold, orig2pred, type_stats, frequency_bands=(1, 10)
+    )
+    known = set(type_stats)
+    all_types = {src for sent in orig2gold for src, _, _ in sent}
+    buckets = {
+        "all": None,
+        "known": known,
+        "unknown": all_types - known,
+        "ambiguous": {"das", "hilfft"},
+        "unambiguous": {"der", "Wind"},
+        "freq:1-9": {"der", "das", "hilfft"},
+        "freq:10+": {"Wind"},
+    }
+    assert list(breakdown["buckets"]) == list(buckets)
+    for name, types in buckets.items():
+        correct, total = metrics.n_correct_and_total_selected_source_types(
+            orig2gold, orig2pred, types
+        )
+        row = breakdown["buckets"][name]
+        assert (row["correct"], row["total"]) == (correct, total)
+        assert row["acc"] == (correct / total if total else None)
+    assert (
+        breakdown["buckets"]["unknown"]["correct"]
+        < breakdown["buckets"]["unknown"]["total"]
+    )
+    assert breakdown["skipped"] == 0
+
+
+@pytest.mark.parametrize("reverse_labels", [False, True])
+def test_load_training_data_strings_only(reverse_labels) -> None:
+    transformers = pytest.importorskip("transformers")
+
+    configs = {
+        "random_seed": 42,
+        "data": {
+            "paths_train": [
+                "tests/testdata/jsonl/dtaeval-train-16.jsonl",
+                "tests/testdata/jsonl/dtaeval-train-head3.jsonl",
+            ],
+            "paths_validation": ["tests/testdata/jsonl/dtaeval-train-head3.jsonl"],
+            "paths_test": ["tests/testdata/jsonl/dtaeval-train-head3.jsonl"],
+            "n_examples_train": [10, 2],
+            "n_examples_validation": [3],
+            "n_examples_test": [1],
+            "reverse_labels": reverse_labels,
+        },
+        "tokenizer": {"min_length_input": 40, "max_length_input": 120},
+        "language_models": {"checkpoint_encoder_decoder": "google/byt5-small"},
+    }
+    dataset_dict = load_training_data(configs, strings_only=True)
+
+    # ByT5 needs no vocabulary files, so the tokenizer can be built offline
+    tokenizer = transformers.ByT5Tokenizer()
+    src = "norm" if reverse_labels else "orig"
+    for split, dataset in loader.load_and_merge_datasets(configs).items():
+        target = [
+            example
+            for example in dataset
+            if 40 <= len(tokenizer(example[src])["input_ids"]) <= 120
+        ]
+        assert dataset_dict[split]["orig"] == [example["orig"] for example in target]
+        assert dataset_dict[split]["norm"] == [example["norm"] for example in target]
+    assert 0 < len(dataset_dict["train"]) < 12
+
+    configs["language_models"]["checkpoint_encoder_decoder"] = "t5-small"
+    with pytest.raises(ValueError):
+        load_training_data(configs, strings_only=True)
+
+
+def test_sharded_type_alignment_stats() -> None:
+    with open("tests/testdata/jsonl/dtaeval-train-16.jsonl", encoding="utf-8") as f:
+        dataset = [json.loads(line) for line in f]
+    src = [example["orig"] for example in dataset]
+    trg = [example["norm"] for example in dataset]
+    target = type_alignment_stats(
+        align_levenshtein.align(
+            tokenise.basic_tokenise_batch(src), tokenise.basic_tokenise_batch(trg)
+        )
+    )
+    for n_jobs, shard_size in [(1, 100), (1, 3), (2, 5)]:
+        stats = sharded_type_alignment_stats(src, trg, n_jobs, shard_size)
+        assert stats == target
+
+    # the stats of parts of the data add up to the stats of all of it
+    parts = [
+        sharded_type_alignment_stats(src[:10], trg[:10]),
+        sharded_type_alignment_stats(src[10:], trg[10:]),
+    ]
+    assert dataset_stats.merge_type_alignment_stats(parts) == target
+
+
+def test_main_merge(tmp_path) -> None:
+    path = "tests/testdata/jsonl/dtaeval-train-head3.jsonl"
+    old, new, target = (str(tmp_path / f"{name}.pkl") for name in "ont")
+    dataset_stats.main(["-d", path, "-o", old, "--out-format=store"])
+    dataset_stats.main(["-d", "tests/testdata/jsonl/dtaeval-train-16.jsonl", "-o", new])
+    dataset_stats.main(["-m", old, new, "-o", str(tmp_path / "merged.pkl")])
+    dataset_stats.main(
+        ["-d", path, "tests/testdata/jsonl/dtaeval-train-16.jsonl", "-o", target]
+    )
+    assert dataset_stats.load_type_alignment_stats(
+        str(tmp_path / "merged.pkl")
+    ) == dataset_stats.load_type_alignment_stats(target)
+
+    with pytest.raises(SystemExit):
+        dataset_stats.main(["-o", target])
@@ -0,0 +1,94 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from transnormer.evaluation import align_levenshtein, metrics
+from transnormer.evaluation.type_stats_store import (
+    TypeStats,
+    load_type_stats,
+    main,
+    save_type_stats,
+)
+
+STATS = {
+    "ſie": {"sie": 3, "Sie": 1},
+    "Thal": {"Tal": 2},
+    "daß": {"dass": 5},
+    "sie": {"sie": 1},
+    "": {"an": 1},
+}
+
+
+def test_save_and_load_type_stats(tmp_path) -> None:
+    path = str(tmp_path / "store")
+    save_type_stats(path, STATS)
+    type_stats = load_type_stats(path)
+    assert isinstance(type_stats.counts, np.memmap)
+    assert not isinstance(load_type_stats(path, mmap=False).counts, np.memmap)
+
+    assert type_stats.to_dict() == STATS
+    assert type_stats == STATS
+    assert len(type_stats) == len(STATS)
+    assert "daß" in type_stats
+    assert "dass" not in type_stats  # only a target type
+    assert "Tal" not in type_stats
+    assert type_stats.get("unbekannt") is None
+    with pytest.raises(KeyError):
+        type_stats["dass"]
+    assert type_stats["ſie"] == {"sie": 3, "Sie": 1}
+    assert type_stats.is_ambiguous("ſie")
+    assert not type_stats.is_ambiguous("Thal")
+    tokens = ["ſie", "Thal", "dass", "unbekannt", ""]
+    assert type_stats.n_targets(tokens).tolist() == [2, 1, 0, 0, 1]
+    assert type_stats.frequencies(tokens).tolist() == [4, 2, 0, 0, 1]
+    assert type_stats.token(type_stats.type_id("Tal")) == "Tal"
+    assert type_stats.type_id("Taler") == -1
+
+
+def test_empty_type_stats(tmp_path) -> None:
+    path = str(tmp_path / "store")
+    save_type_stats(path, {})
+    type_stats = load_type_stats(path)
+    assert type_stats.to_dict() == {}
+    assert "a" not in type_stats
+    assert type_stats.n_targets(["a"]).tolist() == [0]
+
+
+def test_type_stats_without_targets(tmp_path) -> None:
+    # source types without targets in the middle and at the end of the rows
+    stats = {"a": {}, "b": {"c": 2, "d": 1}, "x": {}, "y": {}}
+    type_stats = TypeStats.from_dict(stats)
+    assert len(type_stats) == 4
+    assert type_stats.to_dict() == stats
+    assert type_stats.frequencies(["a", "b", "x", "y", "c"]).tolist() == [0, 3, 0, 0, 0]
+    assert type_stats.n_targets(["a", "b", "y"]).tolist() == [0, 2, 0]
+
+    type_stats = TypeStats.from_dict({"a": {}, "b": {}})
+    assert len(type_stats) == 2
+    assert type_stats.frequencies(["a", "b"]).tolist() == [0, 0]
+    path = str(tmp_path / "store")
+    save_type_stats(path, type_stats)
+    assert load_type_stats(path).to_dict() == {"a": {}, "b": {}}
+
+
+def test_type_accuracy_breakdown_type_stats() -> None:
+    orig = ["ſie Thal daß Waſſer", "ſie sie"]
+    gold = ["sie Tal dass Wasser", "Sie sie"]
+    pred = ["sie Thal dass Waſſer", "sie sie"]
+    orig2gold = align_levenshtein.align(orig, gold)
+    orig2pred = align_levenshtein.align(orig, pred)
+    target = metrics.type_accuracy_breakdown(orig2gold, orig2pred, STATS)
+    breakdown = metrics.type_accuracy_breakdown(
+        orig2gold, orig2pred, TypeStats.from_dict(STATS)
+    )
+    assert breakdown == target
+    assert breakdown["buckets"]["ambiguous"]["total"] == 2
+
+
+def test_main(tmp_path) -> None:
+    pickle_file = tmp_path / "typestats.pkl"
+    with open(pickle_file, "wb") as f:
+        pickle.dump(STATS, f)
+    main([str(pickle_file), str(tmp_path / "store")])
+    assert load_type_stats(str(tmp_path / "store")).to_dict() == STATS
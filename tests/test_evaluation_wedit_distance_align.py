@@ -0,0 +1,168 @@
+import json
+import random
+
+import Levenshtein
+import pytest
+
+from transnormer.evaluation import wedit_distance_align as wda
+from transnormer.evaluation.wedit_distance_align import wedit_distance_align
+
+# Fix seeds for reproducibilty
+SEED = 42
+random.seed(SEED)
+
+ALPHABET = "ab c,.'äſ"
+RANDOM_PAIRS = [
+    (
+        "".join(random.choice(ALPHABET) for _ in range(random.randint(0, 10))),
+        "".join(random.choice(ALPHABET) for _ in range(random.randint(0, 10))),
+    )
+    for _ in range(500)
+]
+
+with open("tests/testdata/jsonl/dtaeval-train-head3.jsonl", "r") as f:
+    DTAEVAL_PAIRS = [(record["orig"], record["norm"]) for record in map(json.loads, f)]
+
+
+def test_wedit_distance_align_example() -> None:
+    target = [(0, 0, 0), (1, 1, 1), (2, 2, 2), (3, 3, 2), (4, 4, 2), (4, 5, 2.8)]
+    assert wedit_distance_align("rain", "shine") == target
+    assert wedit_distance_align("rain", "shine", engine="numpy") == target
+    assert wedit_distance_align("rain", "shine", engine="python") == target
+
+
+def test_wedit_distance_align_numpy_matches_python_random() -> None:
+    for s1, s2 in RANDOM_PAIRS:
+        assert wedit_distance_align(s1, s2, engine="numpy") == wedit_distance_align(
+            s1, s2, engine="python"
+        )
+
+
+def test_wedit_distance_align_numpy_matches_python_dtaeval() -> None:
+    for s1, s2 in DTAEVAL_PAIRS:
+        assert wedit_distance_align(s1, s2, engine="numpy") == wedit_distance_align(
+            s1, s2, engine="python"
+        )
+
+
+def test_wedit_distance_align_banded_matches_python(monkeypatch) -> None:
+    # Start with a narrow band, so that widening the band gets exercised
+    monkeypatch.setattr(wda, "INITIAL_BAND", 1)
+    monkeypatch.setattr(wda.Levenshtein, "distance", lambda s1, s2: 0)
+    for s1, s2 in RANDOM_PAIRS + DTAEVAL_PAIRS:
+        assert wedit_distance_align(s1, s2) == wedit_distance_align(
+            s1, s2, engine="python"
+        )
+
+
+def test_wedit_distance_align_anchored() -> None:
+    s1 = "Womit aber der von Fliſco nicht allerdings will einſtimmen ."
+    s2 = "Womit aber der von Flisco nicht allerdings will einstimmen ."
+    target = wedit_distance_align(s1, s2)
+    actual = wda.wedit_distance_align_anchored(s1, s2)
+    assert [(i, j) for i, j, _ in actual] == [(i, j) for i, j, _ in target]
+    assert [w for _, _, w in actual] == pytest.approx([w for _, _, w in target])
+
+
+def test_wedit_distance_align_anchored_no_anchors() -> None:
+    for s1, s2 in [("", ""), ("a b", ""), ("", "a b"), ("a b", "c d")]:
+        assert wda.wedit_distance_align_anchored(s1, s2) == wedit_distance_align(s1, s2)
+
+
+def test_wedit_distance_align_low_memory_matches_python(monkeypatch) -> None:
+    # Store all matrices as directions only
+    monkeypatch.setattr(wda, "LOW_MEMORY_THRESHOLD", 0)
+    for s1, s2 in RANDOM_PAIRS + DTAEVAL_PAIRS:
+        target = wedit_distance_align(s1, s2, engine="python")
+        assert wedit_distance_align(s1, s2, engine="numpy") == target
+        assert wedit_distance_align(s1, s2) == target
+
+
+def test_wedit_distance_align_batch() -> None:
+    pairs = RANDOM_PAIRS + DTAEVAL_PAIRS + [("x" * 300, "x" * 299 + "y")]
+    actual = wda.wedit_distance_align_batch(pairs, batch_size=64)
+    assert actual == [wedit_distance_align(s1, s2) for s1, s2 in pairs]
+
+
+def test_identical_alignment() -> None:
+    for s in ["", "a", "das ist ein Test"]:
+        assert wda.identical_alignment(len(s)) == wedit_distance_align(
+            s, s, engine="python"
+        )
+
+
+def test_identical_affixes() -> None:
+    s1, s2 = "das ist ein Test", "das ist kein Test"
+    assert wda.identical_affixes(s1, s2) == (len("das ist "), len(" Test"))
+    middle = wedit_distance_align("ein", "kein")
+    # the same path as for the complete strings, but the weights of the middle
+    # part differ
+    assert [(i, j) for i, j, _ in wda.add_identical_affixes(middle, 8, 5)] == [
+        (i, j) for i, j, _ in wedit_distance_align(s1, s2)
+    ]
+    # at least one token remains
+    assert wda.identical_affixes("a c", "a b c") == (len("a "), 0)
+    assert wda.identical_affixes("a", "b") == (0, 0)
+
+
+def test_cost_model_tables() -> None:
+    costs = wda.DEFAULT_COST_MODEL
+    chars = "ab ,.x"
+    for c1 in chars:
+        for c2 in chars:
+            classes = wda._char_classes(wda._codepoints(c1 + c2), costs)
+            pair = (classes[0] * costs.n_classes + classes[1]) * 2 + (c1 == c2)
+            substitution = 0 if c1 == c2 else wda._wedit_dist_substitution_cost(c1, c2)
+            assert costs.substitution[pair] == substitution
+            assert costs.deletion[pair] == wda._wedit_dist_deletion_cost(c1, c2)
+            assert costs.insertion[pair] == wda._wedit_dist_insertion_cost(c1, c2)
+
+
+def test_cost_model_uniform() -> None:
+    costs = wda.get_cost_model("uniform")
+    for s1, s2 in RANDOM_PAIRS[:50]:
+        target = wedit_distance_align(s1, s2, engine="numpy", costs=costs)
+        assert target[-1][2] == Levenshtein.distance(s1, s2)
+        assert wedit_distance_align(s1, s2, costs=costs) == target
+    actual = wda.wedit_distance_align_batch(RANDOM_PAIRS[:50], costs=costs)
+    assert actual == [
+        wedit_distance_align(s1, s2, costs=costs) for s1, s2 in RANDOM_PAIRS[:50]
+    ]
+    with pytest.raises(ValueError):
+        wedit_distance_align("a", "b", engine="python", costs=costs)
+
+
+def test_register_cost_model() -> None:
+    def expensive_space(c1: str, c2: str) -> float:
+        return 5 if " " in (c1, c2) else 1
+
+    costs = wda.make_cost_model(
+        "test", expensive_space, expensive_space, expensive_space, (" ",)
+    )
+    wda.register_cost_model(costs)
+    try:
+        assert wda.get_cost_model("test") is costs
+        assert wedit_distance_align("xa bx", "xabx", costs=costs)[-1][2] == 5
+    finally:
+        del wda.COST_MODELS["test"]
+    with pytest.raises(ValueError):
+        wda.get_cost_model("test")
+    with pytest.raises(ValueError):
+        wda.make_cost_model("test", len, len, len, (" ", " ."))
+
+
+def test_wedit_distance_align_banded_expensive_indels(monkeypatch) -> None:
+    # Insertions and deletions cost more than the steps along the borders of the
+    # matrix (which cost 1 each), the band check must not rely on them
+    def heavy_indel(c1: str, c2: str) -> float:
+        return 3
+
+    def substitution(c1: str, c2: str) -> float:
+        return 2
+
+    costs = wda.make_cost_model("heavy-indel", heavy_indel, heavy_indel, substitution)
+    monkeypatch.setattr(wda, "INITIAL_BAND", 1)
+    monkeypatch.setattr(wda.Levenshtein, "distance", lambda s1, s2: 0)
+    for s1, s2 in RANDOM_PAIRS + [("aabaaaaab", "baabb")]:
+        target, _ = wda._wedit_dist_align_numpy(s1, s2, costs=costs)
+        assert wedit_distance_align(s1, s2, costs=costs) == target